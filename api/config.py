@@ -10,11 +10,153 @@ class Config:
     openai_api_key: SecretStr = SecretStr(os.getenv("OPENAI_API_KEY", ""))
     model_name: str = "gpt-3.5-turbo"
     temperature: float = 0
+    # Character cut-off, only used when token budgeting is disabled
     max_text_length: int = 8000
+    token_budget_enabled: bool = True
+    # Whole prompt, template included
+    max_prompt_tokens: int = 4000
+    # Lines at the top and bottom of each page checked for repeated headers
+    token_budget_edge_lines: int = 3
+    token_budget_section_lines: int = 8
+    # Documents over the token budget are extracted chunk by chunk and merged
+    chunked_extraction_enabled: bool = True
+    chunk_concurrency: int = 4
     prompt_template: str = EXTRACT_PROMPT
+    llm_timeout_seconds: float = 60
+    openai_base_url: str = os.getenv("OPENAI_BASE_URL", "")
+    # Retried by LLMScheduler with exponential backoff, or Retry-After on a 429
+    llm_max_retries: int = 2
+    llm_retry_base_seconds: float = 0.5
+    llm_retry_max_seconds: float = 20
+    # Per model; 0 means unlimited. Set to the account's rate limits
+    llm_requests_per_minute: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    llm_tokens_per_minute: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    # The API enforces limits over windows shorter than a minute
+    llm_rate_limit_burst_seconds: float = 10
+    # Charged up front per call, then corrected with the reported usage
+    llm_completion_token_estimate: int = 600
+    # Starting concurrency; halved on a 429, grown while calls stay fast
+    llm_concurrency: int = 8
+    llm_adaptive_concurrency: bool = True
+    llm_min_concurrency: int = 1
+    llm_max_concurrency: int = 32
+    llm_latency_target_seconds: float = 20
+    llm_concurrency_decrease_slow: float = 0.9
+    llm_concurrency_cooldown_seconds: float = 2
+    # Calls running past the model's recent p95 get a second, identical call
+    llm_hedging_enabled: bool = True
+    llm_hedge_quantile: float = 0.95
+    llm_hedge_min_seconds: float = 2
+    llm_hedge_max_fraction: float = 0.1
+    # Cheaper model for small prompts and for calls still rate limited after
+    # their retries; unset, every call goes to model_name
+    llm_fallback_model: str = os.getenv("LLM_FALLBACK_MODEL", "")
+    llm_fallback_max_prompt_tokens: int = 1500
+    # "record" saves every LLM response under llm_replay_dir, keyed by a hash
+    # of the prompt; "replay" answers from those files and never calls the API
+    llm_replay_mode: str = os.getenv("LLM_REPLAY_MODE", "off")
+    llm_replay_dir: str = os.getenv("LLM_REPLAY_DIR", ".cache/llm-replay")
+    # Replayed responses take as long as the recorded calls did
+    llm_replay_latency: bool = False
+    # Regex pre-extraction; the LLM is only asked for fields the rules miss
+    rule_extraction_enabled: bool = True
+    rule_min_confidence: float = 0.9
+    # Local classifier; the prompt only lists the top-k commodity groups
+    commodity_classifier_enabled: bool = True
+    commodity_groups_path: str = os.getenv(
+        "COMMODITY_GROUPS_PATH",
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "challenge-data",
+            "commodity-groups.json",
+        ),
+    )
+    # Typical order-line vocabulary per group, in English and German, so short
+    # descriptions match even when they never mention the group name
+    commodity_keywords_path: str = os.getenv(
+        "COMMODITY_KEYWORDS_PATH",
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "challenge-data",
+            "commodity-keywords.json",
+        ),
+    )
+    commodity_top_k: int = 5
+    # Below these (per text), the prompt lists every group instead of a top-k
+    # that likely misses the right one: no overlap scores 0 for all groups
+    commodity_min_score: float = 0.1
+    commodity_min_margin: float = 0.05
+    # Known vendors from stored requests are filled in without asking the LLM
+    vendor_registry_enabled: bool = True
+    vendor_registry_refresh_seconds: float = 60
+    vendor_registry_reload_seconds: float = 60 * 60
+    # First backoff after a failed refresh, doubled per failure up to a reload
+    vendor_registry_retry_seconds: float = 30
+    vendor_letterhead_lines: int = 20
 
     # File Processing
     max_file_size_mb: int = 50
+    # Whole requests, checked against Content-Length before the body is read
+    max_request_size_mb: int = 200
+    # Larger uploads are spooled to a temp file that the PDF parsers map
+    upload_memory_max_kb: int = 1024
+    upload_chunk_kb: int = 256
+    upload_spool_dir: str = os.getenv("UPLOAD_SPOOL_DIR", "")
+    # Stop parsing huge documents once this much text has been extracted
+    max_extraction_chars: int = 200_000
+    extraction_workers: int = min(4, os.cpu_count() or 1)
+    extraction_pages_per_shard: int = 4
+    # "auto" picks a backend per document; or one of pdfplumber, pypdfium2, pdfminer
+    pdf_backend: str = os.getenv("PDF_BACKEND", "auto")
+    pdf_probe_pages: int = 2
+    pdf_clean_text_min_chars_per_page: int = 50
+    pdf_layout_max_paths_per_page: int = 30
+    pdf_max_text_objects_per_char: float = 0.5
+    batch_max_in_flight: int = 16
+
+    # Extraction Cache
+    cache_backend: str = os.getenv("EXTRACTION_CACHE_BACKEND", "memory")
+    cache_ttl_seconds: int = 24 * 60 * 60
+    cache_max_entries: int = 512
+    cache_dir: str = ".cache/extractions"
+    cache_collection: str = "extraction_cache"
+
+    # MongoDB
+    mongo_database: str = "Demo"
+    mongo_max_pool_size: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    mongo_min_pool_size: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    mongo_connect_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: int = 30000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_read_preference: str = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+    mongo_ensure_indexes: bool = os.getenv("MONGODB_ENSURE_INDEXES", "1") == "1"
+
+    # Request Listing
+    requests_page_size: int = 100
+    requests_max_page_size: int = 1000
+    requests_export_batch_size: int = 500
+    requests_bulk_max_items: int = 1000
+    # Documents per bulk write of an NDJSON import
+    requests_import_batch_size: int = 500
+    # Imports are exempt from max_request_size_mb; each line is held to this
+    requests_import_max_line_bytes: int = 1024 * 1024
+
+    # Request Summaries
+    summary_collection: str = "request_summaries"
+    # Rebuilt in the background at startup when empty but requests exist
+    summary_build_on_start: bool = os.getenv("SUMMARY_BUILD_ON_START", "1") == "1"
+
+    # Background Jobs
+    jobs_collection: str = "jobs"
+    job_workers: int = int(os.getenv("JOB_WORKERS", "2"))
+    job_max_attempts: int = 3
+    job_retry_base_seconds: float = 5
+    job_retry_max_seconds: float = 300
+    job_lease_seconds: int = 300
+    job_poll_interval_seconds: float = 1
+
+    # Logging; debug and info messages are off unless LOG_LEVEL lowers this
+    log_level: str = os.getenv("LOG_LEVEL", "WARNING")
 
     # Validation
     required_fields: list = field(
@@ -1,9 +1,109 @@
-from pymongo import MongoClient
+from gridfs import AsyncGridFSBucket
+from pymongo import ASCENDING, DESCENDING, TEXT, AsyncMongoClient, IndexModel
 import os
 from dotenv import load_dotenv
+from api.config import Config
 
 load_dotenv(".env.local")
 
+# Indexes backing the access patterns of the /requests routes. Each list query
+# sorts newest first on (created_at, _id), so filtered indexes end in the same keys.
+INDEXES = {
+    "requests": [
+        IndexModel(
+            [("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="created_at_id",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="status_created_at",
+        ),
+        IndexModel(
+            [
+                ("department", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="department_created_at",
+        ),
+        IndexModel(
+            [
+                ("commodity_group", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="commodity_group_created_at",
+        ),
+        IndexModel(
+            [("vendor_name", ASCENDING), ("vat_id", ASCENDING)],
+            name="vendor_name_vat_id",
+        ),
+        IndexModel([("title", TEXT)], name="title_text"),
+    ],
+    # Dashboard reads: one dimension's groups, largest spend first
+    "request_summaries": [
+        IndexModel(
+            [("dimension", ASCENDING), ("total_cost", DESCENDING)],
+            name="dimension_total_cost",
+        ),
+    ],
+    # Matches the job queue's claim query
+    "jobs": [
+        IndexModel(
+            [("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+            name="status_next_attempt_at",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+            name="status_lease_expires_at",
+        ),
+    ],
+}
+
+# Options that change what an index accepts or keeps; others are left alone
+INDEX_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+    "collation",
+    "default_language",
+    "language_override",
+)
+
+
+def same_index(existing: dict, declared: IndexModel) -> bool:
+    """Whether an index as listed by the server is the declared one.
+
+    The server lists a text index's key as {_fts: "text", _ftsx: 1} plus any
+    other fields, with the text fields in its weights, so those are compared
+    instead.
+    """
+    spec = declared.document
+    key = dict(spec["key"])
+    text_fields = [field for field, kind in key.items() if kind == TEXT]
+    if text_fields:
+        weights = spec.get("weights") or {field: 1 for field in text_fields}
+        if dict(existing.get("weights") or {}) != dict(weights):
+            return False
+        key = {field: kind for field, kind in key.items() if kind != TEXT}
+        listed = {
+            field: kind
+            for field, kind in existing["key"].items()
+            if field not in ("_fts", "_ftsx")
+        }
+    else:
+        listed = dict(existing["key"])
+    if listed != key:
+        return False
+    for option in INDEX_OPTIONS:
+        if option in ("default_language", "language_override") and option not in spec:
+            # Server defaults, listed for every text index
+            continue
+        if existing.get(option) != spec.get(option):
+            return False
+    return True
+
 
 class MongoDB:
     _instance = None
@@ -14,13 +114,67 @@ class MongoDB:
             cls._instance = cls()
         return cls._instance
 
-    def __init__(self):
+    @classmethod
+    async def close_mongo_client(cls):
+        """Close the shared client, if one was ever created."""
+        if cls._instance is not None:
+            await cls._instance.close()
+            cls._instance = None
+
+    def __init__(self, config: Config = None):
+        config = config or Config()
         print("MONGODB_ATLAS_URI: ", os.environ.get("MONGODB_ATLAS_URI"))
         uri = os.environ.get("MONGODB_ATLAS_URI")
-        self._instance = MongoClient(
+        # The async client binds to the running event loop on first use, so
+        # constructing it at import time is safe
+        self._client = AsyncMongoClient(
             uri,
             appname="devrel.content.vercel",
-        )["Demo"]
+            maxPoolSize=config.mongo_max_pool_size,
+            minPoolSize=config.mongo_min_pool_size,
+            connectTimeoutMS=config.mongo_connect_timeout_ms,
+            socketTimeoutMS=config.mongo_socket_timeout_ms,
+            serverSelectionTimeoutMS=config.mongo_server_selection_timeout_ms,
+            readPreference=config.mongo_read_preference,
+        )
+        self._instance = self._client[config.mongo_database]
 
     def get_collection(self, collection_name):
         return self._instance[collection_name]
+
+    def get_gridfs_bucket(self, bucket_name):
+        return AsyncGridFSBucket(self._instance, bucket_name=bucket_name)
+
+    async def close(self):
+        await self._client.close()
+
+    async def ensure_indexes(self):
+        """Create declared indexes and drop ones that are no longer declared.
+
+        Returns the names of the created and dropped indexes per collection.
+        """
+        changes = {}
+        for collection_name, indexes in INDEXES.items():
+            collection = self.get_collection(collection_name)
+            existing = {
+                index["name"]: index async for index in await collection.list_indexes()
+            }
+            declared = {index.document["name"]: index for index in indexes}
+
+            dropped = []
+            for name, index in existing.items():
+                if name == "_id_":
+                    continue
+                declared_index = declared.get(name)
+                if declared_index is None or not same_index(index, declared_index):
+                    await collection.drop_index(name)
+                    dropped.append(name)
+
+            missing = [
+                index
+                for name, index in declared.items()
+                if name not in existing or name in dropped
+            ]
+            created = await collection.create_indexes(missing) if missing else []
+            changes[collection_name] = {"created": created, "dropped": dropped}
+        return changes
@@ -1,21 +1,75 @@
-import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from langfuse import Langfuse
+from fastapi.responses import PlainTextResponse
+from api import tracing
 from api.config import Config
-from api.routes.procurement import router as procurement_router
+from api.logging_config import configure_logging
+from api.middleware import RequestSizeLimitMiddleware
+from api.routes.procurement import router as procurement_router, services
+from api.services import metrics
 
-# Initialize Langfuse
 config = Config()
-langfuse = Langfuse(
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    host="https://cloud.langfuse.com",
-)
+configure_logging(config.log_level)
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_indexes():
+    from api.db import MongoDB
+
+    try:
+        changes = await MongoDB.get_mongo_client().ensure_indexes()
+        logger.info("Index reconciliation", extra={"changes": changes})
+    except Exception:
+        # An unreachable database should not keep the API (and /health) down
+        logger.exception("Error reconciling indexes")
+
+
+async def build_request_summary():
+    try:
+        if await services.request_summary.ensure_built():
+            logger.info("Request summary built")
+    except Exception:
+        logger.exception("Error building request summary")
+
+
+async def resume_jobs():
+    try:
+        await services.start_job_workers_if_pending()
+    except Exception:
+        logger.exception("Error checking for unfinished jobs")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # None of these holds up startup: the first requests are served meanwhile
+    background = []
+    if config.mongo_ensure_indexes:
+        background.append(asyncio.create_task(reconcile_indexes()))
+    if config.summary_build_on_start:
+        background.append(asyncio.create_task(build_request_summary()))
+    if config.job_workers:
+        background.append(asyncio.create_task(resume_jobs()))
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await services.close()
+    tracing.flush()
+
 
 app = FastAPI(
     title="Procurement API",
     description="API for processing procurement documents",
     version="1.0.0",
+    lifespan=lifespan,
+)
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_bytes=config.max_request_size_mb * 1024 * 1024,
+    # Streamed in batches, with each line held to requests_import_max_line_bytes
+    exempt_paths=["/api/requests/import"],
 )
 
 # Include routers
@@ -30,3 +84,26 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-stage latency, document, token and cache metrics in Prometheus format"""
+    # Services that were never used have no stats, and are not built for them
+    document_processor = services.built("document_processor")
+    if document_processor is not None:
+        metrics.record_service_stats(
+            {
+                "extraction_cache": document_processor.cache,
+                "token_budget": document_processor.llm_processor.budgeter,
+                "llm_scheduler": document_processor.llm_processor.scheduler,
+                "llm_replay": document_processor.llm_processor.recorder,
+                "rule_extractor": document_processor.rule_extractor,
+                "commodity_classifier": document_processor.classifier,
+                "vendor_registry": document_processor.vendor_registry,
+            }
+        )
+    metrics.record_service_stats(
+        {"request_summary": services.built("request_summary")}
+    )
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,53 @@
+from typing import Iterable
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+TOO_LARGE = "Request body is too large"
+
+
+class RequestSizeLimitMiddleware:
+    """Answers 413 to requests whose body exceeds max_bytes.
+
+    A Content-Length over the limit is refused before the body is read, so an
+    oversize upload is not received and spooled by the multipart parser
+    first. Bodies are also counted as they are received, which stops requests
+    sent without a Content-Length (or with a wrong one) once they pass the
+    limit. Each uploaded file is held to Config.max_file_size_mb separately,
+    but only by the handler, after the multipart parser has read the body.
+
+    Routes in exempt_paths read their bodies as streams and limit them
+    themselves.
+    """
+
+    def __init__(self, app, max_bytes: int, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > self.max_bytes:
+                    response = JSONResponse({"detail": TOO_LARGE}, status_code=413)
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised to whatever reads the body; FastAPI answers it with a 413
+                    raise HTTPException(status_code=413, detail=TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,20 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED")
+
+
+class ProcessingJob(BaseModel):
+    id: str = Field(alias="_id")
+    filename: Optional[str] = None
+    content_type: str
+    status: str  # QUEUED, RUNNING, SUCCEEDED, FAILED
+    progress: str
+    attempts: int = 0
+    max_attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    next_attempt_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
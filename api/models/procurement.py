@@ -2,6 +2,8 @@ from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field
 
+REQUEST_STATUSES = ("OPEN", "IN_PROGRESS", "CLOSED")
+
 
 class OrderLine(BaseModel):
     description: str
@@ -24,3 +26,44 @@ class ProcurementRequest(BaseModel):
     status: str = "OPEN"  # OPEN, IN_PROGRESS, CLOSED
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ProcurementRequestView(BaseModel):
+    """A possibly projected request as returned by the list and export routes."""
+
+    id: Optional[str] = Field(None, alias="_id")
+    requestor_name: Optional[str] = None
+    title: Optional[str] = None
+    vendor_name: Optional[str] = None
+    vat_id: Optional[str] = None
+    commodity_group: Optional[str] = None
+    order_lines: Optional[List[OrderLine]] = None
+    total_cost: Optional[float] = None
+    department: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class BulkStatusUpdate(BaseModel):
+    ids: List[str]
+    status: str
+
+
+class BulkDelete(BaseModel):
+    ids: List[str]
+
+
+class BulkItemResult(BaseModel):
+    """The outcome of one item of a bulk call, by its position in the call."""
+
+    index: int
+    id: Optional[str] = None
+    status: str  # created, updated, deleted, not_found, error
+    error: Optional[str] = None
+
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
@@ -1,3 +1,11 @@
+COMMODITY_GROUPS = """- Accommodation Rentals, Membership Fees, Workplace Safety, Consulting, Financial Services, Fleet Management, Recruitment Services, Professional Development, Miscellaneous Services, Insurance
+- Electrical Engineering, Facility Management Services, Security, Renovations, Office Equipment, Energy Management, Maintenance, Cafeteria and Kitchenettes, Cleaning
+- Audio and Visual Production, Books/Videos/CDs, Printing Costs, Software Development for Publishing, Material Costs, Shipping for Production, Digital Product Development, Pre-production, Post-production Costs
+- Hardware, IT Services, Software
+- Courier, Express, and Postal Services, Warehousing and Material Handling, Transportation Logistics, Delivery Services
+- Advertising, Outdoor Advertising, Marketing Agencies, Direct Mail, Customer Communication, Online Marketing, Events, Promotional Materials
+- Warehouse and Operational Equipment, Production Machinery, Spare Parts, Internal Transportation, Production Materials, Consumables, Maintenance and Repairs"""
+
 EXTRACT_PROMPT = """
 You are a procurememt expert at Lio Technologies. Your job is to extract the information from the purchasing documents and convert it into a structured format.
 
@@ -23,13 +31,7 @@ Extract the following information from the document text below:
 - Commodity Group (automatically identify the most appropriate category from the list below)
 
 Available Commodity Groups:
-- Accommodation Rentals, Membership Fees, Workplace Safety, Consulting, Financial Services, Fleet Management, Recruitment Services, Professional Development, Miscellaneous Services, Insurance
-- Electrical Engineering, Facility Management Services, Security, Renovations, Office Equipment, Energy Management, Maintenance, Cafeteria and Kitchenettes, Cleaning
-- Audio and Visual Production, Books/Videos/CDs, Printing Costs, Software Development for Publishing, Material Costs, Shipping for Production, Digital Product Development, Pre-production, Post-production Costs
-- Hardware, IT Services, Software
-- Courier, Express, and Postal Services, Warehousing and Material Handling, Transportation Logistics, Delivery Services
-- Advertising, Outdoor Advertising, Marketing Agencies, Direct Mail, Customer Communication, Online Marketing, Events, Promotional Materials
-- Warehouse and Operational Equipment, Production Machinery, Spare Parts, Internal Transportation, Production Materials, Consumables, Maintenance and Repairs
+{commodity_groups}
 
 Document Text:
 {document_text}
@@ -147,3 +149,68 @@ Document Text:
 
 Respond with ONLY the JSON object.
 """
+
+# Per-field pieces for build_fields_prompt(), used when only some fields are missing
+FIELD_INSTRUCTIONS = {
+    "title": "- Title (if you can't find one, make up a title that describes why the request is being made)",
+    "requestor_name": "- Requestor Name (the person at the recipient company requesting the purchase)",
+    "department": "- Department of the requestor",
+    "vendor_name": "- Vendor Name (the issuer of the document, not the recipient)",
+    "vat_id": "- VAT ID of the vendor",
+    "commodity_group": "- Commodity Group (the most appropriate category from the list below)",
+    "order_lines": "- Order Lines (description, unit price, amount, unit and total price of each ordered item)",
+    "total_cost": "- Total Cost",
+}
+
+FIELD_SCHEMAS = {
+    "title": '"title": "string"',
+    "requestor_name": '"requestor_name": "string"',
+    "department": '"department": "string"',
+    "vendor_name": '"vendor_name": "string"',
+    "vat_id": '"vat_id": "string"',
+    "commodity_group": '"commodity_group": "string"',
+    "order_lines": """"order_lines": [
+        {
+            "description": "string",
+            "unit_price": 0.0,
+            "amount": 0,
+            "unit": "string",
+            "total_price": 0.0
+        }
+    ]""",
+    "total_cost": '"total_cost": 0.0',
+}
+
+
+def build_fields_prompt(fields) -> str:
+    """Build an extraction prompt template that asks only for the given fields.
+
+    Like EXTRACT_PROMPT it takes {document_text} and, when commodity_group is
+    requested, {commodity_groups}.
+    """
+    instructions = "\n".join(FIELD_INSTRUCTIONS[name] for name in fields)
+    schema = ",\n".join(
+        "    " + FIELD_SCHEMAS[name].replace("{", "{{").replace("}", "}}")
+        for name in fields
+    )
+    groups = ""
+    if "commodity_group" in fields:
+        groups = "\nAvailable Commodity Groups:\n{commodity_groups}\n"
+
+    return f"""
+You are a procurememt expert at Lio Technologies. Your job is to extract the following information from the purchasing document. The other fields have already been extracted.
+
+Make sure to not mix up the vendor with the requestor. Look at the who is the issuer of the document and who is the recipient of the document.
+
+{instructions}
+{groups}
+Document Text:
+{{document_text}}
+
+Please respond with ONLY a JSON object in this exact format:
+{{{{
+{schema}
+}}}}
+
+Respond with ONLY the JSON object, no additional text or explanation.
+"""
@@ -1,19 +1,36 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from typing import List
-from langfuse.decorators import observe
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, UploadFile, File, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
 from api.config import Config
-from api.models.procurement import ProcurementRequest
-from api.services.document_processor import DocumentProcessor
-from api.db import MongoDB
+from api.models.job import TERMINAL_STATUSES, ProcessingJob
+from api.models.procurement import (
+    REQUEST_STATUSES,
+    BulkDelete,
+    BulkResult,
+    BulkStatusUpdate,
+    ProcurementRequest,
+    ProcurementRequestView,
+)
+from api.services import request_bulk, request_query, uploads
+from api.services.request_summary import DIMENSIONS, SUMMARY_PROJECTION
+from api.services.app_services import AppServices
+from api.services.metrics import STAGE_SECONDS
+from api.tracing import observe
 from datetime import datetime
+import json
 from bson import ObjectId
+from pydantic import ValidationError
 
-router = APIRouter()
-document_processor = DocumentProcessor(Config())
+logger = logging.getLogger(__name__)
 
-# MongoDB connection
-db_client = MongoDB.get_mongo_client()
-collection = db_client.get_collection("requests")
+router = APIRouter()
+config = Config()
+# The document processor, MongoDB collections and job queue are built on first
+# use; api/index.py starts the job workers and closes everything on shutdown
+services = AppServices(config)
 
 
 @router.post("/requests", response_model=ProcurementRequest)
@@ -23,22 +40,307 @@ async def create_request(request: ProcurementRequest):
         # Exclude _id field from dump since it should be auto-generated by MongoDB
         request_dict = request.model_dump(by_alias=True, exclude={"id"})
 
-        result = collection.insert_one(request_dict)
+        with STAGE_SECONDS.time(stage="mongo_write"):
+            result = await services.requests.insert_one(request_dict)
         request_dict["_id"] = str(result.inserted_id)
+        await services.request_summary.record_created(request_dict)
+        # Not built for this: an unbuilt registry loads the request from Mongo
+        document_processor = services.built("document_processor")
+        if document_processor is not None and document_processor.vendor_registry:
+            document_processor.vendor_registry.add(request.vendor_name, request.vat_id)
         return request_dict
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/requests", response_model=List[ProcurementRequest])
-async def get_requests():
-    """Get all procurement requests"""
+def _listed_document(document: dict, selected_fields: Optional[List[str]]) -> dict:
+    document["_id"] = str(document["_id"])
+    # created_at is always fetched for the cursor but only returned when asked for
+    if selected_fields is not None and "created_at" not in selected_fields:
+        document.pop("created_at", None)
+    return document
+
+
+@router.get(
+    "/requests",
+    response_model=List[ProcurementRequestView],
+    response_model_exclude_unset=True,
+)
+async def get_requests(
+    response: Response,
+    status: Optional[str] = None,
+    department: Optional[str] = None,
+    vendor_name: Optional[str] = None,
+    commodity_group: Optional[str] = None,
+    search: Optional[str] = Query(None, description="Full-text search on title"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=config.requests_max_page_size),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. for list views"
+    ),
+):
+    """Get procurement requests, newest first.
+
+    Paged once a limit or cursor is given, with the cursor for the next page
+    in the X-Next-Cursor header; pages hold requests_page_size requests unless
+    a limit is given. Without either, every matching request is returned, as
+    before paging existed.
+    """
+    try:
+        selected_fields = request_query.parse_fields(fields)
+        query = request_query.build_filter(
+            {
+                "status": status,
+                "department": department,
+                "vendor_name": vendor_name,
+                "commodity_group": commodity_group,
+            },
+            cursor,
+            search,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        paged = limit is not None or cursor is not None
+        limit = limit or config.requests_page_size
+        documents = services.requests.find(
+            query, request_query.build_projection(selected_fields)
+        ).sort(request_query.SORT)
+        if paged:
+            # Fetch one extra document to learn whether another page exists
+            documents = documents.limit(limit + 1)
+        documents = await documents.to_list()
+
+        if paged and len(documents) > limit:
+            documents = documents[:limit]
+            response.headers["X-Next-Cursor"] = request_query.encode_cursor(
+                documents[-1]
+            )
+
+        return [_listed_document(document, selected_fields) for document in documents]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/requests/export")
+async def export_requests(
+    status: Optional[str] = None,
+    department: Optional[str] = None,
+    vendor_name: Optional[str] = None,
+    commodity_group: Optional[str] = None,
+    search: Optional[str] = Query(None, description="Full-text search on title"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
+    """Stream every matching procurement request as NDJSON"""
+    try:
+        selected_fields = request_query.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = request_query.build_filter(
+        {
+            "status": status,
+            "department": department,
+            "vendor_name": vendor_name,
+            "commodity_group": commodity_group,
+        },
+        search=search,
+    )
+
+    async def stream_documents():
+        # Only one cursor batch is held in memory, however large the collection
+        documents = services.requests.find(
+            query,
+            request_query.build_projection(selected_fields),
+            batch_size=config.requests_export_batch_size,
+        ).sort(request_query.SORT)
+        async for document in documents:
+            view = ProcurementRequestView.model_validate(
+                _listed_document(document, selected_fields)
+            )
+            yield view.model_dump_json(by_alias=True, exclude_unset=True) + "\n"
+
+    return StreamingResponse(stream_documents(), media_type="application/x-ndjson")
+
+
+@router.get("/requests/summary")
+async def get_request_summary(
+    by: Optional[str] = Query(
+        None, description=f"Only this dimension, one of {', '.join(DIMENSIONS)}"
+    ),
+):
+    """Request counts and total spend per group, with a breakdown by status.
+
+    Read from the materialised summary, so the cost grows with the number of
+    groups rather than of requests.
+    """
+    if by is not None and by not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension: {by}")
+    try:
+        return await services.request_summary.groups(by)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/requests/summary/rebuild")
+async def rebuild_request_summary():
+    """Recompute the request summary from every request"""
     try:
-        requests = []
-        for document in collection.find():
-            document["_id"] = str(document["_id"])
-            requests.append(document)
-        return requests
+        groups = await services.request_summary.rebuild()
+        return {"message": "Summary rebuilt", "groups": groups}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _check_bulk_size(count: int):
+    if count > config.requests_bulk_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {config.requests_bulk_max_items} items per call",
+        )
+
+
+def _bulk_result(results: List[dict]) -> dict:
+    failed = sum(result["status"] in ("error", "not_found") for result in results)
+    return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+
+async def _insert_requests(documents: List[dict]) -> dict:
+    """Insert requests in one unordered bulk write; the errors by index."""
+    with STAGE_SECONDS.time(stage="mongo_write"):
+        errors = await request_bulk.insert(services.requests, documents)
+    created = [document for i, document in enumerate(documents) if i not in errors]
+    await services.request_summary.record_changes(created=created)
+    document_processor = services.built("document_processor")
+    if document_processor is not None and document_processor.vendor_registry:
+        for document in created:
+            document_processor.vendor_registry.add(
+                document["vendor_name"], document["vat_id"]
+            )
+    return errors
+
+
+@router.post("/requests/bulk", response_model=BulkResult)
+async def create_requests(requests: List[ProcurementRequest]):
+    """Create many procurement requests at once, with a result per request"""
+    _check_bulk_size(len(requests))
+    documents = [
+        request.model_dump(by_alias=True, exclude={"id"}) for request in requests
+    ]
+    try:
+        errors = await _insert_requests(documents)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return _bulk_result(
+        [
+            {"index": i, "status": "error", "error": errors[i]}
+            if i in errors
+            else {"index": i, "id": str(document["_id"]), "status": "created"}
+            for i, document in enumerate(documents)
+        ]
+    )
+
+
+@router.post("/requests/import", response_model=BulkResult)
+async def import_requests(request: Request):
+    """Create procurement requests from an NDJSON body, one request per line
+
+    The body is parsed as it arrives and written in batches, so an import of
+    any size is held in memory one batch at a time; the request size limit
+    does not apply, but a line longer than requests_import_max_line_bytes
+    stops the import with 413. Only the lines that failed are listed in the
+    results, with their line numbers as the index.
+    """
+    succeeded = 0
+    failures = []
+    batch = []
+    line_numbers = []
+
+    async def flush():
+        nonlocal succeeded
+        errors = await _insert_requests(batch)
+        succeeded += len(batch) - len(errors)
+        failures.extend(
+            {"index": line_numbers[i], "status": "error", "error": error}
+            for i, error in errors.items()
+        )
+        batch.clear()
+        line_numbers.clear()
+
+    try:
+        lines = request_bulk.ndjson_lines(
+            request.stream(), config.requests_import_max_line_bytes
+        )
+        async for number, line in lines:
+            try:
+                document = ProcurementRequest.model_validate_json(line).model_dump(
+                    by_alias=True, exclude={"id"}
+                )
+            except ValidationError as e:
+                failures.append({"index": number, "status": "error", "error": str(e)})
+                continue
+            batch.append(document)
+            line_numbers.append(number)
+            if len(batch) >= config.requests_import_batch_size:
+                await flush()
+        if batch:
+            await flush()
+    except request_bulk.LineTooLong as e:
+        try:
+            # The lines before it are imported, like the batches already written
+            if batch:
+                await flush()
+        except Exception as flush_error:
+            raise HTTPException(status_code=500, detail=str(flush_error))
+        raise HTTPException(
+            status_code=413,
+            detail=f"Import stopped after {succeeded} requests: {str(e)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Import stopped after {succeeded} requests: {str(e)}",
+        )
+
+    logger.info(
+        "Imported requests", extra={"created": succeeded, "failed": len(failures)}
+    )
+    return {"succeeded": succeeded, "failed": len(failures), "results": failures}
+
+
+@router.patch("/requests/bulk/status", response_model=BulkResult)
+async def update_requests_status(update: BulkStatusUpdate):
+    """Update the status of many procurement requests, with a result per id"""
+    if update.status not in REQUEST_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid status")
+    _check_bulk_size(len(update.ids))
+    try:
+        with STAGE_SECONDS.time(stage="mongo_write"):
+            results, changes = await request_bulk.update_status(
+                services.requests, update.ids, update.status, SUMMARY_PROJECTION
+            )
+        await services.request_summary.record_changes(status_changes=changes)
+        return _bulk_result(results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/requests/bulk/delete", response_model=BulkResult)
+async def delete_requests(delete: BulkDelete):
+    """Delete many procurement requests, with a result per id"""
+    _check_bulk_size(len(delete.ids))
+    try:
+        with STAGE_SECONDS.time(stage="mongo_write"):
+            results, removed, uncertain = await request_bulk.delete(
+                services.requests, delete.ids, SUMMARY_PROJECTION
+            )
+        if uncertain:
+            services.request_summary.mark_stale("Requests were deleted concurrently")
+        else:
+            await services.request_summary.record_changes(deleted=removed)
+        return _bulk_result(results)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -47,7 +349,7 @@ async def get_requests():
 async def get_request(request_id: str):
     """Get a specific procurement request by ID"""
     try:
-        request = collection.find_one({"_id": ObjectId(request_id)})
+        request = await services.requests.find_one({"_id": ObjectId(request_id)})
         if request:
             request["_id"] = str(request["_id"])
             return request
@@ -61,16 +363,20 @@ async def update_request_status(request_id: str, status_data: dict):
     """Update the status of a procurement request"""
     try:
         status = status_data.get("status")
-        if not status or status not in ["OPEN", "IN_PROGRESS", "CLOSED"]:
+        if not status or status not in REQUEST_STATUSES:
             raise HTTPException(status_code=400, detail="Invalid status")
 
-        result = collection.update_one(
-            {"_id": ObjectId(request_id)},
-            {"$set": {"status": status, "updated_at": datetime.utcnow()}},
-        )
+        # The document as it was, so its summary groups can be moved
+        with STAGE_SECONDS.time(stage="mongo_write"):
+            before = await services.requests.find_one_and_update(
+                {"_id": ObjectId(request_id)},
+                {"$set": {"status": status, "updated_at": datetime.utcnow()}},
+                projection=SUMMARY_PROJECTION,
+            )
 
-        if result.modified_count == 0:
+        if before is None:
             raise HTTPException(status_code=404, detail="Request not found")
+        await services.request_summary.record_status_change(before, status)
 
         return {"message": "Status updated successfully"}
     except Exception as e:
@@ -81,38 +387,266 @@ async def update_request_status(request_id: str, status_data: dict):
 async def delete_request(request_id: str):
     """Delete a procurement request"""
     try:
-        result = collection.delete_one({"_id": ObjectId(request_id)})
+        with STAGE_SECONDS.time(stage="mongo_write"):
+            before = await services.requests.find_one_and_delete(
+                {"_id": ObjectId(request_id)}, projection=SUMMARY_PROJECTION
+            )
 
-        if result.deleted_count == 0:
+        if before is None:
             raise HTTPException(status_code=404, detail="Request not found")
+        await services.request_summary.record_deleted(before)
 
         return {"message": "Request deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _spool_upload(file: UploadFile) -> uploads.SpooledUpload:
+    """Read an upload in chunks, rejecting oversize and unsupported files.
+
+    The content type is sniffed from the file itself; the one the client sent
+    is ignored.
+    """
+    try:
+        with STAGE_SECONDS.time(stage="upload_read"):
+            return await uploads.spool(file, config)
+    except uploads.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except uploads.UnsupportedUpload as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+
 @observe(name="api_process_document")
 @router.post("/process-document")
-async def process_document(file: UploadFile = File(...)):
+async def process_document(response: Response, file: UploadFile = File(...)):
     """Process a vendor offer document and extract information"""
+    upload = await _spool_upload(file)
     try:
-        print(f"Processing file: {file.filename}, content_type: {file.content_type}")
+        logger.info(
+            "Processing file",
+            extra={
+                "upload_filename": file.filename,
+                "content_type": upload.content_type,
+                "size_bytes": upload.size,
+            },
+        )
 
-        # Read the file content as bytes
-        content = await file.read()
-        print(f"File size: {len(content)} bytes")
+        document_processor = services.document_processor
+        cache_key = document_processor.cache.key_for_digest(
+            upload.digest, upload.content_type
+        )
+        response.headers["X-Extraction-Cache-Key"] = cache_key
 
         # Process the document using the new pipeline
         extracted_data = await document_processor.process_document(
-            content=content,
-            content_type=file.content_type or "application/octet-stream",
+            content=upload.source,
+            content_type=upload.content_type,
+            cache_key=cache_key,
         )
 
-        print(f"Extracted data: {extracted_data}")
+        logger.debug("Extracted data", extra={"extracted_data": extracted_data})
         return extracted_data
 
     except Exception as e:
-        print(f"Error processing document: {str(e)}")
+        logger.warning(
+            "Error processing document",
+            extra={"upload_filename": file.filename, "error": str(e)},
+        )
         raise HTTPException(
             status_code=500, detail=f"Error processing document: {str(e)}"
         )
+    finally:
+        upload.close()
+
+
+@router.post("/process-document/stream")
+async def stream_process_document(file: UploadFile = File(...)):
+    """Process a vendor offer document, streaming fields as Server-Sent Events
+
+    Header fields and order lines are sent as soon as they are parsed, then a
+    result event with the validated payload, or an error event.
+    """
+    upload = await _spool_upload(file)
+    document_processor = services.document_processor
+    cache_key = document_processor.cache.key_for_digest(
+        upload.digest, upload.content_type
+    )
+    logger.info(
+        "Streaming file",
+        extra={
+            "upload_filename": file.filename,
+            "content_type": upload.content_type,
+            "size_bytes": upload.size,
+        },
+    )
+
+    async def events():
+        try:
+            async for event, data in document_processor.stream_document(
+                upload.source, upload.content_type, cache_key
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except Exception as e:
+            logger.warning(
+                "Error streaming document",
+                extra={"upload_filename": file.filename, "error": str(e)},
+            )
+            detail = json.dumps({"detail": f"Error processing document: {str(e)}"})
+            yield f"event: error\ndata: {detail}\n\n"
+
+    # The background task also runs when the client disconnects mid-stream
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"X-Extraction-Cache-Key": cache_key, "Cache-Control": "no-cache"},
+        background=BackgroundTask(upload.close),
+    )
+
+
+@router.post("/process-documents")
+async def process_documents(files: List[UploadFile] = File(...)):
+    """Process many vendor offer documents, streaming one NDJSON result per file"""
+    # Uploads are closed once this handler returns, so spool them up front
+    documents = []
+    spooled = []
+    rejected = []
+    try:
+        for file in files:
+            try:
+                upload = await _spool_upload(file)
+            except HTTPException as e:
+                # One bad file fails on its own, like a failed extraction
+                rejected.append(
+                    {"filename": file.filename, "error": e.detail, "status": "error"}
+                )
+                continue
+            spooled.append(upload)
+            documents.append((file.filename, upload.source, upload.content_type))
+    except BaseException:
+        for upload in spooled:
+            upload.close()
+        raise
+    logger.info(
+        "Processing batch", extra={"files": len(documents), "rejected": len(rejected)}
+    )
+
+    async def stream_results():
+        for result in rejected:
+            yield json.dumps(result) + "\n"
+        async for result in services.document_processor.process_documents(documents):
+            yield json.dumps(result, default=str) + "\n"
+
+    def close_uploads():
+        for upload in spooled:
+            upload.close()
+
+    return StreamingResponse(
+        stream_results(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(close_uploads),
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def create_job(file: UploadFile = File(...)):
+    """Queue a vendor offer document for background processing"""
+    upload = await _spool_upload(file)
+    try:
+        # The workers start with the first job rather than on every cold start
+        job_queue = await services.started_job_queue()
+        with upload.open() as content:
+            job_id = await job_queue.submit(
+                file.filename, content, upload.content_type
+            )
+        return {"job_id": job_id, "status": "QUEUED"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
+
+
+@router.get("/jobs/{job_id}", response_model=ProcessingJob)
+async def get_job(job_id: str):
+    """Get the status, and once finished the result, of a processing job"""
+    job = await services.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Stream job progress as Server-Sent Events until the job finishes"""
+    if not await services.jobs.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_seen = None
+        while not await request.is_disconnected():
+            job = await services.jobs.get(job_id)
+            if job is None:
+                # Deleted or expired while streaming
+                detail = json.dumps({"detail": "Job not found"})
+                yield f"event: error\ndata: {detail}\n\n"
+                return
+            state = (job["status"], job["progress"], job["attempts"])
+            if state != last_seen:
+                last_seen = state
+                data = ProcessingJob.model_validate(job).model_dump_json(by_alias=True)
+                yield f"event: {job['status'].lower()}\ndata: {data}\n\n"
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(config.job_poll_interval_seconds)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get extraction cache hit/miss counters"""
+    return services.document_processor.cache.stats()
+
+
+@router.get("/token-budget/stats")
+async def get_token_budget_stats():
+    """Get prompt tokens saved by the token budget stage"""
+    return services.document_processor.llm_processor.budgeter.stats()
+
+
+@router.get("/rule-extraction/stats")
+async def get_rule_extraction_stats():
+    """Get per-field hit rates of the rule pre-extractor"""
+    return services.document_processor.rule_extractor.stats()
+
+
+@router.get("/vendor-registry/stats")
+async def get_vendor_registry_stats():
+    """Get size and hit rate of the vendor registry"""
+    vendor_registry = services.document_processor.vendor_registry
+    if vendor_registry is None:
+        return {"enabled": False}
+    return {"enabled": True, **vendor_registry.stats()}
+
+
+@router.get("/commodity-classifier/stats")
+async def get_commodity_classifier_stats():
+    """Get index size and classification latency of the commodity classifier"""
+    classifier = services.document_processor.classifier
+    if classifier is None:
+        return {"enabled": False}
+    return {"enabled": True, **classifier.stats()}
+
+
+@router.delete("/cache/{cache_key}")
+async def invalidate_cache_entry(cache_key: str):
+    """Invalidate a single cached extraction"""
+    if not await services.document_processor.cache.invalidate(cache_key):
+        raise HTTPException(status_code=404, detail="Cache entry not found")
+    return {"message": "Cache entry invalidated successfully"}
+
+
+@router.delete("/cache")
+async def clear_cache():
+    """Invalidate every cached extraction"""
+    removed = await services.document_processor.cache.clear()
+    return {"message": "Cache cleared successfully", "removed": removed}
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from api.config import Config
+
+if TYPE_CHECKING:
+    from api.services.document_processor import DocumentProcessor
+    from api.services.job_queue import JobQueue, JobStore
+    from api.services.request_summary import RequestSummary
+
+
+class AppServices:
+    """The API's processors and database handles, built on first use.
+
+    Importing the API stays cheap this way: langchain, the PDF parsers and the
+    Mongo client are only loaded once a route needs them, not on a cold start
+    or for /health.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._services: Dict[str, Any] = {}
+        # Reentrant, since the job queue builds the document processor
+        self._lock = threading.RLock()
+
+    def _get(self, name: str, build: Callable[[], Any]) -> Any:
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._services[name] = build()
+        return service
+
+    def built(self, name: str) -> Optional[Any]:
+        """The named service if it has been built, without building it."""
+        return self._services.get(name)
+
+    @property
+    def document_processor(self) -> "DocumentProcessor":
+        def build():
+            from api.services.document_processor import DocumentProcessor
+
+            return DocumentProcessor(self.config)
+
+        return self._get("document_processor", build)
+
+    @property
+    def requests(self):
+        """The requests collection."""
+
+        def build():
+            from api.db import MongoDB
+
+            return MongoDB.get_mongo_client().get_collection("requests")
+
+        return self._get("requests", build)
+
+    @property
+    def request_summary(self) -> "RequestSummary":
+        def build():
+            from api.services.request_summary import RequestSummary
+
+            return RequestSummary(self.config, self.requests)
+
+        return self._get("request_summary", build)
+
+    @property
+    def jobs(self) -> "JobStore":
+        """Job state, readable without building the job queue's processor."""
+
+        def build():
+            from api.services.job_queue import JobStore
+
+            return JobStore(self.config)
+
+        return self._get("jobs", build)
+
+    @property
+    def job_queue(self) -> "JobQueue":
+        def build():
+            from api.services.job_queue import JobQueue, JobStore
+
+            return JobQueue(self.config, self.document_processor)
+
+        return self._get("job_queue", build)
+
+    async def started_job_queue(self) -> "JobQueue":
+        """The job queue, with its workers running."""
+        # Built in a thread so the imports do not block requests meanwhile
+        job_queue = await asyncio.to_thread(lambda: self.job_queue)
+        await job_queue.start()
+        return job_queue
+
+    async def start_job_workers_if_pending(self):
+        """Start the job workers now only if jobs were left unfinished.
+
+        Otherwise the first submitted job starts them, so a cold start builds
+        no document processor.
+        """
+        if await self.jobs.has_pending():
+            await self.started_job_queue()
+
+    async def close(self):
+        job_queue = self.built("job_queue")
+        if job_queue is not None:
+            await job_queue.stop()
+        document_processor = self.built("document_processor")
+        if document_processor is not None:
+            document_processor.close()
+        self._services.clear()
+
+        from api.db import MongoDB
+
+        await MongoDB.close_mongo_client()
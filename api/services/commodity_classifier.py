@@ -0,0 +1,175 @@
+import json
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from api.config import Config
+
+NGRAM_SIZES = (3, 4, 5)
+
+
+class CommodityClassifier:
+    """Ranks commodity groups for a text with a character n-gram TF-IDF index.
+
+    The index over commodity-groups.json (names and categories) and the
+    order-line vocabulary per group in commodity-keywords.json is built once;
+    scoring a short description only touches the n-grams it contains. Character n-grams within words match German compounds such as
+    "Softwarelizenz" against "software" without any stemming.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        groups: Optional[List[Dict[str, str]]] = None,
+        keywords: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.config = config
+        started = time.perf_counter()
+        if groups is None:
+            with open(config.commodity_groups_path, "r", encoding="utf-8") as f:
+                groups = json.load(f)
+        if keywords is None:
+            with open(config.commodity_keywords_path, "r", encoding="utf-8") as f:
+                keywords = json.load(f)
+        self.groups = [group["commodity_group"] for group in groups]
+        self._index, self._idf = self._build_index(groups, keywords)
+        self.build_seconds = time.perf_counter() - started
+        self.classifications = 0
+        self.fallbacks = 0
+        self.total_seconds = 0.0
+
+    @staticmethod
+    def _ngrams(text: str) -> Counter:
+        counts: Counter = Counter()
+        for word in re.findall(r"\w+", text.casefold()):
+            padded = f" {word} "
+            for size in NGRAM_SIZES:
+                for start in range(len(padded) - size + 1):
+                    counts[padded[start : start + size]] += 1
+        return counts
+
+    @staticmethod
+    def _normalize(weights: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {ngram: weight / norm for ngram, weight in weights.items()} if norm else {}
+
+    def _build_index(
+        self, groups: List[Dict[str, str]], keywords: Dict[str, List[str]]
+    ):
+        documents = [
+            self._ngrams(
+                " ".join(
+                    [
+                        group["commodity_group"],
+                        group.get("category", ""),
+                        *keywords.get(group["commodity_group"], []),
+                    ]
+                )
+            )
+            for group in groups
+        ]
+
+        document_frequency: Counter = Counter()
+        for counts in documents:
+            document_frequency.update(counts.keys())
+        # Smoothed IDF, as scikit-learn computes it
+        idf = {
+            ngram: math.log((1 + len(documents)) / (1 + frequency)) + 1
+            for ngram, frequency in document_frequency.items()
+        }
+
+        # Inverted index: n-gram -> [(group index, weight)]
+        index: Dict[str, List[Tuple[int, float]]] = {}
+        for group_index, counts in enumerate(documents):
+            vector = self._normalize(
+                {
+                    ngram: (1 + math.log(count)) * idf[ngram]
+                    for ngram, count in counts.items()
+                }
+            )
+            for ngram, weight in vector.items():
+                index.setdefault(ngram, []).append((group_index, weight))
+        return index, idf
+
+    def _scores(self, text: str) -> List[float]:
+        counts = self._ngrams(text)
+        query = self._normalize(
+            {
+                ngram: (1 + math.log(count)) * self._idf[ngram]
+                for ngram, count in counts.items()
+                if ngram in self._idf
+            }
+        )
+
+        scores = [0.0] * len(self.groups)
+        for ngram, weight in query.items():
+            for group_index, group_weight in self._index[ngram]:
+                scores[group_index] += weight * group_weight
+        return scores
+
+    def _rank(self, scores: List[float], top_k: Optional[int]) -> List[Tuple[str, float]]:
+        top_k = top_k or self.config.commodity_top_k
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [(self.groups[i], scores[i]) for i in ranked[:top_k]]
+
+    def classify(self, text: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return the top_k groups for the text with their cosine similarity."""
+        started = time.perf_counter()
+        ranked = self._rank(self._scores(text), top_k)
+        self.classifications += 1
+        self.total_seconds += time.perf_counter() - started
+        return ranked
+
+    def candidates(
+        self, texts: Sequence[str], top_k: Optional[int] = None
+    ) -> Optional[List[str]]:
+        """Top groups for several texts, e.g. a document's order-line descriptions.
+
+        Each text is scored on its own and the scores are summed, so a short
+        shipping line weighs as much as a long product description, not more.
+        Returns None when the ranking is too weak to narrow the list down: a
+        text matches no group with commodity_min_score (its group may be any,
+        however strong the others are), or the top group leads the first one
+        left out by less than commodity_min_margin per text.
+        """
+        started = time.perf_counter()
+        totals = [0.0] * len(self.groups)
+        weakest = math.inf if texts else 0.0
+        for text in texts:
+            scores = self._scores(text)
+            weakest = min(weakest, max(scores, default=0.0))
+            for i, score in enumerate(scores):
+                totals[i] += score
+        top_k = top_k or self.config.commodity_top_k
+        ranked = self._rank(totals, top_k + 1)
+        self.classifications += 1
+        self.total_seconds += time.perf_counter() - started
+
+        best = ranked[0][1] if ranked else 0.0
+        left_out = ranked[top_k][1] if len(ranked) > top_k else 0.0
+        margin = (best - left_out) / max(len(texts), 1)
+        if (
+            weakest < self.config.commodity_min_score
+            or margin < self.config.commodity_min_margin
+        ):
+            self.fallbacks += 1
+            return None
+        return [group for group, _ in ranked[:top_k]]
+
+    @staticmethod
+    def format_candidates(groups: Sequence[str]) -> str:
+        return "\n".join(f"- {group}" for group in groups)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "groups": len(self.groups),
+            "index_ngrams": len(self._idf),
+            "build_ms": self.build_seconds * 1000,
+            "classifications": self.classifications,
+            "fallbacks_to_all_groups": self.fallbacks,
+            "mean_classification_us": self.total_seconds / self.classifications * 1e6
+            if self.classifications
+            else 0.0,
+        }
@@ -1,65 +1,344 @@
-import json
-import os
-from typing import Dict, Any
-from langfuse.decorators import observe, langfuse_context
-from langfuse import Langfuse
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, Any, Iterable, List, Optional, Tuple
+from api import tracing
 from api.config import Config
+from api.services.commodity_classifier import CommodityClassifier
+from api.services.extraction_cache import ExtractionCache
 from api.services.llm_processor import LLMProcessor
-from api.services.payload_validator import PayloadValidator
+from api.services.metrics import DOCUMENT_BYTES, DOCUMENTS, STAGE_SECONDS
+from api.services.payload_validator import (
+    ORDER_LINE_DEFAULTS,
+    PayloadValidator,
+    parse_llm_json,
+)
+from api.services.rule_extractor import RuleExtraction, RuleExtractor
+from api.services.stream_parser import IncrementalPayloadParser
 from api.services.text_extractor import TextExtractor
+from api.services.uploads import DocumentSource, source_size
+from api.services.vendor_registry import VendorRegistry
 import dotenv
 
 dotenv.load_dotenv(".env.local")
 
-lf = Langfuse(
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    host="https://cloud.langfuse.com",
-)
+logger = logging.getLogger(__name__)
 
 
 class DocumentProcessor:
     def __init__(self, config: Config):
         self.config = config
-        self.text_extractor = TextExtractor()
+        self.text_extractor = TextExtractor(self.config)
         self.llm_processor = LLMProcessor(self.config)
         self.validator = PayloadValidator(self.config)
+        self.cache = ExtractionCache(self.config)
+        self.rule_extractor = RuleExtractor(self.config)
+        self.classifier = self._create_classifier()
+        self.vendor_registry = (
+            VendorRegistry(self.config) if self.config.vendor_registry_enabled else None
+        )
 
-    @observe(name="document_processing")
+    def _create_classifier(self) -> Optional[CommodityClassifier]:
+        if not self.config.commodity_classifier_enabled:
+            return None
+        try:
+            return CommodityClassifier(self.config)
+        except FileNotFoundError:
+            logger.warning(
+                "Commodity groups or keywords not found, sending the full list",
+                extra={
+                    "path": self.config.commodity_groups_path,
+                    "keywords_path": self.config.commodity_keywords_path,
+                },
+            )
+            return None
+
+    @tracing.observe(name="document_processing")
     async def process_document(
-        self, content: bytes, content_type: str
+        self,
+        content: DocumentSource,
+        content_type: str,
+        cache_key: Optional[str] = None,
     ) -> Dict[str, Any]:
+        started = time.perf_counter()
+        DOCUMENT_BYTES.inc(source_size(content))
+        try:
+            payload, outcome = await self._process_document(
+                content, content_type, cache_key
+            )
+        except Exception:
+            DOCUMENTS.inc(outcome="failed")
+            raise
+        DOCUMENTS.inc(outcome=outcome)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="document")
+        return payload
+
+    async def _process_document(
+        self, content: DocumentSource, content_type: str, cache_key: Optional[str]
+    ) -> Tuple[Dict[str, Any], str]:
+        # Step 0: Serve repeated uploads from the extraction cache
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            if cache_key is None:
+                cache_key = self.cache.make_key(content, content_type)
+            cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached, "cached"
+
         # Step 1: Extract text
-        document_text = self.text_extractor.extract(content, content_type)
+        document_text = await self._extract_text(content, content_type)
+
+        # Step 2: Process with LLM, asking only for what the rules could not find
+        extracted = await self.extract_fields(document_text)
+        # Step 3: Validate and structure
+        payload = self._validate(extracted)
+
+        with STAGE_SECONDS.time(stage="cache_write"):
+            await self.cache.set(cache_key, payload)
+        return payload, "processed"
 
-        langfuse_context.update_current_trace(
+    async def _extract_text(self, content: DocumentSource, content_type: str) -> str:
+        # Stop parsing once there is far more text than the prompt budget can use
+        with STAGE_SECONDS.time(stage="text_extraction"):
+            document_text = await self.text_extractor.aextract(
+                content, content_type, max_chars=self.config.max_extraction_chars
+            )
+
+        tracing.update_current_trace(
             tags=["annotation_queue", "document_processing"]
         )
         if not document_text or len(document_text.strip()) < 10:
             raise ValueError("No meaningful text could be extracted")
+        return document_text
 
-        # Step 2: Process with LLM
-        llm_response = self.llm_processor.process(document_text)
-        print(f"LLM response: {llm_response}")
-        # Step 3: Validate and structure
-        payload = self.validator.validate_and_clean(llm_response)
-        print(f"Payload: {payload.get('total_cost')}")
-        print(f"LLM response: {json.loads(llm_response.strip()).get('total_cost')}")
+    def _validate(self, extracted: Dict[str, Any]) -> Dict[str, Any]:
+        with STAGE_SECONDS.time(stage="validation"):
+            validated = self.validator.validate(extracted)
+        payload = validated.payload
+        logger.debug(
+            "Payload validated",
+            extra={
+                "total_cost": payload.get("total_cost"),
+                "reported_total_cost": validated.reported_total_cost,
+            },
+        )
 
-        if payload.get("total_cost", 0) != json.loads(llm_response.strip()).get(
-            "total_cost", 0
-        ):
-            langfuse_context.score_current_trace(
+        if payload.get("total_cost", 0) != validated.reported_total_cost:
+            tracing.score_current_trace(
                 name="total_cost_mismatch",
                 value=1,
                 comment="Total cost mismatch between extracted lines and actualtotal",
             )
         else:
-            langfuse_context.score_current_trace(
+            tracing.score_current_trace(
                 name="total_cost_mismatch",
                 value=0,
                 comment="""Total cost matches between extracted lines and actual total.
                 Could be false positive if dict[total_cost] is not in the document.""",
             )
+        return payload
+
+    async def extract_fields(self, document_text: str) -> Dict[str, Any]:
+        """Run the rule pre-extractor and vendor lookup, then the LLM for the rest.
+
+        Returns the parsed response; rule and registry values override the LLM's.
+        """
+        found, missing, commodity_groups = await self._prefill(document_text)
+        if not missing:
+            logger.info("Rule extraction found every field, skipping the LLM")
+            return found
+
+        with STAGE_SECONDS.time(stage="llm"):
+            llm_response = await self.llm_processor.process(
+                document_text,
+                fields=missing if found else None,
+                commodity_groups=commodity_groups,
+            )
+        logger.debug(
+            "LLM response received",
+            extra={"fields": missing, "llm_response": llm_response},
+        )
 
+        payload = parse_llm_json(llm_response)
+        payload.update(found)
         return payload
+
+    async def _prefill(
+        self, document_text: str
+    ) -> Tuple[Dict[str, Any], List[str], Optional[str]]:
+        """Fields found without the LLM, those left for it and group candidates."""
+        if self.config.rule_extraction_enabled:
+            with STAGE_SECONDS.time(stage="rule_extraction"):
+                rules = self.rule_extractor.extract(document_text)
+        else:
+            rules = RuleExtraction()
+        found = rules.confident(self.config.rule_min_confidence)
+        missing = rules.missing(
+            self.config.required_fields, self.config.rule_min_confidence
+        )
+
+        if self.vendor_registry is not None and (
+            "vendor_name" in missing or "vat_id" in missing
+        ):
+            with STAGE_SECONDS.time(stage="vendor_lookup"):
+                vendor = await self.vendor_registry.lookup(
+                    document_text, vat_id=rules.values.get("vat_id")
+                )
+            if vendor is not None:
+                # A VAT ID printed in this document beats the one on record
+                found = {
+                    **{name: value for name, value in vendor.items() if value},
+                    **found,
+                }
+                missing = [name for name in missing if name not in found]
+
+        commodity_groups = None
+        if self.classifier is not None and "commodity_group" in missing:
+            # Order-line descriptions say more about the group than the letterhead
+            descriptions = [
+                line["description"] for line in rules.values.get("order_lines", [])
+            ]
+            with STAGE_SECONDS.time(stage="classification"):
+                candidates = self.classifier.candidates(descriptions or [document_text])
+            # None leaves the prompt's full list of groups
+            if candidates is not None:
+                commodity_groups = self.classifier.format_candidates(candidates)
+        return found, missing, commodity_groups
+
+    @tracing.observe(name="document_streaming")
+    async def stream_document(
+        self,
+        content: DocumentSource,
+        content_type: str,
+        cache_key: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Process a document, yielding each field as soon as it is known.
+
+        Yields ("field", {"name", "value"}) and ("order_line", {"index",
+        "line"}) events: rule and registry fields before the LLM is called,
+        the rest as the LLM's response streams in. The last event is
+        ("result", payload) with the same validated payload process_document
+        returns. Streamed values are provisional; the result is what counts.
+        """
+        started = time.perf_counter()
+        DOCUMENT_BYTES.inc(source_size(content))
+        try:
+            with STAGE_SECONDS.time(stage="cache_lookup"):
+                if cache_key is None:
+                    cache_key = self.cache.make_key(content, content_type)
+                cached = await self.cache.get(cache_key)
+            if cached is not None:
+                events, outcome = self._replay(cached), "cached"
+            else:
+                events = self._stream_extraction(content, content_type, cache_key)
+                outcome = "processed"
+
+            first_field = True
+            async for event, data in events:
+                if first_field and event != "result":
+                    first_field = False
+                    STAGE_SECONDS.observe(
+                        time.perf_counter() - started, stage="first_field"
+                    )
+                yield event, data
+        except Exception:
+            DOCUMENTS.inc(outcome="failed")
+            raise
+        DOCUMENTS.inc(outcome=outcome)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="document")
+
+    async def _replay(
+        self, payload: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        for event in _field_events(payload):
+            yield event
+        yield "result", payload
+
+    async def _stream_extraction(
+        self, content: DocumentSource, content_type: str, cache_key: str
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        document_text = await self._extract_text(content, content_type)
+        found, missing, commodity_groups = await self._prefill(document_text)
+        for event in _field_events(found):
+            yield event
+
+        extracted = found
+        if missing:
+            parser = IncrementalPayloadParser()
+            pieces = []
+            line_index = 0
+            started = time.perf_counter()
+            async for piece in self.llm_processor.stream(
+                document_text,
+                fields=missing if found else None,
+                commodity_groups=commodity_groups,
+            ):
+                pieces.append(piece)
+                for name, value in parser.feed(piece):
+                    if name in found:
+                        continue
+                    if name == "order_lines":
+                        line = {**ORDER_LINE_DEFAULTS, **value}
+                        yield "order_line", {"index": line_index, "line": line}
+                        line_index += 1
+                    else:
+                        yield "field", {"name": name, "value": value}
+            # Includes the time the client took to take each event
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+
+            llm_response = "".join(pieces)
+            logger.debug(
+                "LLM response received",
+                extra={"fields": missing, "llm_response": llm_response},
+            )
+            extracted = parse_llm_json(llm_response)
+            extracted.update(found)
+
+        payload = self._validate(extracted)
+        with STAGE_SECONDS.time(stage="cache_write"):
+            await self.cache.set(cache_key, payload)
+        yield "result", payload
+
+    async def process_documents(
+        self, documents: Iterable[Tuple[str, DocumentSource, str]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process (filename, content, content_type) documents concurrently.
+
+        Results are yielded as each document finishes, not in input order. A
+        failing document produces an error result instead of failing the batch.
+        CPU extraction and LLM calls stay bounded by their own pools; this only
+        caps how many documents are in flight at once.
+        """
+        semaphore = asyncio.Semaphore(self.config.batch_max_in_flight)
+
+        async def run(filename: str, content: DocumentSource, content_type: str):
+            async with semaphore:
+                started = time.perf_counter()
+                result = {"filename": filename}
+                try:
+                    result["data"] = await self.process_document(content, content_type)
+                    result["status"] = "success"
+                except Exception as e:
+                    result["error"] = str(e)
+                    result["status"] = "error"
+                result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                return result
+
+        tasks = [asyncio.create_task(run(*document)) for document in documents]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def close(self):
+        self.text_extractor.close()
+
+
+def _field_events(payload: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    for name, value in payload.items():
+        if name == "order_lines":
+            for index, line in enumerate(value):
+                yield "order_line", {"index": index, "line": line}
+        else:
+            yield "field", {"name": name, "value": value}
@@ -0,0 +1,268 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from api.config import Config
+from api.services.uploads import DocumentSource, source_digest
+
+
+class CacheBackend:
+    name = "none"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        return None
+
+    async def delete(self, key: str) -> bool:
+        return False
+
+    async def clear(self) -> int:
+        return 0
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with a per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._entries[key] = (
+            time.monotonic() + self.ttl_seconds,
+            copy.deepcopy(value),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    async def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        return count
+
+
+class DiskCacheBackend(CacheBackend):
+    """One JSON file per entry, written atomically so readers never see partial files."""
+
+    name = "disk"
+
+    def __init__(self, directory: str, ttl_seconds: int):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("expires_at", 0) < time.time():
+            self._remove(key)
+            return None
+
+        return entry["payload"]
+
+    def _write(self, key: str, value: Dict[str, Any]) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"expires_at": time.time() + self.ttl_seconds, "payload": value}, f
+            )
+        os.replace(tmp_path, path)
+
+    def _remove(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _remove_all(self) -> int:
+        count = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+                count += 1
+        return count
+
+    # File I/O runs in a thread so a slow disk never stalls the event loop
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, key, value)
+
+    async def delete(self, key: str) -> bool:
+        return await asyncio.to_thread(self._remove, key)
+
+    async def clear(self) -> int:
+        return await asyncio.to_thread(self._remove_all)
+
+
+class MongoCacheBackend(CacheBackend):
+    """Stores entries in a MongoDB collection with a TTL index on created_at."""
+
+    name = "mongo"
+
+    def __init__(self, collection_name: str, ttl_seconds: int):
+        from api.db import MongoDB
+
+        self.ttl_seconds = ttl_seconds
+        self.collection = MongoDB.get_mongo_client().get_collection(collection_name)
+        self._index_ready = False
+
+    async def _ensure_index(self):
+        if not self._index_ready:
+            await self.collection.create_index(
+                "created_at", expireAfterSeconds=self.ttl_seconds
+            )
+            self._index_ready = True
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = await self.collection.find_one({"_id": key})
+        if entry is None:
+            return None
+
+        # The TTL monitor only runs once a minute, so check expiry ourselves too
+        if entry["created_at"] + timedelta(seconds=self.ttl_seconds) < datetime.utcnow():
+            return None
+
+        return entry["payload"]
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await self._ensure_index()
+        await self.collection.replace_one(
+            {"_id": key},
+            {"_id": key, "payload": value, "created_at": datetime.utcnow()},
+            upsert=True,
+        )
+
+    async def delete(self, key: str) -> bool:
+        result = await self.collection.delete_one({"_id": key})
+        return result.deleted_count > 0
+
+    async def clear(self) -> int:
+        result = await self.collection.delete_many({})
+        return result.deleted_count
+
+
+class ExtractionCache:
+    """Content-addressed cache for extracted payloads.
+
+    Keys cover the uploaded bytes and every setting that changes the LLM output,
+    so switching model, prompt or temperature never serves a stale extraction.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.backend = self._create_backend(config)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _create_backend(config: Config) -> CacheBackend:
+        if config.cache_backend == "memory":
+            return MemoryCacheBackend(config.cache_max_entries, config.cache_ttl_seconds)
+        if config.cache_backend == "disk":
+            return DiskCacheBackend(config.cache_dir, config.cache_ttl_seconds)
+        if config.cache_backend == "mongo":
+            return MongoCacheBackend(
+                config.cache_collection, config.cache_ttl_seconds
+            )
+        if config.cache_backend == "none":
+            return CacheBackend()
+        raise ValueError(f"Unsupported cache backend: {config.cache_backend}")
+
+    def make_key(self, content: DocumentSource, content_type: str) -> str:
+        return self.key_for_digest(source_digest(content), content_type)
+
+    def key_for_digest(self, content_digest: bytes, content_type: str) -> str:
+        """make_key for content whose SHA-256 is already known, e.g. an upload."""
+        digest = hashlib.sha256()
+        digest.update(content_digest)
+        for part in (
+            content_type,
+            self.config.model_name,
+            self.config.llm_fallback_model,
+            str(self.config.llm_fallback_max_prompt_tokens),
+            str(self.config.temperature),
+            self.config.pdf_backend,
+            str(self.config.max_extraction_chars),
+            str(self.config.max_text_length),
+            str(self.config.token_budget_enabled),
+            str(self.config.max_prompt_tokens),
+            str(self.config.token_budget_edge_lines),
+            str(self.config.token_budget_section_lines),
+            str(self.config.chunked_extraction_enabled),
+            self.config.prompt_template,
+            str(self.config.rule_extraction_enabled),
+            str(self.config.rule_min_confidence),
+            str(self.config.commodity_classifier_enabled),
+            str(self.config.commodity_top_k),
+            str(self.config.commodity_min_score),
+            str(self.config.commodity_min_margin),
+            str(self.config.vendor_registry_enabled),
+        ):
+            digest.update(b"\x00")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await self.backend.set(key, value)
+
+    async def invalidate(self, key: str) -> bool:
+        return await self.backend.delete(key)
+
+    async def clear(self) -> int:
+        return await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Union
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+
+from api.config import Config
+from api.db import MongoDB
+from api.models.job import TERMINAL_STATUSES
+from api.services import uploads
+
+if TYPE_CHECKING:
+    from api.services.document_processor import DocumentProcessor
+
+# Never returned to clients; the upload lives in GridFS until the job finishes
+INTERNAL_FIELDS = {"file_id": 0, "lease_expires_at": 0, "lease_id": 0}
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """Reads jobs from the jobs collection.
+
+    Needs no document processor, so polling a job does not build one.
+    """
+
+    def __init__(self, config: Config, collection=None):
+        self.config = config
+        if collection is None:
+            db_client = MongoDB.get_mongo_client()
+            collection = db_client.get_collection(config.jobs_collection)
+        self.collection = collection
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            object_id = ObjectId(job_id)
+        except InvalidId:
+            return None
+
+        job = await self.collection.find_one({"_id": object_id}, INTERNAL_FIELDS)
+        if job:
+            job["_id"] = str(job["_id"])
+        return job
+
+    async def has_pending(self) -> bool:
+        """Whether any job is queued or was left running."""
+        pending = await self.collection.find_one(
+            {"status": {"$in": ["QUEUED", "RUNNING"]}}, {"_id": 1}
+        )
+        return pending is not None
+
+
+class JobQueue(JobStore):
+    """Durable document-processing jobs stored in MongoDB.
+
+    Uploads are kept in GridFS and job state in the jobs collection, so queued
+    and interrupted jobs are picked up again after a restart. Each claim takes
+    a new lease, which the worker renews while the job runs; a job whose
+    worker died is reclaimed once its lease expires, and the old worker can no
+    longer update it. Failures are retried with exponential backoff up to
+    Config.job_max_attempts.
+    """
+
+    def __init__(self, config: Config, document_processor: "DocumentProcessor"):
+        super().__init__(config)
+        self.document_processor = document_processor
+        db_client = MongoDB.get_mongo_client()
+        self.files = db_client.get_gridfs_bucket(f"{config.jobs_collection}_uploads")
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    async def submit(
+        self, filename: str, content: Union[bytes, BinaryIO], content_type: str
+    ) -> str:
+        # GridFS reads file objects chunk by chunk
+        file_id = await self.files.upload_from_stream(filename or "upload", content)
+        now = datetime.utcnow()
+        result = await self.collection.insert_one(
+            {
+                "filename": filename,
+                "content_type": content_type,
+                "file_id": file_id,
+                "status": "QUEUED",
+                "progress": "queued",
+                "attempts": 0,
+                "max_attempts": self.config.job_max_attempts,
+                "next_attempt_at": now,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        self._wakeup.set()
+        return str(result.inserted_id)
+
+    async def start(self):
+        if self._workers:
+            return
+        for _ in range(self.config.job_workers):
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "QUEUED", "next_attempt_at": {"$lte": now}},
+                    {"status": "RUNNING", "lease_expires_at": {"$lt": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "RUNNING",
+                    "progress": "processing",
+                    "lease_id": uuid.uuid4().hex,
+                    "lease_expires_at": now
+                    + timedelta(seconds=self.config.job_lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning("Error claiming job", extra={"error": str(e)})
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), self.config.job_poll_interval_seconds
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception:
+                # The job stays leased and is reclaimed once the lease expires
+                logger.exception("Error running job", extra={"job_id": str(job["_id"])})
+
+    async def _renew_lease(self, job: Dict[str, Any]):
+        """Extend the job's lease while it runs, so no other worker reclaims it."""
+        lease = timedelta(seconds=self.config.job_lease_seconds)
+        while True:
+            await asyncio.sleep(self.config.job_lease_seconds / 3)
+            try:
+                result = await self.collection.update_one(
+                    {"_id": job["_id"], "lease_id": job["lease_id"]},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + lease}},
+                )
+            except Exception as e:
+                # The next renewal may still come in time
+                logger.warning("Error renewing job lease", extra={"error": str(e)})
+                continue
+            if result.matched_count == 0:
+                # Reclaimed after all; _finish leaves the job to its new claim
+                logger.warning("Lost job lease", extra={"job_id": str(job["_id"])})
+                return
+
+    async def _run(self, job: Dict[str, Any]):
+        upload = None
+        renewal = asyncio.create_task(self._renew_lease(job))
+        try:
+            stream = await self.files.open_download_stream(job["file_id"])
+            upload = await uploads.spool(stream, self.config)
+            cache = self.document_processor.cache
+            result = await self.document_processor.process_document(
+                upload.source,
+                job["content_type"],
+                cache_key=cache.key_for_digest(upload.digest, job["content_type"]),
+            )
+        except Exception as e:
+            await self._fail(job, str(e))
+            return
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            if upload is not None:
+                upload.close()
+
+        await self._finish(
+            job, {"status": "SUCCEEDED", "progress": "done", "result": result}
+        )
+
+    async def _fail(self, job: Dict[str, Any], error: str):
+        if job["attempts"] >= job["max_attempts"]:
+            await self._finish(
+                job, {"status": "FAILED", "progress": "failed", "error": error}
+            )
+            return
+
+        delay = min(
+            self.config.job_retry_base_seconds * 2 ** (job["attempts"] - 1),
+            self.config.job_retry_max_seconds,
+        )
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job["_id"], "lease_id": job["lease_id"]},
+            {
+                "$set": {
+                    "status": "QUEUED",
+                    "progress": f"retrying in {delay:g}s",
+                    "error": error,
+                    "next_attempt_at": now + timedelta(seconds=delay),
+                    "updated_at": now,
+                },
+                "$unset": {"lease_expires_at": "", "lease_id": ""},
+            },
+        )
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]):
+        fields["updated_at"] = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": job["_id"], "lease_id": job["lease_id"]},
+            {
+                "$set": fields,
+                "$unset": {"lease_expires_at": "", "lease_id": "", "file_id": ""},
+            },
+        )
+        # Only the claim still holding the lease owns the upload
+        if result.modified_count:
+            await self.files.delete(job["file_id"])
@@ -1,37 +1,284 @@
-import os
-from langchain_openai import ChatOpenAI
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from langchain.prompts import PromptTemplate
-from langfuse.decorators import observe
-from langfuse import Langfuse
 from api.config import Config
+from api.services.llm_replay import LLMRecorder, replay_chunks
+from api.services.llm_scheduler import LLMScheduler, answered_by
+from api.services.metrics import LLM_TOKENS, STAGE_SECONDS
+from api.prompts.prompts import COMMODITY_GROUPS, build_fields_prompt
+from api.services.payload_validator import parse_llm_json
+from api.services.token_budget import TokenBudgeter
+from api.tracing import observe
 import dotenv
 
 dotenv.load_dotenv(".env.local")
 
-lf = Langfuse(
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    host="https://cloud.langfuse.com",
+logger = logging.getLogger(__name__)
+
+HEADER_FIELDS = (
+    "title",
+    "requestor_name",
+    "department",
+    "vendor_name",
+    "vat_id",
+    "commodity_group",
 )
 
 
 class LLMProcessor:
     def __init__(self, config: Config):
         self.config = config
-        self.llm = ChatOpenAI(
-            model=config.model_name,
-            temperature=config.temperature,
-            api_key=config.openai_api_key,
+        self.scheduler = LLMScheduler(config)
+        self.recorder = (
+            LLMRecorder(config) if config.llm_replay_mode != "off" else None
         )
-        self.prompt = PromptTemplate(
-            input_variables=["document_text"], template=self.config.prompt_template
+        self.prompt = self._make_prompt(self.config.prompt_template)
+        self.budgeter = TokenBudgeter(config)
+        self._field_prompts: Dict[tuple, PromptTemplate] = {}
+        self._token_budgets: Dict[int, int] = {}
+
+    @staticmethod
+    def _make_prompt(template: str) -> PromptTemplate:
+        prompt = PromptTemplate.from_template(template)
+        if "commodity_groups" in prompt.input_variables:
+            # Full list unless the classifier narrows it down per document
+            prompt = prompt.partial(commodity_groups=COMMODITY_GROUPS)
+        return prompt
+
+    @property
+    def document_token_budget(self) -> int:
+        return self.token_budget_for(self.prompt)
+
+    def token_budget_for(self, prompt: PromptTemplate) -> int:
+        """Tokens left for the document once the prompt template is filled in.
+
+        Counted with the full commodity group list, so it holds for any
+        candidate list too.
+        """
+        budget = self._token_budgets.get(id(prompt))
+        if budget is None:
+            prompt_tokens = self.budgeter.count(prompt.format(document_text=""))
+            budget = self.config.max_prompt_tokens - prompt_tokens
+            self._token_budgets[id(prompt)] = budget
+        return budget
+
+    def prompt_for(self, fields: Optional[Sequence[str]] = None) -> PromptTemplate:
+        """The full extraction prompt, or a smaller one asking only for fields."""
+        if not fields:
+            return self.prompt
+
+        key = tuple(fields)
+        prompt = self._field_prompts.get(key)
+        if prompt is None:
+            prompt = self._make_prompt(build_fields_prompt(key))
+            self._field_prompts[key] = prompt
+        return prompt
+
+    def fit_to_budget(self, text: str, prompt: Optional[PromptTemplate] = None) -> str:
+        if not self.config.token_budget_enabled:
+            # Truncate if too long
+            if len(text) > self.config.max_text_length:
+                text = text[: self.config.max_text_length] + "... [truncated]"
+            return text
+
+        result = self.budgeter.fit(text, self.token_budget_for(prompt or self.prompt))
+        logger.debug(
+            "Token budget applied",
+            extra={
+                "original_tokens": result.original_tokens,
+                "final_tokens": result.final_tokens,
+                "tokens_saved": result.tokens_saved,
+            },
         )
+        return result.text
 
     @observe(name="llm_processing")
-    def process(self, text: str) -> str:
-        # Truncate if too long
-        if len(text) > self.config.max_text_length:
-            text = text[: self.config.max_text_length] + "... [truncated]"
+    async def process(
+        self,
+        text: str,
+        fields: Optional[Sequence[str]] = None,
+        commodity_groups: Optional[str] = None,
+    ) -> str:
+        prompt = self.prompt_for(fields)
+        if self.config.token_budget_enabled and self.config.chunked_extraction_enabled:
+            chunks = self.budgeter.split_chunks(text, self.token_budget_for(prompt))
+            if len(chunks) > 1:
+                return await self.process_chunks(chunks, prompt, commodity_groups)
+
+        return await self._invoke(
+            self.fit_to_budget(text, prompt), prompt, commodity_groups
+        )
+
+    async def process_chunks(
+        self,
+        chunks: List[str],
+        prompt: Optional[PromptTemplate] = None,
+        commodity_groups: Optional[str] = None,
+    ) -> str:
+        """Map-reduce extraction for documents that do not fit one prompt.
+
+        Every chunk is extracted concurrently and the partial payloads are
+        merged deterministically, so the result does not depend on which call
+        finishes first.
+        """
+        logger.info("Extracting document in chunks", extra={"chunks": len(chunks)})
+        semaphore = asyncio.Semaphore(self.config.chunk_concurrency)
+
+        async def extract(index: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                response = await self._invoke(
+                    f"[Part {index + 1} of {len(chunks)} of the document]\n{chunk}",
+                    prompt,
+                    commodity_groups,
+                )
+            return parse_llm_json(response)
+
+        partials = await asyncio.gather(
+            *(extract(index, chunk) for index, chunk in enumerate(chunks))
+        )
+        return json.dumps(merge_partial_payloads(partials))
 
-        response = self.llm.invoke(self.prompt.format(document_text=text))
+    @observe(name="llm_streaming")
+    async def stream(
+        self,
+        text: str,
+        fields: Optional[Sequence[str]] = None,
+        commodity_groups: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Like process(), but yields the response in pieces as it is generated.
+
+        A document extracted in chunks cannot stream, since its partial
+        payloads are only merged once every call has finished; the merged
+        response is yielded in one piece instead.
+        """
+        prompt = self.prompt_for(fields)
+        if self.config.token_budget_enabled and self.config.chunked_extraction_enabled:
+            chunks = self.budgeter.split_chunks(text, self.token_budget_for(prompt))
+            if len(chunks) > 1:
+                yield await self.process_chunks(chunks, prompt, commodity_groups)
+                return
+
+        prompt_text = self._format(
+            self.fit_to_budget(text, prompt), prompt, commodity_groups
+        )
+        prompt_tokens = self.budgeter.count(prompt_text)
+        recorded = None
+        if self.recorder is not None:
+            recorded = await self.recorder.replay(
+                prompt_text, self.scheduler.model_for(prompt_tokens)
+            )
+        if recorded is not None:
+            source = replay_chunks(recorded)
+        else:
+            source = self.scheduler.stream(prompt_text, prompt_tokens)
+
+        started = time.perf_counter()
+        response = None
+        async for chunk in source:
+            if response is None:
+                # Includes the time queued for rate limits and concurrency
+                STAGE_SECONDS.observe(
+                    time.perf_counter() - started, stage="llm_first_token"
+                )
+                response = chunk
+            else:
+                response += chunk
+            if chunk.content:
+                yield chunk.content
+        if response is not None:
+            self._record_tokens(response, prompt_tokens)
+            if self.recorder is not None and recorded is None:
+                await self.recorder.record(
+                    prompt_text,
+                    answered_by(response),
+                    response,
+                    time.perf_counter() - started,
+                )
+
+    @staticmethod
+    def _format(
+        text: str, prompt: PromptTemplate, commodity_groups: Optional[str]
+    ) -> str:
+        variables = {"document_text": text}
+        if commodity_groups:
+            variables["commodity_groups"] = commodity_groups
+        return prompt.format(**variables)
+
+    async def _invoke(
+        self,
+        text: str,
+        prompt: Optional[PromptTemplate] = None,
+        commodity_groups: Optional[str] = None,
+    ) -> str:
+        prompt_text = self._format(text, prompt or self.prompt, commodity_groups)
+        prompt_tokens = self.budgeter.count(prompt_text)
+        if self.recorder is not None:
+            # A response the fallback model gave after rate limits is recorded
+            # under that model, so it is not replayed here
+            recorded = await self.recorder.replay(
+                prompt_text, self.scheduler.model_for(prompt_tokens)
+            )
+            if recorded is not None:
+                self._record_tokens(recorded, prompt_tokens)
+                return recorded.content
+
+        started = time.perf_counter()
+        response = await self.scheduler.invoke(prompt_text, prompt_tokens)
+        self._record_tokens(response, prompt_tokens)
+        if self.recorder is not None:
+            await self.recorder.record(
+                prompt_text,
+                answered_by(response),
+                response,
+                time.perf_counter() - started,
+            )
         return response.content
+
+    def _record_tokens(self, response, prompt_tokens: int):
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            LLM_TOKENS.inc(usage.get("input_tokens", 0), direction="prompt")
+            LLM_TOKENS.inc(usage.get("output_tokens", 0), direction="completion")
+        else:
+            # Not every model reports usage; count locally instead
+            LLM_TOKENS.inc(prompt_tokens, direction="prompt")
+            completion_tokens = self.budgeter.count(response.content)
+            LLM_TOKENS.inc(completion_tokens, direction="completion")
+
+
+def merge_partial_payloads(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk payloads, given in document order.
+
+    Header fields take the first non-empty value, since the letterhead comes
+    first; commodity_group takes the most common value. Order lines are
+    concatenated without deduplication: chunks do not overlap, and the same
+    item may be ordered on several pages. Lines that are not objects are
+    skipped. total_cost takes the last non-zero value, since totals are
+    printed at the end; PayloadValidator recomputes it from the lines anyway.
+    """
+    merged: Dict[str, Any] = {}
+    for field in HEADER_FIELDS:
+        merged[field] = next(
+            (partial[field] for partial in partials if partial.get(field)), ""
+        )
+
+    groups = [p["commodity_group"] for p in partials if p.get("commodity_group")]
+    if groups:
+        # max() keeps the first of equally common groups, in document order
+        merged["commodity_group"] = max(groups, key=groups.count)
+
+    merged["order_lines"] = []
+    for partial in partials:
+        order_lines = partial.get("order_lines")
+        if isinstance(order_lines, list):
+            merged["order_lines"].extend(
+                line for line in order_lines if isinstance(line, dict)
+            )
+
+    merged["total_cost"] = next(
+        (p["total_cost"] for p in reversed(partials) if p.get("total_cost")), 0.0
+    )
+    return merged
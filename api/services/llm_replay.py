@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from api.config import Config
+
+REPLAY_MODES = ("off", "record", "replay")
+# Replayed streams are cut into pieces of about one token
+STREAM_PIECE_CHARS = 4
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+class LLMRecorder:
+    """Records LLM responses to files keyed by a hash of the prompt, or replays them.
+
+    In "record" mode every response is written to llm_replay_dir, and prompts
+    already recorded are replayed instead of sent. In "replay" mode nothing is
+    sent: a prompt without a recording raises ReplayMiss, which usually means
+    a pipeline change altered the prompt and the recordings need refreshing.
+    The key covers the model and temperature as well, so a config change
+    never replays another model's answer. Responses are recorded under the
+    model that actually answered, so one from the fallback model is never
+    replayed as the primary model's.
+    """
+
+    def __init__(self, config: Config):
+        if config.llm_replay_mode not in REPLAY_MODES:
+            raise ValueError(f"Unsupported LLM replay mode: {config.llm_replay_mode}")
+        self.config = config
+        self.mode = config.llm_replay_mode
+        self.directory = config.llm_replay_dir
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def key(self, prompt_text: str, model: str) -> str:
+        identity = json.dumps([model, self.config.temperature, prompt_text])
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, entry: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    async def replay(self, prompt_text: str, model: str) -> Optional[AIMessage]:
+        """model's recorded response, or None if the prompt should be sent."""
+        key = self.key(prompt_text, model)
+        entry = await asyncio.to_thread(self._read, key)
+        if entry is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise ReplayMiss(
+                    f"No recorded LLM response for prompt {key}; "
+                    "record one with LLM_REPLAY_MODE=record"
+                )
+            return None
+
+        self.hits += 1
+        if self.config.llm_replay_latency:
+            await asyncio.sleep(entry.get("latency_seconds", 0))
+        return AIMessage(
+            content=entry["content"], usage_metadata=entry.get("usage_metadata")
+        )
+
+    async def record(
+        self, prompt_text: str, model: str, response, latency_seconds: float
+    ):
+        entry = {
+            "model": model,
+            "content": response.content,
+            "usage_metadata": getattr(response, "usage_metadata", None),
+            "latency_seconds": round(latency_seconds, 3),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        await asyncio.to_thread(self._write, self.key(prompt_text, model), entry)
+        self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+async def replay_chunks(message: AIMessage) -> AsyncIterator[AIMessageChunk]:
+    """A recorded response as the chunks a streamed call would have produced."""
+    content = message.content
+    for start in range(0, len(content), STREAM_PIECE_CHARS):
+        yield AIMessageChunk(content=content[start : start + STREAM_PIECE_CHARS])
+    # Usage comes last, as with stream_usage
+    yield AIMessageChunk(content="", usage_metadata=message.usage_metadata)
@@ -0,0 +1,484 @@
+import asyncio
+import collections
+import logging
+import random
+import statistics
+import time
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from api.config import Config
+from api.services.metrics import LLM_CALLS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Worth another attempt; anything else (bad request, auth) fails straight away
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+# Successful calls needed before their latency quantile is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+# Response metadata naming the model that answered, as configured; a fallback
+# can make it differ from model_for()'s choice. Set on a stream's first chunk
+ANSWERED_BY = "answered_by"
+
+
+def answered_by(response) -> str:
+    """The model that produced a response from LLMScheduler."""
+    return response.response_metadata[ANSWERED_BY]
+
+
+class TokenBucket:
+    """Budget of some amount per minute, refilled continuously.
+
+    acquire() waits until the amount is available; waiters are served in
+    order, so a large request is not starved by a stream of small ones.
+    Amounts over the whole capacity are capped to it, since they could never
+    be admitted otherwise. A per_minute of 0 means no limit; burst_seconds
+    is how many seconds' worth can be spent at once.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 60):
+        self.rate = per_minute / 60
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float):
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) the difference to an estimate.
+
+        The level may go below zero, which delays later requests until the
+        overdraft has been refilled.
+        """
+        if self.capacity:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+    @property
+    def available(self) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        return self.level
+
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by AIMD (additive increase, multiplicative decrease).
+
+    Every call that finishes under the latency target raises the limit by
+    1/limit, so about one slot per round of calls; a rate limit halves it and
+    a slow call shrinks it by llm_concurrency_decrease_slow. Decreases are at
+    most one per cooldown, so a burst of 429s from the same round counts once.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.limit = float(config.llm_concurrency)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.has_capacity)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self._condition:
+            self.in_flight -= 1
+            # More than one waiter can fit if the limit has grown meanwhile
+            self._condition.notify(max(1, int(self.limit) - self.in_flight))
+
+    def on_success(self, latency: float):
+        if not self.config.llm_adaptive_concurrency:
+            return
+        if latency > self.config.llm_latency_target_seconds:
+            self._decrease(self.config.llm_concurrency_decrease_slow)
+        elif self.limit < self.config.llm_max_concurrency:
+            self.limit = min(
+                self.config.llm_max_concurrency, self.limit + 1 / self.limit
+            )
+
+    def on_throttle(self):
+        if self.config.llm_adaptive_concurrency:
+            self._decrease(0.5)
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < self.config.llm_concurrency_cooldown_seconds:
+            return
+        self._last_decrease = now
+        self.limit = max(self.config.llm_min_concurrency, self.limit * factor)
+
+
+class _ModelLane:
+    """Client, rate limits and concurrency of one model.
+
+    OpenAI limits every model separately, so the fallback model has its own.
+    """
+
+    def __init__(self, config: Config, model: str):
+        self.model = model
+        kwargs = {}
+        if config.openai_base_url:
+            kwargs["base_url"] = config.openai_base_url
+        self.client = ChatOpenAI(
+            model=model,
+            temperature=config.temperature,
+            api_key=config.openai_api_key,
+            timeout=config.llm_timeout_seconds,
+            # Retried by the scheduler, which needs to see the 429s
+            max_retries=0,
+            # Report token usage in the last chunk of streamed responses
+            stream_usage=True,
+            **kwargs,
+        )
+        burst = config.llm_rate_limit_burst_seconds
+        self.requests = TokenBucket(config.llm_requests_per_minute, burst)
+        self.tokens = TokenBucket(config.llm_tokens_per_minute, burst)
+        self.limiter = AdaptiveLimiter(config)
+        self.latencies: Deque[float] = collections.deque(maxlen=200)
+        # Set from Retry-After; every call waits for it, not just the throttled one
+        self.paused_until = 0.0
+        self.last_throttled = 0.0
+        self.calls = 0
+        self.rate_limited = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def latency_quantile(self, quantile: float) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        cuts = statistics.quantiles(self.latencies, n=100)
+        return cuts[min(98, max(0, round(quantile * 100) - 1))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "requests_available": self.requests.available,
+            "tokens_available": self.tokens.available,
+        }
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class LLMScheduler:
+    """Admission, retries, hedging and model fallback around the LLM calls.
+
+    Every call waits for the model's per-minute request and token budgets and
+    for a slot under its adaptive concurrency limit. Rate limits, timeouts and
+    server errors are retried with backoff, honouring Retry-After; once the
+    retries are used up on rate limits, the call moves to the fallback model.
+    Calls still running past the model's recent p95 latency are hedged with a
+    second identical call, and the first response wins. Documents with small
+    prompts go to the fallback model directly, when one is configured.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._lanes: Dict[str, _ModelLane] = {}
+        self.retries = 0
+        self.fallbacks = 0
+        self.small_documents = 0
+
+    def lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(self.config, model)
+        return lane
+
+    def model_for(self, prompt_tokens: int) -> str:
+        if (
+            self.config.llm_fallback_model
+            and prompt_tokens <= self.config.llm_fallback_max_prompt_tokens
+        ):
+            self.small_documents += 1
+            return self.config.llm_fallback_model
+        return self.config.model_name
+
+    def _estimate(self, prompt_tokens: int) -> int:
+        return prompt_tokens + self.config.llm_completion_token_estimate
+
+    async def _admit(self, lane: _ModelLane, estimated_tokens: int):
+        started = time.perf_counter()
+        while (pause := lane.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+        await lane.requests.acquire(1)
+        await lane.tokens.acquire(estimated_tokens)
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_queue")
+
+    def _throttled(self, lane: _ModelLane, error: Exception):
+        lane.rate_limited += 1
+        lane.last_throttled = time.monotonic()
+        lane.limiter.on_throttle()
+        retry_after = _retry_after(error)
+        if retry_after:
+            lane.paused_until = max(lane.paused_until, time.monotonic() + retry_after)
+        LLM_CALLS.inc(outcome="rate_limited")
+
+    def _settle(self, lane: _ModelLane, estimated_tokens: int, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            lane.tokens.adjust(usage["total_tokens"] - estimated_tokens)
+
+    async def _call(
+        self,
+        lane: _ModelLane,
+        prompt_text: str,
+        prompt_tokens: int,
+        sent: Optional[asyncio.Event] = None,
+    ):
+        estimated_tokens = self._estimate(prompt_tokens)
+        await self._admit(lane, estimated_tokens)
+        async with lane.limiter:
+            lane.calls += 1
+            if sent is not None:
+                sent.set()
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    lane.client.ainvoke(prompt_text),
+                    timeout=self.config.llm_timeout_seconds,
+                )
+            except openai.RateLimitError as e:
+                self._throttled(lane, e)
+                raise
+            except Exception:
+                LLM_CALLS.inc(outcome="error")
+                raise
+            latency = time.perf_counter() - started
+        lane.latencies.append(latency)
+        lane.limiter.on_success(latency)
+        STAGE_SECONDS.observe(latency, stage="llm_call")
+        LLM_CALLS.inc(outcome="success")
+        self._settle(lane, estimated_tokens, response)
+        response.response_metadata[ANSWERED_BY] = lane.model
+        return response
+
+    def _hedge_delay(self, lane: _ModelLane) -> Optional[float]:
+        if not self.config.llm_hedging_enabled:
+            return None
+        quantile = lane.latency_quantile(self.config.llm_hedge_quantile)
+        if quantile is None:
+            return None
+        return max(self.config.llm_hedge_min_seconds, quantile)
+
+    def _may_hedge(self, lane: _ModelLane) -> bool:
+        # Hedges add load, so none while the model is pushing back
+        recently_throttled = (
+            time.monotonic() - lane.last_throttled
+            < self.config.llm_concurrency_cooldown_seconds
+        )
+        return (
+            not recently_throttled
+            and lane.limiter.has_capacity
+            and lane.hedges < self.config.llm_hedge_max_fraction * lane.calls
+        )
+
+    async def _hedged_call(
+        self, lane: _ModelLane, prompt_text: str, prompt_tokens: int
+    ):
+        sent = asyncio.Event()
+        primary = asyncio.create_task(
+            self._call(lane, prompt_text, prompt_tokens, sent)
+        )
+        pending = {primary}
+        try:
+            if self.config.llm_hedging_enabled:
+                # Slowness counts from when the call went out, not while queued
+                sending = asyncio.create_task(sent.wait())
+                pending.add(sending)
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.discard(sending)
+                sending.cancel()
+
+                delay = self._hedge_delay(lane)
+                if delay is not None and not primary.done():
+                    await asyncio.wait(pending, timeout=delay)
+                    if not primary.done() and self._may_hedge(lane):
+                        return await self._race(
+                            lane, primary, pending, prompt_text, prompt_tokens
+                        )
+            return await primary
+        finally:
+            for task in pending:
+                task.cancel()
+            # Losers give their concurrency slot back before this returns
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _race(
+        self, lane: _ModelLane, primary, pending, prompt_text: str, prompt_tokens: int
+    ):
+        """Send a hedge for primary; the first successful response wins.
+
+        pending is updated in place, so the caller cancels the loser.
+        """
+        lane.hedges += 1
+        hedge = asyncio.create_task(self._call(lane, prompt_text, prompt_tokens))
+        pending.add(hedge)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    lane.hedge_wins += task is hedge
+                    return task.result()
+        # Both failed; retry on the primary's error
+        raise primary.exception()
+
+    async def _backoff(self, attempt: int, error: Exception):
+        self.retries += 1
+        if _retry_after(error) is not None:
+            # The lane is paused until then, which _admit() waits for
+            return
+        delay = min(
+            self.config.llm_retry_max_seconds,
+            self.config.llm_retry_base_seconds * 2**attempt,
+        )
+        # Full jitter spreads the retries of calls that failed together
+        delay = random.uniform(0, delay)
+        logger.info(
+            "Retrying LLM call",
+            extra={"attempt": attempt + 1, "delay": delay, "error": str(error)},
+        )
+        await asyncio.sleep(delay)
+
+    def _fallback(self, model: str, error: Exception) -> Optional[str]:
+        fallback = self.config.llm_fallback_model
+        if isinstance(error, openai.RateLimitError) and fallback and fallback != model:
+            self.fallbacks += 1
+            logger.warning(
+                "Falling back to another model",
+                extra={"model": model, "fallback_model": fallback},
+            )
+            return fallback
+        return None
+
+    async def invoke(self, prompt_text: str, prompt_tokens: int):
+        """The model's response to prompt_text; prompt_tokens picks the model."""
+        model = self.model_for(prompt_tokens)
+        attempt = 0
+        while True:
+            lane = self.lane(model)
+            try:
+                return await self._hedged_call(lane, prompt_text, prompt_tokens)
+            except RETRYABLE_ERRORS as e:
+                if attempt < self.config.llm_max_retries:
+                    await self._backoff(attempt, e)
+                    attempt += 1
+                    continue
+                fallback = self._fallback(model, e)
+                if fallback is None:
+                    raise
+                model, attempt = fallback, 0
+
+    async def stream(self, prompt_text: str, prompt_tokens: int) -> AsyncIterator:
+        """Like invoke(), but yields the response's chunks as they arrive.
+
+        Streams are not hedged, and are only retried until their first chunk:
+        a retry after that would repeat what the caller has already been
+        given.
+        """
+        model = self.model_for(prompt_tokens)
+        attempt = 0
+        while True:
+            lane = self.lane(model)
+            estimated_tokens = self._estimate(prompt_tokens)
+            started_streaming = False
+            try:
+                await self._admit(lane, estimated_tokens)
+                async with lane.limiter:
+                    lane.calls += 1
+                    started = time.perf_counter()
+                    response = None
+                    # The client's timeout applies to every read, so a stalled
+                    # stream still fails; wait_for cannot wrap an iterator
+                    async for chunk in lane.client.astream(prompt_text):
+                        if not started_streaming:
+                            chunk.response_metadata[ANSWERED_BY] = lane.model
+                        started_streaming = True
+                        response = chunk if response is None else response + chunk
+                        yield chunk
+                    latency = time.perf_counter() - started
+            except openai.RateLimitError as e:
+                self._throttled(lane, e)
+                error = e
+            except RETRYABLE_ERRORS as e:
+                LLM_CALLS.inc(outcome="error")
+                error = e
+            except Exception:
+                LLM_CALLS.inc(outcome="error")
+                raise
+            else:
+                lane.latencies.append(latency)
+                lane.limiter.on_success(latency)
+                STAGE_SECONDS.observe(latency, stage="llm_call")
+                LLM_CALLS.inc(outcome="success")
+                if response is not None:
+                    self._settle(lane, estimated_tokens, response)
+                return
+
+            if started_streaming:
+                raise error
+            if attempt < self.config.llm_max_retries:
+                await self._backoff(attempt, error)
+                attempt += 1
+                continue
+            fallback = self._fallback(model, error)
+            if fallback is None:
+                raise error
+            model, attempt = fallback, 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+            "small_documents": self.small_documents,
+            "models": {model: lane.stats() for model, lane in self._lanes.items()},
+        }
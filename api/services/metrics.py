@@ -0,0 +1,269 @@
+import math
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[name]) for name in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(
+            f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+        )
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def collect(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> List[str]:
+        return []
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = float(value)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Summary(_Metric):
+    """Quantiles over the last `window` observations, plus an all-time sum and count.
+
+    Observing is an append to a bounded deque; sorting only happens when the
+    metrics are scraped.
+    """
+
+    type = "summary"
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        window: int = 1024,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.window = window
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [deque(maxlen=self.window), 0.0, 0]
+        series[0].append(value)
+        series[1] += value
+        series[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        """Context manager observing the duration of its block, even if it raises."""
+        return _Timer(self, labels)
+
+    def quantiles(self, **labels) -> Dict[float, float]:
+        series = self._series.get(self._key(labels))
+        if not series or not series[0]:
+            return {quantile: math.nan for quantile in self.QUANTILES}
+        values = sorted(series[0])
+        return {
+            quantile: values[min(len(values) - 1, int(quantile * len(values)))]
+            for quantile in self.QUANTILES
+        }
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Labels, count, sum and quantiles of every series, for local reporting."""
+        return [
+            {
+                **self._labels(key),
+                "count": count,
+                "sum": total,
+                "quantiles": self.quantiles(**self._labels(key)),
+            }
+            for key, (_, total, count) in self._series.items()
+        ]
+
+    def _samples(self) -> List[str]:
+        samples = []
+        for key, (_, total, count) in self._series.items():
+            labels = self._labels(key)
+            for quantile, value in self.quantiles(**labels).items():
+                quantile_labels = _format_labels({**labels, "quantile": str(quantile)})
+                samples.append(f"{self.name}{quantile_labels} {_format_value(value)}")
+            formatted = _format_labels(labels)
+            samples.append(f"{self.name}_sum{formatted} {_format_value(total)}")
+            samples.append(f"{self.name}_count{formatted} {count}")
+        return samples
+
+
+class _Timer:
+    # A plain class is several times cheaper than a @contextmanager generator
+    __slots__ = ("summary", "labels", "started")
+
+    def __init__(self, summary: Summary, labels: Dict[str, Any]):
+        self.summary = summary
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.summary.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Summary(
+        "procurement_stage_seconds",
+        "Latency of each document processing stage.",
+        ("stage",),
+    )
+)
+DOCUMENTS = REGISTRY.register(
+    Counter(
+        "procurement_documents_total",
+        "Documents processed, by outcome (processed, cached, failed).",
+        ("outcome",),
+    )
+)
+DOCUMENT_BYTES = REGISTRY.register(
+    Counter("procurement_document_bytes_total", "Bytes of uploaded documents read.")
+)
+DOCUMENT_PAGES = REGISTRY.register(
+    Counter("procurement_document_pages_total", "PDF pages parsed.")
+)
+LLM_TOKENS = REGISTRY.register(
+    Counter(
+        "procurement_llm_tokens_total",
+        "LLM tokens, by direction (prompt, completion).",
+        ("direction",),
+    )
+)
+LLM_CALLS = REGISTRY.register(
+    Counter(
+        "procurement_llm_calls_total",
+        "LLM call attempts, by outcome (success, error, rate_limited).",
+        ("outcome",),
+    )
+)
+SERVICE_STATS = REGISTRY.register(
+    Gauge(
+        "procurement_service_stat",
+        "Numeric stats of the cache, token budget, rule extractor and other "
+        "services, refreshed on every scrape.",
+        ("service", "stat"),
+    )
+)
+
+
+def _flatten(stats: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}_")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{name}", value
+
+
+def record_service_stats(services: Dict[str, Any]):
+    """Copy each service's stats() into the SERVICE_STATS gauge; None is skipped."""
+    for service_name, service in services.items():
+        if service is None:
+            continue
+        for stat, value in _flatten(service.stats()):
+            SERVICE_STATS.set(value, service=service_name, stat=stat)
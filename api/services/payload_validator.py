@@ -1,69 +1,80 @@
-import json
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import orjson
 
 from api.config import Config
 
 
+def parse_llm_json(llm_response: str) -> Dict[str, Any]:
+    # Clean response
+    cleaned = llm_response.strip()
+
+    # Parse JSON
+    try:
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError:
+        # Try to extract JSON from response
+        start_idx = cleaned.find("{")
+        end_idx = cleaned.rfind("}")
+        if start_idx != -1 and end_idx != -1:
+            json_str = cleaned[start_idx : end_idx + 1]
+            return orjson.loads(json_str)
+        raise ValueError("Could not find valid JSON in response")
+
+
+ORDER_LINE_DEFAULTS = {
+    "description": "",
+    "unit_price": 0.0,
+    "amount": 0,
+    "unit": "",
+    "total_price": 0.0,
+    "department": "",
+    "vat_id": "",
+}
+
+
+@dataclass
+class ValidatedPayload:
+    payload: Dict[str, Any]
+    # total_cost as the LLM reported it, before it is recomputed from the lines
+    reported_total_cost: Optional[Any]
+
+
 class PayloadValidator:
     def __init__(self, config: Config):
         self.config = config
+        self._defaults = {
+            field: 0.0 if field == "total_cost" else ""
+            for field in self.config.required_fields
+            if field != "order_lines"
+        }
 
     def validate_and_clean(self, llm_response: str) -> Dict[str, Any]:
-        # Clean response
-        cleaned = llm_response.strip()
-
-        # Parse JSON
-        try:
-            payload = json.loads(cleaned)
-        except json.JSONDecodeError:
-            # Try to extract JSON from response
-            start_idx = cleaned.find("{")
-            end_idx = cleaned.rfind("}")
-            if start_idx != -1 and end_idx != -1:
-                json_str = cleaned[start_idx : end_idx + 1]
-                payload = json.loads(json_str)
-            else:
-                raise ValueError("Could not find valid JSON in response")
-
-        # Add missing required fields
-        for field in self.config.required_fields:
-            if field not in payload:
-                if field == "order_lines":
-                    payload[field] = []
-                elif field == "total_cost":
-                    payload[field] = 0.0
-                else:
-                    payload[field] = ""
-
-        # Ensure order_lines is valid
-        if not isinstance(payload["order_lines"], list):
-            payload["order_lines"] = []
-
-        # Validate each order line
-        for order_line in payload["order_lines"]:
-            required_fields = [
-                "description",
-                "unit_price",
-                "amount",
-                "unit",
-                "total_price",
-                "department",
-                "vat_id",
-            ]
-            for field in required_fields:
-                if field not in order_line:
-                    if field in ["unit_price", "total_price"]:
-                        order_line[field] = 0.0
-                    elif field == "amount":
-                        order_line[field] = 0
-                    else:
-                        order_line[field] = ""
+        return self.validate(parse_llm_json(llm_response)).payload
+
+    def validate(self, parsed: Dict[str, Any]) -> ValidatedPayload:
+        """Fill defaults and recompute total_cost on an already parsed response.
+
+        Defaults are merged from templates built once, in a single pass over
+        the order lines.
+        """
+        reported_total_cost = parsed.get("total_cost", 0)
+        payload = {**self._defaults, **parsed}
+
+        order_lines = payload.get("order_lines")
+        if not isinstance(order_lines, list):
+            order_lines = []
+        payload["order_lines"] = [
+            {**ORDER_LINE_DEFAULTS, **line}
+            for line in order_lines
+            if isinstance(line, dict)
+        ]
 
         # Recalculate total cost from order lines to ensure accuracy
         if payload["order_lines"]:
-            calculated_total = sum(
+            payload["total_cost"] = sum(
                 line.get("total_price", 0.0) for line in payload["order_lines"]
             )
-            payload["total_cost"] = calculated_total
 
-        return payload
+        return ValidatedPayload(payload, reported_total_cost)
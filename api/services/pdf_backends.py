@@ -0,0 +1,140 @@
+import io
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Tuple
+
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_raw
+
+from api.config import Config
+from api.services.uploads import DocumentSource
+
+# Each backend extracts pages [start, end) as (page_number, text) pairs, skipping
+# empty pages. They run inside the extraction process pool, so they are plain
+# module-level functions that only take picklable arguments: a spooled document
+# is passed as its path and opened in the worker, never copied into it.
+
+PageTexts = List[Tuple[int, str]]
+
+
+@contextmanager
+def _open_source(source: DocumentSource) -> Iterator[BinaryIO]:
+    """A seekable stream over the document; spool files are memory-mapped."""
+    if isinstance(source, Path):
+        with open(source, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as view:
+            yield view
+    else:
+        yield io.BytesIO(source)
+
+
+def extract_pages_pdfplumber(source: DocumentSource, start: int, end: int) -> PageTexts:
+    import pdfplumber
+
+    pages = []
+    with _open_source(source) as stream, pdfplumber.open(
+        stream, pages=range(start + 1, end + 1)
+    ) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pages.append((page.page_number, page_text))
+    return pages
+
+
+def _pdfium_document(source: DocumentSource) -> "pdfium.PdfDocument":
+    # pdfium opens paths itself, but resolves them first, which breaks the
+    # /proc/<pid>/fd/<n> paths of uploads used where the parser left them
+    if isinstance(source, Path) and source.is_relative_to("/proc"):
+        return pdfium.PdfDocument(open(source, "rb"), autoclose=True)
+    return pdfium.PdfDocument(source)
+
+
+def extract_pages_pypdfium2(source: DocumentSource, start: int, end: int) -> PageTexts:
+    pages = []
+    document = _pdfium_document(source)
+    try:
+        for index in range(start, end):
+            page = document[index]
+            text_page = page.get_textpage()
+            page_text = _normalize_pdfium_text(text_page.get_text_bounded())
+            text_page.close()
+            page.close()
+            if page_text:
+                pages.append((index + 1, page_text))
+    finally:
+        document.close()
+    return pages
+
+
+def extract_pages_pdfminer(source: DocumentSource, start: int, end: int) -> PageTexts:
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    pages = []
+    # pdfminer only accepts paths and file objects, not a memory map
+    if not isinstance(source, Path):
+        source = io.BytesIO(source)
+    layouts = extract_pages(source, page_numbers=range(start, end))
+    for page_number, layout in zip(range(start + 1, end + 1), layouts):
+        page_text = "".join(
+            element.get_text()
+            for element in layout
+            if isinstance(element, LTTextContainer)
+        ).strip()
+        if page_text:
+            pages.append((page_number, page_text))
+    return pages
+
+
+PDF_BACKENDS: Dict[str, Callable[[DocumentSource, int, int], PageTexts]] = {
+    "pdfplumber": extract_pages_pdfplumber,
+    "pypdfium2": extract_pages_pypdfium2,
+    "pdfminer": extract_pages_pdfminer,
+}
+
+
+def _normalize_pdfium_text(text: str) -> str:
+    return text.replace("\r\n", "\n").replace("\xa0", " ").strip()
+
+
+def inspect_pdf(source: DocumentSource, config: Config) -> Tuple[int, str]:
+    """Return (page_count, backend) for a document.
+
+    With Config.pdf_backend set to "auto", the first pages are probed with
+    pdfium, which is fast enough to do on every upload. Documents with a clean
+    text layer get pypdfium2; documents with many drawn rules (tables) or text
+    split into per-glyph objects get pdfplumber's layout analysis, which keeps
+    their reading order intact.
+    """
+    document = _pdfium_document(source)
+    try:
+        page_count = len(document)
+        if config.pdf_backend != "auto":
+            return page_count, config.pdf_backend
+
+        chars = text_objects = paths = 0
+        sampled = min(page_count, config.pdf_probe_pages)
+        for index in range(sampled):
+            page = document[index]
+            text_page = page.get_textpage()
+            chars += text_page.count_chars()
+            text_page.close()
+            for page_object in page.get_objects(max_depth=2):
+                if page_object.type == pdfium_raw.FPDF_PAGEOBJ_TEXT:
+                    text_objects += 1
+                elif page_object.type == pdfium_raw.FPDF_PAGEOBJ_PATH:
+                    paths += 1
+            page.close()
+    finally:
+        document.close()
+
+    if not sampled or chars < config.pdf_clean_text_min_chars_per_page * sampled:
+        return page_count, "pdfplumber"
+    if paths > config.pdf_layout_max_paths_per_page * sampled:
+        return page_count, "pdfplumber"
+    if text_objects > config.pdf_max_text_objects_per_char * chars:
+        return page_count, "pdfplumber"
+    return page_count, "pypdfium2"
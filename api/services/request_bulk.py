@@ -0,0 +1,203 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def parse_ids(ids: Iterable[str]) -> List[Optional[ObjectId]]:
+    """The ObjectId of each id, or None where it is not a valid one."""
+    parsed = []
+    for request_id in ids:
+        try:
+            parsed.append(ObjectId(request_id))
+        except (InvalidId, TypeError):
+            parsed.append(None)
+    return parsed
+
+
+async def write(
+    collection, operations: List[Any]
+) -> Tuple[Dict[str, Any], Dict[int, str]]:
+    """Run operations as one unordered bulk write.
+
+    Returns the server's counts (nInserted, nMatched, nRemoved, ...) and the
+    error of each operation that failed, by its index; the others were
+    applied. Write concern errors are raised, since they say nothing about
+    individual operations.
+    """
+    # Deferred like the Mongo client: the routes import this module
+    from pymongo.errors import BulkWriteError
+
+    if not operations:
+        return {}, {}
+    try:
+        result = await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if e.details.get("writeConcernErrors"):
+            raise
+        errors = {error["index"]: error["errmsg"] for error in e.details["writeErrors"]}
+        return e.details, errors
+    return result.bulk_api_result, {}
+
+
+def _result(index: int, request_id, status: str, error: Optional[str] = None):
+    result = {"index": index, "id": str(request_id), "status": status}
+    if error is not None:
+        result["error"] = error
+    return result
+
+
+def _outcomes(ids, object_ids, outcome) -> List[Dict[str, Any]]:
+    """Per-item results, in the order the ids were given; ids may repeat."""
+    results = []
+    for index, (request_id, object_id) in enumerate(zip(ids, object_ids)):
+        if object_id is None:
+            results.append(_result(index, request_id, "error", "Invalid id"))
+        else:
+            results.append(_result(index, request_id, *outcome(object_id)))
+    return results
+
+
+async def _before_images(collection, object_ids, projection) -> Dict[ObjectId, dict]:
+    """The matching documents, fetched in one query, by id."""
+    unique = list(dict.fromkeys(i for i in object_ids if i is not None))
+    if not unique:
+        return {}
+    documents = collection.find({"_id": {"$in": unique}}, projection)
+    return {document["_id"]: document async for document in documents}
+
+
+async def insert(collection, documents: List[Dict[str, Any]]) -> Dict[int, str]:
+    """Insert documents in one bulk write; the error of each failed one by index.
+
+    Every document is given its _id first.
+    """
+    from pymongo import InsertOne
+
+    for document in documents:
+        document.setdefault("_id", ObjectId())
+    _, errors = await write(collection, [InsertOne(document) for document in documents])
+    return errors
+
+
+async def update_status(collection, ids: List[str], status: str, projection):
+    """Set the status of the requests with the given ids in one bulk write.
+
+    Returns the per-item results, and the before-image and new status of each
+    updated request. Each update only applies if the status is still the one
+    read, so the before-images are exact; a request changed in between is
+    reported as an error rather than updated.
+    """
+    from pymongo import UpdateOne
+
+    object_ids = parse_ids(ids)
+    befores = await _before_images(collection, object_ids, projection)
+    found = list(befores)
+    updated_at = datetime.utcnow()
+    counts, errors = await write(
+        collection,
+        [
+            UpdateOne(
+                {"_id": object_id, "status": befores[object_id].get("status")},
+                {"$set": {"status": status, "updated_at": updated_at}},
+            )
+            for object_id in found
+        ],
+    )
+    failed = {found[index]: error for index, error in errors.items()}
+    updated = set(found) - set(failed)
+    if counts.get("nMatched", 0) < len(updated):
+        # Some were changed concurrently; those updated carry this call's stamp
+        documents = collection.find(
+            {"_id": {"$in": list(updated)}, "status": status, "updated_at": updated_at},
+            {"_id": 1},
+        )
+        updated = {document["_id"] async for document in documents}
+
+    def outcome(object_id):
+        if object_id in updated:
+            return ("updated",)
+        if object_id in failed:
+            return "error", failed[object_id]
+        if object_id in befores:
+            return "error", "Request was modified concurrently"
+        return ("not_found",)
+
+    changes = [(befores[object_id], status) for object_id in updated]
+    return _outcomes(ids, object_ids, outcome), changes
+
+
+async def delete(collection, ids: List[str], projection):
+    """Delete the requests with the given ids in one bulk write.
+
+    Returns the per-item results, the before-images of the deleted requests,
+    and whether they are uncertain: when a request was also deleted
+    concurrently, which of the deletes removed it cannot be told.
+    """
+    from pymongo import DeleteOne
+
+    object_ids = parse_ids(ids)
+    befores = await _before_images(collection, object_ids, projection)
+    found = list(befores)
+    counts, errors = await write(
+        collection,
+        [
+            # Only as read, so its before-image is the one taken out of summaries
+            DeleteOne({"_id": object_id, "status": befores[object_id].get("status")})
+            for object_id in found
+        ],
+    )
+    failed = {found[index]: error for index, error in errors.items()}
+    deleted = set(found) - set(failed)
+    uncertain = False
+    if counts.get("nRemoved", 0) < len(deleted):
+        documents = collection.find({"_id": {"$in": list(deleted)}}, {"_id": 1})
+        modified = {document["_id"] async for document in documents}
+        deleted -= modified
+        failed.update(
+            (object_id, "Request was modified concurrently") for object_id in modified
+        )
+        uncertain = counts.get("nRemoved", 0) < len(deleted)
+
+    def outcome(object_id):
+        if object_id in deleted:
+            return ("deleted",)
+        if object_id in failed:
+            return "error", failed[object_id]
+        return ("not_found",)
+
+    removed = [befores[object_id] for object_id in deleted]
+    return _outcomes(ids, object_ids, outcome), removed, uncertain
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def ndjson_lines(
+    chunks: AsyncIterator[bytes], max_line_bytes: int
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """(line number, line) of each non-blank line of a streamed NDJSON body.
+
+    Raises LineTooLong once a line exceeds max_line_bytes, so a body without
+    newlines cannot grow the buffer without bound.
+    """
+
+    def check(line: bytes, number: int):
+        if len(line) > max_line_bytes:
+            raise LineTooLong(f"Line {number} is longer than {max_line_bytes} bytes")
+
+    number = 0
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            number += 1
+            check(line, number)
+            if line.strip():
+                yield number, line
+        check(pending, number + 1)
+    if pending.strip():
+        yield number + 1, pending
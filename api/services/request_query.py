@@ -0,0 +1,86 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+FILTER_FIELDS = ("status", "department", "vendor_name", "commodity_group")
+
+# Newest first; _id breaks ties between documents created in the same millisecond
+SORT = [("created_at", -1), ("_id", -1)]
+
+PROJECTABLE_FIELDS = {
+    "requestor_name",
+    "title",
+    "vendor_name",
+    "vat_id",
+    "commodity_group",
+    "order_lines",
+    "total_cost",
+    "department",
+    "status",
+    "created_at",
+    "updated_at",
+}
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    raw = f"{document['created_at'].isoformat()}|{document['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, object_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), ObjectId(object_id)
+    except (ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def build_filter(
+    filters: Dict[str, Optional[str]],
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+) -> Dict[str, Any]:
+    query: Dict[str, Any] = {
+        field: value
+        for field, value in filters.items()
+        if field in FILTER_FIELDS and value is not None
+    }
+
+    if search:
+        # Served by the title text index
+        query["$text"] = {"$search": search}
+
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": object_id}},
+        ]
+
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(requested) - PROJECTABLE_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def build_projection(fields: Optional[Iterable[str]]) -> Optional[Dict[str, int]]:
+    if fields is None:
+        return None
+
+    projection = {field: 1 for field in fields}
+    # The cursor is built from these, so they are always fetched
+    projection["_id"] = 1
+    projection["created_at"] = 1
+    return projection
@@ -0,0 +1,264 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from api.config import Config
+from api.models.procurement import REQUEST_STATUSES
+
+# Dashboard breakdowns; every request counts once in each
+DIMENSIONS = ("department", "vendor_name", "commodity_group", "status")
+# What a request contributes to the summary, fetched with its before-image
+SUMMARY_PROJECTION = {field: 1 for field in (*DIMENSIONS, "total_cost")}
+
+# by_status bucket of any other status, e.g. from an import; statuses become
+# field names there, so only known ones may be used as they are
+OTHER_STATUS = "OTHER"
+
+logger = logging.getLogger(__name__)
+
+
+def _group_id(dimension: str, key: Any) -> str:
+    return f"{dimension}:{key if key is not None else ''}"
+
+
+def _status_bucket(status: Any) -> str:
+    return status if status in REQUEST_STATUSES else OTHER_STATUS
+
+
+def _dimension_pipeline(dimension: str) -> List[Dict[str, Any]]:
+    """Groups of one dimension, shaped like the summary documents."""
+    key = {"$ifNull": [f"${dimension}", ""]}
+    return [
+        {
+            "$group": {
+                "_id": {
+                    "key": key,
+                    "status": {
+                        "$cond": [
+                            {"$in": ["$status", list(REQUEST_STATUSES)]},
+                            "$status",
+                            OTHER_STATUS,
+                        ]
+                    },
+                },
+                "count": {"$sum": 1},
+                "total_cost": {"$sum": {"$ifNull": ["$total_cost", 0]}},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.key",
+                "count": {"$sum": "$count"},
+                "total_cost": {"$sum": "$total_cost"},
+                "by_status": {
+                    "$push": {
+                        "k": "$_id.status",
+                        "v": {"count": "$count", "total_cost": "$total_cost"},
+                    }
+                },
+            }
+        },
+        {
+            "$project": {
+                "_id": {"$concat": [f"{dimension}:", {"$toString": "$_id"}]},
+                "dimension": dimension,
+                "key": {"$toString": "$_id"},
+                "count": 1,
+                "total_cost": 1,
+                "by_status": {"$arrayToObject": "$by_status"},
+            }
+        },
+    ]
+
+
+def rebuild_pipeline(requests_collection: str, summary_collection: str) -> List[dict]:
+    """Aggregation recomputing every summary group from the requests.
+
+    One pipeline per dimension, concatenated with $unionWith, so $out can
+    replace the whole summary collection at once.
+    """
+    first, *others = DIMENSIONS
+    pipeline = _dimension_pipeline(first)
+    for dimension in others:
+        pipeline.append(
+            {
+                "$unionWith": {
+                    "coll": requests_collection,
+                    "pipeline": _dimension_pipeline(dimension),
+                }
+            }
+        )
+    pipeline.append({"$out": summary_collection})
+    return pipeline
+
+
+class RequestSummary:
+    """Request counts and spend per department, vendor, commodity group and status.
+
+    Kept in a materialised collection, one document per group, that the
+    request routes update with $inc as they create, update and delete
+    requests; reading a dashboard is then O(groups), not O(requests). The
+    request write and its summary update are not atomic, so a failed update
+    is logged and counted, and rebuild() recomputes everything from the
+    requests with an aggregation pipeline.
+    """
+
+    def __init__(self, config: Config, requests=None, summaries=None):
+        self.config = config
+        if requests is None or summaries is None:
+            from api.db import MongoDB
+
+            client = MongoDB.get_mongo_client()
+            requests = requests or client.get_collection("requests")
+            summaries = summaries or client.get_collection(config.summary_collection)
+        self.requests = requests
+        self.summaries = summaries
+        self.failed_updates = 0
+        self.rebuilds = 0
+
+    @staticmethod
+    def _changes(request: Dict[str, Any], status: str, sign: int) -> Dict[str, Any]:
+        count = sign
+        total_cost = sign * (request.get("total_cost") or 0)
+        status = _status_bucket(status)
+        return {
+            "count": count,
+            "total_cost": total_cost,
+            f"by_status.{status}.count": count,
+            f"by_status.{status}.total_cost": total_cost,
+        }
+
+    async def _apply(self, updates: Dict[tuple, Dict[str, Any]]):
+        # Deferred like the Mongo client: the routes import this module
+        from pymongo import UpdateOne
+
+        operations = [
+            UpdateOne(
+                {"_id": group_id},
+                {
+                    "$inc": changes,
+                    "$setOnInsert": {"dimension": dimension, "key": key},
+                },
+                upsert=True,
+            )
+            for (group_id, dimension, key), changes in updates.items()
+            if changes
+        ]
+        if not operations:
+            return
+        try:
+            await self.summaries.bulk_write(operations, ordered=False)
+        except Exception as e:
+            self.mark_stale(str(e))
+
+    def mark_stale(self, error: str):
+        """Note a change the summary missed; the requests were written regardless."""
+        self.failed_updates += 1
+        logger.warning(
+            "Request summary is out of date; rebuild it", extra={"error": error}
+        )
+
+    def _add_contribution(
+        self, updates: Dict[tuple, Dict[str, Any]], request, status: str, sign: int
+    ):
+        for dimension in DIMENSIONS:
+            key = status if dimension == "status" else request.get(dimension)
+            key = key if key is not None else ""
+            group = (_group_id(dimension, key), dimension, key)
+            changes = updates.setdefault(group, {})
+            for name, value in self._changes(request, status, sign).items():
+                total = changes.get(name, 0) + value
+                if total:
+                    changes[name] = total
+                else:
+                    # A request moved within the group, or in and out of it
+                    changes.pop(name, None)
+
+    async def record_changes(
+        self,
+        created: Iterable[Dict[str, Any]] = (),
+        status_changes: Iterable[Tuple[Dict[str, Any], str]] = (),
+        deleted: Iterable[Dict[str, Any]] = (),
+    ):
+        """Apply any number of request changes in one bulk write.
+
+        Status changes are given as the request's before-image and its new
+        status; deleted requests by their before-images.
+        """
+        updates: Dict[tuple, Dict[str, Any]] = {}
+        for request in created:
+            self._add_contribution(updates, request, request.get("status", ""), 1)
+        for before, status in status_changes:
+            self._add_contribution(updates, before, before.get("status", ""), -1)
+            self._add_contribution(updates, before, status, 1)
+        for before in deleted:
+            self._add_contribution(updates, before, before.get("status", ""), -1)
+        await self._apply(updates)
+
+    async def record_created(self, request: Dict[str, Any]):
+        await self.record_changes(created=[request])
+
+    async def record_deleted(self, before: Dict[str, Any]):
+        await self.record_changes(deleted=[before])
+
+    async def record_status_change(self, before: Dict[str, Any], status: str):
+        """Move a request from its previous status to status, in every group."""
+        await self.record_changes(status_changes=[(before, status)])
+
+    async def groups(
+        self, dimension: Optional[str] = None
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Non-empty groups per dimension, by spend, largest first."""
+        query: Dict[str, Any] = {"count": {"$gt": 0}}
+        if dimension is not None:
+            query["dimension"] = dimension
+        result: Dict[str, List[Dict[str, Any]]] = {
+            name: [] for name in ([dimension] if dimension else DIMENSIONS)
+        }
+        documents = self.summaries.find(query, {"_id": 0}).sort(
+            [("dimension", 1), ("total_cost", -1)]
+        )
+        async for document in documents:
+            by_status = {
+                status: totals
+                for status, totals in (document.get("by_status") or {}).items()
+                if totals.get("count", 0) > 0
+            }
+            result.setdefault(document["dimension"], []).append(
+                {
+                    "key": document["key"],
+                    "count": document["count"],
+                    # $inc on floats drifts by a fraction of a cent
+                    "total_cost": round(document["total_cost"], 2),
+                    "by_status": {
+                        status: {
+                            "count": totals["count"],
+                            "total_cost": round(totals["total_cost"], 2),
+                        }
+                        for status, totals in by_status.items()
+                    },
+                }
+            )
+        return result
+
+    async def rebuild(self) -> int:
+        """Recompute the summary from the requests; returns the number of groups.
+
+        Increments applied while the pipeline runs are lost when $out swaps
+        the collection in, so run it when writes are quiet.
+        """
+        pipeline = rebuild_pipeline(self.requests.name, self.summaries.name)
+        await (await self.requests.aggregate(pipeline)).to_list()
+        self.rebuilds += 1
+        return await self.summaries.count_documents({})
+
+    async def ensure_built(self) -> bool:
+        """Rebuild if the summary is empty but requests exist; True if it did."""
+        if await self.summaries.find_one({}, {"_id": 1}) is not None:
+            return False
+        if await self.requests.find_one({}, {"_id": 1}) is None:
+            return False
+        await self.rebuild()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {"failed_updates": self.failed_updates, "rebuilds": self.rebuilds}
@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import regex
+
+from api.config import Config
+
+AMOUNT = r"(?:\d{1,3}(?:[.,]\d{3})+|\d+)(?:[.,]\d{1,2})?"
+CURRENCY = r"(?:€|EUR|\$|USD|£|GBP|CHF)"
+
+# Country prefixes of EU VAT IDs (Austria's carry a U), Northern Ireland's and
+# the UK's
+VAT_VALUE = (
+    r"(?P<vat>(?:AT ?U|BE|BG|CY|CZ|DE|DK|EE|EL|ES|FI|FR|GB|HR|HU|IE|IT|LT|LU|LV"
+    r"|MT|NL|PL|PT|RO|SE|SI|SK|XI) ?\d(?: ?[0-9A-Z]){7,11})(?![0-9A-Z])"
+)
+VAT_LABEL = regex.compile(
+    r"\b(?:Umsatzsteuer-Identifikationsnummer(?:\s*\(VAT\s*ID\))?"
+    r"|USt[.\-\s]*Id(?:[.\-\s]*Nr)?"
+    r"|VAT(?:[.\-\s]*(?:ID|Reg(?:istration)?|No)(?:[.\-\s]*No)?)?|UID)\.?\s*:?\s*"
+    + VAT_VALUE,
+    regex.IGNORECASE,
+)
+# "Id-Nr" alone also labels customer and other numbers
+ID_NR_LABEL = regex.compile(r"\bId[.\-\s]*Nr\.?\s*:?\s*" + VAT_VALUE, regex.IGNORECASE)
+VAT_BARE = regex.compile(r"(?<![0-9A-Z])(?P<vat>DE\s?\d{3}\s?\d{3}\s?\d{3})(?!\s?\d)")
+
+# "1,28 qm 559,00 715,52", "1,00 Stk. 894,08 -20,00% 715,26", "1 €1.467,61 €1.467,61"
+ROW = regex.compile(
+    rf"^(?P<amount>\d+(?:[.,]\d+)?)\s+(?P<unit>[^\d\s€$£%][^\s€$£]*\.?)?\s*{CURRENCY}?\s*"
+    rf"(?P<unit_price>{AMOUNT})\s*{CURRENCY}?\s+(?:(?P<discount>-?\d+(?:[.,]\d+)?)\s*%\s+)?"
+    rf"{CURRENCY}?\s*(?P<total_price>{AMOUNT})\s*{CURRENCY}?$"
+)
+# "1.2 1,00 220829090030 Transport, Verpackung und Versand. 320,00 € 320,00 €24"
+POSITION_ROW = regex.compile(
+    rf"^(?P<position>\d+(?:\.\d+)+)\s+(?P<amount>\d+(?:[.,]\d+)?)\s+(?:\d{{4,}}\s+)?"
+    rf"(?P<description>.+?)\s+{CURRENCY}?\s*(?P<unit_price>{AMOUNT})\s*{CURRENCY}?\s+"
+    rf"{CURRENCY}?\s*(?P<total_price>{AMOUNT})\s*{CURRENCY}?(?:\d{{1,2}})?$"
+)
+# "1. Product: Adobe Photoshop License / Unit Price: €150 / Quantity: 10 / Total: €1500"
+LABELED_ITEM = regex.compile(
+    rf"(?:Product|Item|Description|Artikel|Bezeichnung)\s*:\s*(?P<description>[^\n]+)\n"
+    rf"\s*(?:Unit\s*Price|Einzelpreis|Preis)\s*:\s*{CURRENCY}?\s*(?P<unit_price>{AMOUNT})"
+    rf"\s*{CURRENCY}?\s*\n"
+    rf"\s*(?:Quantity|Qty|Amount|Menge|Anzahl)\s*:\s*(?P<amount>\d+(?:[.,]\d+)?)"
+    rf"(?:\s*(?P<unit>[^\d\s]\S*))?\s*\n"
+    rf"\s*(?:Total(?:\s*Price)?|Gesamt(?:preis)?)\s*:\s*{CURRENCY}?\s*(?P<total_price>{AMOUNT})",
+    regex.IGNORECASE,
+)
+POSITION_START = regex.compile(r"^\d+(?:\.\d+)*[a-z]?\.?\s+\S")
+TABLE_HEADER = regex.compile(
+    r"\b(?:Pos|Menge|Qty|Quantity|Bezeichnung|Beschreibung|Description)\b",
+    regex.IGNORECASE,
+)
+ANY_AMOUNT = regex.compile(rf"(?<![\d.,]){AMOUNT}(?![\d.,])")
+
+
+def parse_amount(value: str) -> float:
+    """Parse German (1.438,00) and English (1,438.00) amounts."""
+    value = regex.sub(r"[^\d.,]", "", value)
+    if "," in value and "." in value:
+        decimal = "," if value.rfind(",") > value.rfind(".") else "."
+    elif "," in value:
+        decimal = "," if len(value) - value.rfind(",") - 1 != 3 else ""
+    elif "." in value:
+        decimal = "." if len(value) - value.rfind(".") - 1 != 3 else ""
+    else:
+        decimal = ""
+
+    thousands = {",", "."} - {decimal}
+    for separator in thousands:
+        value = value.replace(separator, "")
+    return float(value.replace(decimal, ".") if decimal else value)
+
+
+@dataclass
+class RuleExtraction:
+    values: Dict[str, Any] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+
+    def confident(self, min_confidence: float) -> Dict[str, Any]:
+        return {
+            name: value
+            for name, value in self.values.items()
+            if self.confidence.get(name, 0.0) >= min_confidence
+        }
+
+    def missing(self, required_fields: List[str], min_confidence: float) -> List[str]:
+        confident = self.confident(min_confidence)
+        return [name for name in required_fields if name not in confident]
+
+
+class RuleExtractor:
+    """Deterministic regex extraction of fields that are plain to see in the text.
+
+    Fills vat_id, order_lines and total_cost with a confidence score, so the
+    LLM only has to be asked for what the rules could not establish. Order
+    lines are only trusted when every line's arithmetic checks out and their
+    sum matches a total printed in the document; that filters out optional and
+    alternative positions, which the rules cannot tell apart from ordered ones.
+    """
+
+    FIELDS = ("vat_id", "order_lines", "total_cost")
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.documents = 0
+        self.hits = {name: 0 for name in self.FIELDS}
+
+    def extract(self, text: str) -> RuleExtraction:
+        result = RuleExtraction()
+        self._extract_vat_id(text, result)
+        self._extract_order_lines(text, result)
+
+        self.documents += 1
+        for name in result.confident(self.config.rule_min_confidence):
+            self.hits[name] += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "hit_rate": {
+                name: hits / self.documents if self.documents else 0.0
+                for name, hits in self.hits.items()
+            },
+        }
+
+    @staticmethod
+    def _extract_vat_id(text: str, result: RuleExtraction):
+        match = VAT_LABEL.search(text)
+        if match:
+            result.values["vat_id"] = regex.sub(r"\s", "", match.group("vat")).upper()
+            result.confidence["vat_id"] = 0.95
+            return
+
+        # Could be the buyer's own VAT ID, or not a VAT ID at all, so never
+        # enough to skip the LLM
+        match = ID_NR_LABEL.search(text) or VAT_BARE.search(text)
+        if match:
+            result.values["vat_id"] = regex.sub(r"\s", "", match.group("vat")).upper()
+            result.confidence["vat_id"] = 0.6
+
+    def _extract_order_lines(self, text: str, result: RuleExtraction):
+        lines = text.splitlines()
+        order_lines: List[Dict[str, Any]] = []
+        row_indexes = set()
+
+        for match in LABELED_ITEM.finditer(text):
+            order_lines.append(self._order_line(match, match.group("description")))
+
+        for i, line in enumerate(lines):
+            line = line.strip()
+            match = POSITION_ROW.match(line)
+            if match:
+                order_lines.append(self._order_line(match, match.group("description")))
+                row_indexes.add(i)
+                continue
+
+            match = ROW.match(line)
+            if match:
+                description = self._description_before(lines, i, row_indexes)
+                if description:
+                    order_lines.append(self._order_line(match, description))
+                    row_indexes.add(i)
+
+        if not order_lines:
+            return
+
+        # Stripped before the check, which stops at the first inconsistent line
+        discounts = [line.pop("_discount", 0.0) for line in order_lines]
+        consistent = all(
+            self._is_consistent(line, discount)
+            for line, discount in zip(order_lines, discounts)
+        )
+        total = round(sum(line["total_price"] for line in order_lines), 2)
+        printed_totals = {
+            round(parse_amount(amount), 2)
+            for i, line in enumerate(lines)
+            if i not in row_indexes
+            for amount in ANY_AMOUNT.findall(line)
+        }
+        # A single labelled item prints its total on its own line, which is not a row
+        confirmed = total in printed_totals and (
+            len(order_lines) > 1 or bool(row_indexes)
+        )
+
+        result.values["order_lines"] = order_lines
+        result.values["total_cost"] = total
+        confidence = 0.95 if consistent and confirmed else 0.7 if consistent else 0.4
+        result.confidence["order_lines"] = confidence
+        result.confidence["total_cost"] = confidence
+
+    @staticmethod
+    def _description_before(lines: List[str], index: int, row_indexes: set) -> str:
+        """Collect the description lines above a row, back to its position number."""
+        collected = []
+        for j in range(index - 1, max(index - 6, -1), -1):
+            line = lines[j].strip()
+            if j in row_indexes or TABLE_HEADER.search(line):
+                break
+            collected.append(line)
+            if POSITION_START.match(line):
+                break
+        description = " ".join(reversed(collected))
+        return regex.sub(r"^\d+(?:\.\d+)*[a-z]?\.?\s+", "", description).strip()
+
+    @staticmethod
+    def _order_line(match, description: str) -> Dict[str, Any]:
+        groups = match.groupdict()
+        amount = parse_amount(groups["amount"])
+        line = {
+            # pdf text layers sometimes carry control characters
+            "description": " ".join(regex.sub(r"\p{Cc}", " ", description).split()),
+            "unit_price": parse_amount(groups["unit_price"]),
+            "amount": int(amount) if amount.is_integer() else amount,
+            "unit": (groups.get("unit") or "").strip(),
+            "total_price": parse_amount(groups["total_price"]),
+        }
+        if groups.get("discount"):
+            line["_discount"] = parse_amount(groups["discount"]) / 100
+        return line
+
+    @staticmethod
+    def _is_consistent(line: Dict[str, Any], discount: float) -> bool:
+        expected = line["unit_price"] * line["amount"] * (1 - abs(discount))
+        return abs(expected - line["total_price"]) <= 0.02 + 0.001 * line["total_price"]
@@ -0,0 +1,148 @@
+import re
+from typing import Any, List, Optional, Tuple
+
+import orjson
+
+_STRUCTURAL = re.compile(r'["{}\[\]:,]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+_INVALID = object()
+
+
+def _decode(text: str) -> Any:
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return _INVALID
+
+
+class IncrementalPayloadParser:
+    """Parses a streamed JSON object, returning its top-level fields as they close.
+
+    Each element of the list field (order_lines) is returned on its own as
+    soon as its closing brace arrives, rather than once the whole list has.
+    Only characters not seen before are scanned, jumping from one structural
+    character to the next, and a value is decoded with orjson once. Anything
+    before the first "{", such as a ```json fence, is skipped. Malformed values
+    are dropped here; the complete response is parsed again at the end anyway.
+    """
+
+    def __init__(self, list_field: str = "order_lines"):
+        self.list_field = list_field
+        self._text = ""
+        self._pos = 0
+        # Start of the key, value or list element being read, if any
+        self._start: Optional[int] = None
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._in_list = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add a chunk; returns (field, value) pairs completed by it.
+
+        Order lines come as ("order_lines", line), one pair per line.
+        """
+        if self._done:
+            return []
+        self._text += chunk
+        parsed: List[Tuple[str, Any]] = []
+        text = self._text
+        pos = self._pos
+
+        if not self._started:
+            pos = text.find("{", pos)
+            if pos == -1:
+                self._text, self._pos = "", 0
+                return parsed
+            self._started = True
+            self._depth = 1
+            pos += 1
+
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                i = match.start()
+                if text[i] == "\\":
+                    if i + 1 == len(text):
+                        # The escaped character is in the next chunk
+                        pos = i
+                        break
+                    pos = i + 2
+                    continue
+                self._in_string = False
+                pos = i + 1
+                if self._depth == 1:
+                    value = _decode(text[self._start : pos])
+                    if self._expect_key:
+                        self._key = value if value is not _INVALID else None
+                        self._expect_key = False
+                    else:
+                        self._emit(parsed, value)
+                    self._start = None
+                continue
+
+            match = _STRUCTURAL.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            i = match.start()
+            char = text[i]
+            pos = i + 1
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._start = i
+            elif self._depth == 1:
+                if char == ":":
+                    # A number, boolean or null runs until the next , or }
+                    self._start = pos
+                elif char in ",}":
+                    if self._start is not None:
+                        self._emit(parsed, _decode(text[self._start : i]))
+                        self._start = None
+                    self._expect_key = True
+                    if char == "}":
+                        self._done = True
+                        break
+                elif char in "{[":
+                    self._depth = 2
+                    self._in_list = char == "[" and self._key == self.list_field
+                    self._start = None if self._in_list else i
+            elif char in "{[":
+                self._depth += 1
+                if self._in_list and self._depth == 3 and char == "{":
+                    self._start = i
+            elif char in "}]":
+                self._depth -= 1
+                if self._in_list and self._depth == 2 and self._start is not None:
+                    line = _decode(text[self._start : pos])
+                    if isinstance(line, dict):
+                        parsed.append((self.list_field, line))
+                    self._start = None
+                elif self._depth == 1:
+                    if not self._in_list:
+                        self._emit(parsed, _decode(text[self._start : pos]))
+                    self._in_list = False
+                    self._start = None
+
+        # Drop what has been consumed so the buffer stays the size of one value
+        keep = pos if self._start is None else self._start
+        self._text = text[keep:]
+        self._pos = pos - keep
+        if self._start is not None:
+            self._start = 0
+        return parsed
+
+    def _emit(self, parsed: List[Tuple[str, Any]], value: Any):
+        # A scalar in place of the order line list has no lines to report
+        if value is not _INVALID and self._key is not None:
+            if self._key != self.list_field:
+                parsed.append((self._key, value))
@@ -1,35 +1,152 @@
-import io
-import pdfplumber
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from api.config import Config
+from api.services.metrics import DOCUMENT_PAGES
+from api.services.pdf_backends import PDF_BACKENDS, inspect_pdf
+from api.services.uploads import DocumentSource, read_source
+
+# Worker functions are module-level so they can be pickled into the process pool
+
+
+def _extract_pdf_pages(
+    source: DocumentSource, start: int, end: int, backend: str
+) -> List[Tuple[int, str]]:
+    return PDF_BACKENDS[backend](source, start, end)
+
+
+def _format_page(page_number: int, text: str) -> str:
+    return f"--- Page {page_number} ---\n{text}"
 
 
 class TextExtractor:
-    def __init__(self):
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self._pool: Optional[ProcessPoolExecutor] = None
         self.extractors = {
             "application/pdf": self._extract_from_pdf,
             "text/plain": self._extract_from_text,
             "application/octet-stream": self._extract_from_text,
         }
 
-    def extract(self, content: bytes, content_type: str) -> str:
+    def extract(self, content: DocumentSource, content_type: str) -> str:
         extractor = self.extractors.get(content_type)
         if not extractor:
             raise ValueError(f"Unsupported content type: {content_type}")
 
         return extractor(content)
 
-    def _extract_from_pdf(self, content: bytes) -> str:
-        pdf_file = io.BytesIO(content)
-        extracted_text = ""
+    async def aextract(
+        self,
+        content: DocumentSource,
+        content_type: str,
+        max_chars: Optional[int] = None,
+    ) -> str:
+        """Extract text without blocking the event loop.
+
+        PDF pages are parsed in parallel in a bounded process pool, since
+        pdfplumber is CPU-bound and holds the GIL. With max_chars set, parsing
+        stops once that much text has been collected.
+        """
+        if content_type not in self.extractors:
+            raise ValueError(f"Unsupported content type: {content_type}")
+
+        if content_type != "application/pdf":
+            return self._extract_from_text(content)
+
+        parts = []
+        collected = 0
+        pages = self.aiter_pages(content)
+        try:
+            async for page_number, text in pages:
+                parts.append(_format_page(page_number, text))
+                collected += len(parts[-1]) + 1
+                if max_chars is not None and collected >= max_chars:
+                    break
+        finally:
+            await pages.aclose()
+            DOCUMENT_PAGES.inc(len(parts))
+
+        return "\n".join(parts).strip()
+
+    async def aiter_pages(
+        self, content: DocumentSource
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Yield (page_number, text) in page order while shards parse in parallel.
+
+        Every shard's task carries the content, so a spooled document goes to
+        the workers as its path rather than as bytes pickled once per shard.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        shards = []
+        try:
+            page_count, backend = await loop.run_in_executor(
+                pool, inspect_pdf, content, self.config
+            )
+
+            shard_size = self.config.extraction_pages_per_shard
+            shards = [
+                loop.run_in_executor(
+                    pool,
+                    _extract_pdf_pages,
+                    content,
+                    start,
+                    min(start + shard_size, page_count),
+                    backend,
+                )
+                for start in range(0, page_count, shard_size)
+            ]
+            for shard in shards:
+                for page in await shard:
+                    yield page
+        except BrokenProcessPool as e:
+            # A worker died (out of memory, a crash in the PDF library); the
+            # pool is unusable from then on, so the next document gets a new one
+            self._discard_pool(pool)
+            raise RuntimeError("PDF parsing crashed on this document") from e
+        finally:
+            # Drop shards that have not started yet when the caller stops early
+            for shard in shards:
+                shard.cancel()
+
+    def iter_pages(self, content: DocumentSource) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) shard by shard in the calling process."""
+        page_count, backend = inspect_pdf(content, self.config)
+        shard_size = self.config.extraction_pages_per_shard
+        for start in range(0, page_count, shard_size):
+            yield from _extract_pdf_pages(
+                content, start, min(start + shard_size, page_count), backend
+            )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.config.extraction_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
 
-        with pdfplumber.open(pdf_file) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    extracted_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
+    def close(self):
+        if self._pool is not None:
+            self._discard_pool(self._pool)
 
-        return extracted_text.strip()
+    def _extract_from_pdf(self, content: DocumentSource) -> str:
+        return "\n".join(
+            _format_page(page_number, text)
+            for page_number, text in self.iter_pages(content)
+        ).strip()
 
-    def _extract_from_text(self, content: bytes) -> str:
+    def _extract_from_text(self, content: DocumentSource) -> str:
+        content = read_source(content)
         try:
             return content.decode("utf-8")
         except UnicodeDecodeError:
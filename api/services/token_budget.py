@@ -0,0 +1,291 @@
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from api.config import Config
+
+PAGE_MARKER = re.compile(r"^--- Page (\d+) ---$", re.MULTILINE)
+AMOUNT = re.compile(r"\d{1,3}(?:[.,]\d{3})*[.,]\d{2}\b")
+TOTALS = re.compile(
+    r"\b(total|subtotal|summe|gesamt\w*|endsumme|netto\w*|brutto\w*|ust|mwst|"
+    r"umsatzsteuer|vat|tax)\b",
+    re.IGNORECASE,
+)
+VAT_ID = re.compile(
+    r"\b[A-Z]{2}\s?\d(?:\s?\d){7,11}\b|\b(ust|vat|id)[.\-\s]*(id|nr)", re.IGNORECASE
+)
+TABLE_HEADER = re.compile(
+    r"\b(pos|menge|qty|quantity|einheit|unit|einzelpreis|preis|price|bezeichnung|"
+    r"description|artikel)\b",
+    re.IGNORECASE,
+)
+OMITTED = "[...]"
+
+logger = logging.getLogger(__name__)
+
+
+class _ApproximateEncoding:
+    """Roughly four characters per token, for when tiktoken data cannot be loaded."""
+
+    def encode(self, text: str, disallowed_special=()) -> List[int]:
+        return [0] * ((len(text) + 3) // 4)
+
+
+@dataclass
+class BudgetResult:
+    text: str
+    original_tokens: int
+    final_tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.final_tokens
+
+
+class TokenBudgeter:
+    """Fits extracted document text into a token budget for the LLM prompt.
+
+    Instead of cutting at a character offset, it first drops page headers and
+    footers that repeat on every page and collapses whitespace, then, if the
+    text is still too long, keeps the highest-ranked sections (order-line
+    tables, totals, VAT IDs, the letterhead) in their original order.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._encoding = None
+        self.documents = 0
+        self.original_tokens = 0
+        self.final_tokens = 0
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            import tiktoken
+
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.config.model_name)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # tiktoken downloads its BPE files on first use
+                logger.warning(
+                    "Could not load tiktoken encoding, estimating tokens",
+                    extra={"error": str(e)},
+                )
+                self._encoding = _ApproximateEncoding()
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def fit(self, text: str, max_tokens: int) -> BudgetResult:
+        original_tokens = self.count(text)
+
+        pages = self._remove_repeated_edges(self._split_pages(text))
+        compacted = self._join(
+            [(number, self._collapse_whitespace(lines)) for number, lines in pages]
+        )
+        final_tokens = self.count(compacted)
+        if final_tokens > max_tokens:
+            compacted = self._select_sections(pages, max_tokens)
+            final_tokens = self.count(compacted)
+
+        self.record(original_tokens, final_tokens)
+        return BudgetResult(compacted, original_tokens, final_tokens)
+
+    def split_chunks(self, text: str, max_tokens: int) -> List[str]:
+        """Clean the text like fit() and split it on page boundaries into chunks.
+
+        Pages are packed greedily into chunks of at most max_tokens; a single
+        page over the limit is split between lines.
+        """
+        original_tokens = self.count(text)
+        pages = self._remove_repeated_edges(self._split_pages(text))
+
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+        for number, lines in pages:
+            lines = self._collapse_whitespace(lines)
+            if number:
+                lines = [f"--- Page {number} ---"] + lines
+            page_tokens = self.count("\n".join(lines)) + 1
+            if current and current_tokens + page_tokens > max_tokens:
+                chunks.append("\n".join(current).strip())
+                current, current_tokens = [], 0
+            if page_tokens <= max_tokens:
+                current.extend(lines)
+                current_tokens += page_tokens
+                continue
+
+            for line in lines:
+                line_tokens = self.count(line) + 1
+                if current and current_tokens + line_tokens > max_tokens:
+                    chunks.append("\n".join(current).strip())
+                    current, current_tokens = [], 0
+                current.append(line)
+                current_tokens += line_tokens
+        if current:
+            chunks.append("\n".join(current).strip())
+
+        self.record(original_tokens, sum(self.count(chunk) for chunk in chunks))
+        return chunks
+
+    def record(self, original_tokens: int, final_tokens: int):
+        self.documents += 1
+        self.original_tokens += original_tokens
+        self.final_tokens += final_tokens
+
+    def stats(self) -> Dict[str, float]:
+        saved = self.original_tokens - self.final_tokens
+        return {
+            "documents": self.documents,
+            "original_tokens": self.original_tokens,
+            "final_tokens": self.final_tokens,
+            "tokens_saved": saved,
+            "tokens_saved_per_document": saved / self.documents
+            if self.documents
+            else 0.0,
+        }
+
+    @staticmethod
+    def _split_pages(text: str) -> List[Tuple[int, List[str]]]:
+        markers = list(PAGE_MARKER.finditer(text))
+        if not markers:
+            return [(0, text.splitlines())]
+
+        pages = []
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+            pages.append(
+                (int(marker.group(1)), text[marker.end() : end].strip("\n").splitlines())
+            )
+        return pages
+
+    def _remove_repeated_edges(
+        self, pages: List[Tuple[int, List[str]]]
+    ) -> List[Tuple[int, List[str]]]:
+        """Drop header/footer lines repeated across pages, keeping the first copy.
+
+        Only the first and last token_budget_edge_lines lines of each page are
+        looked at, and a line only counts as repeated if it is the same word for
+        word. Lines with amounts are never dropped: an order line on a later
+        page can read exactly like one on the first. The first copy stays
+        because letterheads and footers carry the vendor name and VAT ID.
+        """
+        if len(pages) < 2:
+            return pages
+
+        scan = self.config.token_budget_edge_lines
+
+        def is_edge(i: int, lines: List[str]) -> bool:
+            return i < scan or i >= len(lines) - scan
+
+        def edge_keys(lines):
+            return {
+                key
+                for i, line in enumerate(lines)
+                if is_edge(i, lines) and (key := self._edge_key(line))
+            }
+
+        counts: Dict[str, int] = {}
+        for _, lines in pages:
+            for key in edge_keys(lines):
+                counts[key] = counts.get(key, 0) + 1
+        repeated = {
+            key for key, count in counts.items() if count >= max(2, len(pages) / 2)
+        }
+
+        cleaned = [pages[0]]
+        for number, lines in pages[1:]:
+            kept = [
+                line
+                for i, line in enumerate(lines)
+                if not (is_edge(i, lines) and self._edge_key(line) in repeated)
+            ]
+            cleaned.append((number, kept))
+        return cleaned
+
+    @staticmethod
+    def _edge_key(line: str) -> str:
+        """The line with whitespace collapsed, or "" if it can never be an edge."""
+        if AMOUNT.search(line):
+            return ""
+        return " ".join(line.split())
+
+    @staticmethod
+    def _collapse_whitespace(lines: List[str]) -> List[str]:
+        collapsed = []
+        for line in lines:
+            line = " ".join(line.split())
+            if line or (collapsed and collapsed[-1]):
+                collapsed.append(line)
+        return collapsed
+
+    @staticmethod
+    def _join(pages: List[Tuple[int, List[str]]]) -> str:
+        parts = []
+        for number, lines in pages:
+            if number:
+                parts.append(f"--- Page {number} ---")
+            parts.extend(lines)
+        return "\n".join(parts).strip()
+
+    @staticmethod
+    def _score_line(line: str) -> float:
+        score = 0.0
+        amounts = len(AMOUNT.findall(line))
+        if amounts:
+            score += 2 if amounts == 1 else 3
+        if TOTALS.search(line):
+            score += 3
+        if VAT_ID.search(line):
+            score += 4
+        if TABLE_HEADER.search(line):
+            score += 1
+        return score
+
+    def _select_sections(
+        self, pages: List[Tuple[int, List[str]]], max_tokens: int
+    ) -> str:
+        size = self.config.token_budget_section_lines
+        sections = []
+        for number, lines in pages:
+            lines = self._collapse_whitespace(lines)
+            for start in range(0, len(lines), size):
+                chunk = lines[start : start + size]
+                score = sum(self._score_line(line) for line in chunk) / len(chunk)
+                if not sections:
+                    # The letterhead names the vendor and the requestor
+                    score += 2
+                sections.append((number, chunk, score, self.count("\n".join(chunk))))
+
+        # Page markers and omission markers cost tokens too
+        overhead = self.count(f"--- Page 0 ---\n{OMITTED}\n") * len(pages)
+        remaining = max_tokens - overhead
+        keep = set()
+        ranked = sorted(range(len(sections)), key=lambda i: sections[i][2], reverse=True)
+        for i in ranked:
+            tokens = sections[i][3] + 1
+            if tokens <= remaining:
+                keep.add(i)
+                remaining -= tokens
+
+        parts = []
+        current_page = None
+        omitted = False
+        for i, (number, chunk, _, _) in enumerate(sections):
+            if i not in keep:
+                omitted = True
+                continue
+            if number != current_page:
+                if number:
+                    parts.append(f"--- Page {number} ---")
+                current_page = number
+            elif omitted:
+                parts.append(OMITTED)
+            omitted = False
+            parts.extend(chunk)
+        return "\n".join(parts).strip()
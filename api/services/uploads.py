@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+from api.config import Config
+
+# A document's content: bytes when small, the path of its spool file otherwise.
+# Paths are what the extraction process pool receives instead of the bytes.
+DocumentSource = Union[bytes, Path]
+
+PDF_MAGIC = b"%PDF-"
+# Readers accept the PDF header anywhere in the first kilobyte
+PDF_HEADER_WINDOW = 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UnsupportedUpload(ValueError):
+    pass
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from a document's first bytes; None if it cannot be extracted.
+
+    Only PDF and plain text are supported. Anything without NUL bytes in its
+    first chunk is taken as text, which rules out Office formats and images.
+    """
+    if PDF_MAGIC in head[:PDF_HEADER_WINDOW]:
+        return "application/pdf"
+    if head and b"\x00" not in head:
+        return "text/plain"
+    return None
+
+
+def source_size(source: DocumentSource) -> int:
+    if isinstance(source, Path):
+        return source.stat().st_size
+    return len(source)
+
+
+def source_digest(source: DocumentSource) -> bytes:
+    if isinstance(source, Path):
+        with open(source, "rb") as f:
+            return hashlib.file_digest(f, "sha256").digest()
+    return hashlib.sha256(source).digest()
+
+
+def read_source(source: DocumentSource) -> bytes:
+    if isinstance(source, Path):
+        return source.read_bytes()
+    return source
+
+
+@dataclass
+class SpooledUpload:
+    content_type: str
+    size: int
+    # SHA-256 of the content, computed while it was read
+    digest: bytes
+    source: DocumentSource
+    # Set when source is the multipart parser's own temp file, reached through
+    # this descriptor; it stays open until close()
+    fd: Optional[int] = None
+
+    def open(self) -> BinaryIO:
+        if isinstance(self.source, Path):
+            return open(self.source, "rb")
+        return io.BytesIO(self.source)
+
+    def close(self):
+        """Delete the spool file, or release the parser's, if there is one."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        elif isinstance(self.source, Path):
+            self.source.unlink(missing_ok=True)
+
+
+def _rolled_to_disk(stream) -> Optional[BinaryIO]:
+    """The temp file behind an upload the multipart parser already put on disk.
+
+    Only where other processes can reopen it by path, under /proc.
+    """
+    file = getattr(stream, "file", None)
+    # Starlette spools each file into a SpooledTemporaryFile, which has no
+    # public way to tell whether it is still in memory
+    if getattr(file, "_rolled", False) and os.path.isdir("/proc/self/fd"):
+        return file
+    return None
+
+
+def _spool_in_place(file: BinaryIO, config: Config) -> SpooledUpload:
+    """Check and hash an upload already on disk, without copying it."""
+    max_bytes = config.max_file_size_mb * 1024 * 1024
+    chunk_size = config.upload_chunk_kb * 1024
+    # Kept open past the request, since the parser closes its file once the
+    # handler returns and streamed responses still read it afterwards
+    fd = os.dup(file.fileno())
+    try:
+        size = os.fstat(fd).st_size
+        if size > max_bytes:
+            raise UploadTooLarge(
+                f"File is larger than the {config.max_file_size_mb} MB limit"
+            )
+        head = os.pread(fd, chunk_size, 0)
+        if not head:
+            raise UnsupportedUpload("The file is empty")
+        content_type = sniff_content_type(head)
+        if content_type is None:
+            raise UnsupportedUpload("Only PDF and plain text files are supported")
+
+        digest = hashlib.sha256()
+        offset = 0
+        while chunk := os.pread(fd, chunk_size, offset):
+            digest.update(chunk)
+            offset += len(chunk)
+    except BaseException:
+        os.close(fd)
+        raise
+    source = Path(f"/proc/{os.getpid()}/fd/{fd}")
+    return SpooledUpload(content_type, size, digest.digest(), source, fd)
+
+
+async def spool(stream, config: Config) -> SpooledUpload:
+    """Read an upload chunk by chunk from anything with an async read(size).
+
+    The type is sniffed from the first chunk and the size checked after every
+    chunk, so unsupported and oversize uploads are rejected without reading
+    the rest. Small uploads stay in memory; once one outgrows
+    Config.upload_memory_max_kb it continues into a temp file, so at most one
+    chunk of a large upload is in memory at a time. A multipart upload the
+    parser already moved to disk is hashed and used where it is instead of
+    being copied. Call close() when done.
+    """
+    file = _rolled_to_disk(stream)
+    if file is not None:
+        # Hashing a large file would block the event loop
+        return await asyncio.to_thread(_spool_in_place, file, config)
+
+    max_bytes = config.max_file_size_mb * 1024 * 1024
+    chunk_size = config.upload_chunk_kb * 1024
+    memory_max = config.upload_memory_max_kb * 1024
+
+    content_type = None
+    size = 0
+    digest = hashlib.sha256()
+    chunks = []
+    spool_file = None
+    try:
+        while chunk := await stream.read(chunk_size):
+            if content_type is None:
+                content_type = sniff_content_type(chunk)
+                if content_type is None:
+                    raise UnsupportedUpload(
+                        "Only PDF and plain text files are supported"
+                    )
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(
+                    f"File is larger than the {config.max_file_size_mb} MB limit"
+                )
+            digest.update(chunk)
+
+            if spool_file is None and size > memory_max:
+                spool_file = tempfile.NamedTemporaryFile(
+                    prefix="upload-",
+                    dir=config.upload_spool_dir or None,
+                    delete=False,
+                )
+                spool_file.writelines(chunks)
+                chunks = []
+            # Writes land in the page cache; too quick to be worth a thread
+            if spool_file is None:
+                chunks.append(chunk)
+            else:
+                spool_file.write(chunk)
+    except BaseException:
+        if spool_file is not None:
+            spool_file.close()
+            os.unlink(spool_file.name)
+        raise
+
+    if content_type is None:
+        raise UnsupportedUpload("The file is empty")
+    if spool_file is None:
+        source = b"".join(chunks)
+    else:
+        spool_file.close()
+        source = Path(spool_file.name)
+    return SpooledUpload(content_type, size, digest.digest(), source)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional
+
+from api.config import Config
+
+LEGAL_FORMS = re.compile(
+    r"\b(gmbh|mbh|ag|kg|ohg|gbr|ug|e\.?\s?k|se|co|inc|ltd|llc|plc|corp|corporation|"
+    r"company|limited|haftungsbeschränkt)\b\.?",
+    re.IGNORECASE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_vat_id(vat_id: str) -> str:
+    return re.sub(r"[^0-9A-Z]", "", vat_id.upper())
+
+
+def normalize_vendor_name(name: str) -> str:
+    """Casefold and drop legal forms and punctuation: "Foo GmbH & Co. KG" -> "foo"."""
+    name = LEGAL_FORMS.sub(" ", name.casefold().replace("&", " "))
+    return " ".join(re.sub(r"[^\w]+", " ", name).split())
+
+
+class VendorRegistry:
+    """Known vendors from stored procurement requests, keyed by VAT ID and name.
+
+    The index is loaded from the requests collection on first use and then
+    refreshed incrementally, reading only requests created after the last one
+    seen. Edits and deletes of older requests are picked up by a periodic full
+    reload. Requests created through this process are added immediately.
+
+    Loads and refreshes run in a background task, so lookups never wait on
+    MongoDB: they answer from the index as it is, which is empty until the
+    first load. A failed refresh is retried after a backoff, not on the next
+    document.
+    """
+
+    def __init__(self, config: Config, collection=None):
+        self.config = config
+        if collection is None:
+            from api.db import MongoDB
+
+            collection = MongoDB.get_mongo_client().get_collection("requests")
+        self.collection = collection
+        self.by_vat: Dict[str, Dict[str, str]] = {}
+        self.by_name: Dict[str, Dict[str, str]] = {}
+        self._watermark: Optional[Dict[str, Any]] = None
+        self._refreshed_at = 0.0
+        self._loaded_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._retry_at = 0.0
+        self.refresh_failures = 0
+        self.lookups = 0
+        self.vat_hits = 0
+        self.name_hits = 0
+
+    def add(self, vendor_name: str, vat_id: str):
+        self._add(self.by_vat, self.by_name, vendor_name, vat_id)
+
+    @staticmethod
+    def _add(by_vat: dict, by_name: dict, vendor_name: str, vat_id: str):
+        if not vendor_name:
+            return
+        vendor = {"vendor_name": vendor_name, "vat_id": vat_id or ""}
+        if vat_id:
+            by_vat[normalize_vat_id(vat_id)] = vendor
+        name_key = normalize_vendor_name(vendor_name)
+        if name_key:
+            known = by_name.get(name_key)
+            # Keep a VAT ID learned earlier when a later request lacks one
+            if known is None or vat_id or not known["vat_id"]:
+                by_name[name_key] = vendor
+
+    async def refresh(self, full: bool = False):
+        """Load requests created since the last refresh, or everything if full."""
+        query: Dict[str, Any] = {"vendor_name": {"$nin": [None, ""]}}
+        reload = full or self._watermark is None
+        watermark = self._watermark
+        if reload:
+            # Built aside and swapped in, so lookups never see a half-loaded index
+            by_vat, by_name = {}, {}
+            watermark = None
+        else:
+            by_vat, by_name = self.by_vat, self.by_name
+            query["$or"] = [
+                {"created_at": {"$gt": watermark["created_at"]}},
+                {"created_at": watermark["created_at"], "_id": {"$gt": watermark["_id"]}},
+            ]
+
+        try:
+            # Oldest first, so the newest spelling of a vendor wins
+            cursor = self.collection.find(
+                query, {"vendor_name": 1, "vat_id": 1, "created_at": 1}
+            ).sort([("created_at", 1), ("_id", 1)])
+            async for document in cursor:
+                self._add(
+                    by_vat, by_name, document["vendor_name"], document.get("vat_id", "")
+                )
+                watermark = {
+                    "created_at": document["created_at"],
+                    "_id": document["_id"],
+                }
+        except Exception as e:
+            logger.warning("Vendor registry refresh failed", extra={"error": str(e)})
+            raise
+
+        now = time.monotonic()
+        if reload:
+            self.by_vat, self.by_name = by_vat, by_name
+            self._loaded_at = now
+        self._watermark = watermark
+        self._refreshed_at = now
+
+    def _refresh_if_stale(self):
+        """Start a background refresh if one is due and none is running."""
+        task = self._refresh_task
+        if (
+            task is not None
+            and not task.done()
+            # A task of an event loop that has since closed never finishes
+            and task.get_loop() is asyncio.get_running_loop()
+        ):
+            return
+        now = time.monotonic()
+        if now < self._retry_at:
+            return
+        if now - self._refreshed_at < self.config.vendor_registry_refresh_seconds:
+            return
+        full = now - self._loaded_at >= self.config.vendor_registry_reload_seconds
+        self._refresh_task = asyncio.create_task(self._refresh_in_background(full))
+
+    async def _refresh_in_background(self, full: bool):
+        try:
+            await self.refresh(full=full)
+        except Exception:
+            # Keep serving the current index; back off before the next attempt
+            self.refresh_failures += 1
+            backoff = min(
+                self.config.vendor_registry_retry_seconds
+                * 2 ** (self.refresh_failures - 1),
+                self.config.vendor_registry_reload_seconds,
+            )
+            self._retry_at = time.monotonic() + backoff
+        else:
+            self.refresh_failures = 0
+
+    async def lookup(
+        self, document_text: str, vat_id: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """Find the document's vendor by VAT ID, or by a letterhead line naming it.
+
+        Only letterhead lines are matched by name, and only when they name a
+        single known vendor, since the recipient's address is printed there too.
+        """
+        self._refresh_if_stale()
+        self.lookups += 1
+
+        if vat_id:
+            vendor = self.by_vat.get(normalize_vat_id(vat_id))
+            if vendor is not None:
+                self.vat_hits += 1
+                return dict(vendor)
+
+        lines = document_text.splitlines()[: self.config.vendor_letterhead_lines]
+        matches: Dict[str, Dict[str, str]] = {}
+        for line in lines:
+            name_key = normalize_vendor_name(line)
+            if name_key in self.by_name:
+                matches[name_key] = self.by_name[name_key]
+        if len(matches) == 1:
+            self.name_hits += 1
+            return dict(next(iter(matches.values())))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.vat_hits + self.name_hits
+        return {
+            "vendors_by_vat_id": len(self.by_vat),
+            "vendors_by_name": len(self.by_name),
+            "lookups": self.lookups,
+            "vat_id_hits": self.vat_hits,
+            "name_hits": self.name_hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "refresh_failures": self.refresh_failures,
+        }
@@ -0,0 +1,85 @@
+import functools
+import inspect
+import os
+
+import dotenv
+
+dotenv.load_dotenv(".env.local")
+
+# langfuse.decorators, imported and configured on the first traced call;
+# importing langfuse costs a few hundred milliseconds of cold start
+_context = None
+
+
+def _langfuse_context():
+    global _context
+    if _context is None:
+        from langfuse.decorators import langfuse_context
+
+        langfuse_context.configure(
+            secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+            public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+            host="https://cloud.langfuse.com",
+        )
+        _context = langfuse_context
+    return _context
+
+
+def get_langfuse():
+    """The one Langfuse client, shared with the observe() decorators."""
+    return _langfuse_context().client_instance
+
+
+def observe(name: str):
+    """langfuse's @observe, applied on the first call instead of at import."""
+
+    def decorator(function):
+        observed = None
+
+        def resolve():
+            nonlocal observed
+            if observed is None:
+                observed = _langfuse_context().observe(name=name)(function)
+            return observed
+
+        if inspect.isasyncgenfunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                generator = resolve()(*args, **kwargs)
+                try:
+                    async for item in generator:
+                        yield item
+                finally:
+                    # Closes the traced generator too when the consumer stops early
+                    await generator.aclose()
+
+        elif inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                return await resolve()(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                return resolve()(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def update_current_trace(**kwargs):
+    _langfuse_context().update_current_trace(**kwargs)
+
+
+def score_current_trace(**kwargs):
+    _langfuse_context().score_current_trace(**kwargs)
+
+
+def flush():
+    """Send buffered traces; nothing to do if nothing was traced."""
+    if _context is not None:
+        _context.flush()
@@ -0,0 +1,197 @@
+"""Requests/sec for creating, updating and deleting requests: single vs bulk routes.
+
+Needs a reachable MongoDB (MONGODB_ATLAS_URI, e.g. a local mongod). The routes
+write to throwaway requests and summary collections, which are dropped
+afterwards. Each operation is run on --docs requests three ways:
+
+- single: one call per request, --concurrency at a time
+- bulk: calls of --batch-size requests or ids, one after another
+- import (creation only): one NDJSON body with every request
+
+    python -m benchmarks.bench_bulk_requests [--docs 2000] [--batch-size 500]
+        [--concurrency 1 8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+from fastapi import FastAPI
+from pymongo import AsyncMongoClient
+
+from api.config import Config
+from api.routes import procurement
+from api.services.request_summary import RequestSummary
+from benchmarks.bench_requests_list import make_document
+
+BENCH_COLLECTION = "requests_bulk_benchmark"
+SUMMARY_COLLECTION = "request_summaries_bulk_benchmark"
+
+
+def make_request(i: int) -> dict:
+    request = make_document(i)
+    request["department"] = ("IT", "HR", "Sales", "Marketing")[i % 4]
+    for field in ("created_at", "updated_at"):
+        request[field] = request[field].isoformat()
+    return request
+
+
+def chunked(items, size: int):
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+async def gather_limited(concurrency: int, calls):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(call):
+        async with semaphore:
+            response = await call()
+            response.raise_for_status()
+            return response
+
+    return await asyncio.gather(*(limited(call) for call in calls))
+
+
+async def create_single(client, requests, concurrency):
+    responses = await gather_limited(
+        concurrency,
+        [lambda r=r: client.post("/api/requests", json=r) for r in requests],
+    )
+    return [response.json()["_id"] for response in responses]
+
+
+async def create_bulk(client, requests, batch_size):
+    ids = []
+    for batch in chunked(requests, batch_size):
+        response = await client.post("/api/requests/bulk", json=batch)
+        response.raise_for_status()
+        ids.extend(result["id"] for result in response.json()["results"])
+    return ids
+
+
+async def create_import(client, requests):
+    body = "".join(json.dumps(request) + "\n" for request in requests)
+    response = await client.post(
+        "/api/requests/import",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    response.raise_for_status()
+    assert response.json()["failed"] == 0, response.json()
+
+
+async def update_single(client, ids, concurrency):
+    await gather_limited(
+        concurrency,
+        [
+            lambda i=i: client.patch(
+                f"/api/requests/{i}/status", json={"status": "CLOSED"}
+            )
+            for i in ids
+        ],
+    )
+
+
+async def update_bulk(client, ids, batch_size):
+    for batch in chunked(ids, batch_size):
+        response = await client.patch(
+            "/api/requests/bulk/status", json={"ids": batch, "status": "CLOSED"}
+        )
+        response.raise_for_status()
+
+
+async def delete_single(client, ids, concurrency):
+    await gather_limited(
+        concurrency, [lambda i=i: client.delete(f"/api/requests/{i}") for i in ids]
+    )
+
+
+async def delete_bulk(client, ids, batch_size):
+    for batch in chunked(ids, batch_size):
+        response = await client.post("/api/requests/bulk/delete", json={"ids": batch})
+        response.raise_for_status()
+
+
+async def timed(call) -> float:
+    started = time.perf_counter()
+    await call
+    return time.perf_counter() - started
+
+
+async def run(client, requests, args, rows):
+    docs = len(requests)
+
+    def report(operation, mode, seconds):
+        rows.append((operation, mode, docs / seconds))
+        print(f"{operation:8} {mode:14} {docs / seconds:10.1f}")
+
+    for concurrency in args.concurrency:
+        mode = f"single c={concurrency}"
+        started = time.perf_counter()
+        ids = await create_single(client, requests, concurrency)
+        report("create", mode, time.perf_counter() - started)
+        report("status", mode, await timed(update_single(client, ids, concurrency)))
+        report("delete", mode, await timed(delete_single(client, ids, concurrency)))
+
+    mode = f"bulk b={args.batch_size}"
+    started = time.perf_counter()
+    ids = await create_bulk(client, requests, args.batch_size)
+    report("create", mode, time.perf_counter() - started)
+    report("status", mode, await timed(update_bulk(client, ids, args.batch_size)))
+    report("delete", mode, await timed(delete_bulk(client, ids, args.batch_size)))
+
+    report("create", "import", await timed(create_import(client, requests)))
+
+
+async def main(args):
+    uri = os.environ.get("MONGODB_ATLAS_URI")
+    config = Config()
+    database = AsyncMongoClient(uri)[config.mongo_database]
+    requests_collection = database[BENCH_COLLECTION]
+    summaries = database[SUMMARY_COLLECTION]
+    await requests_collection.drop()
+    await summaries.drop()
+
+    services = procurement.services
+    services._services["requests"] = requests_collection
+    services._services["request_summary"] = RequestSummary(
+        config, requests_collection, summaries
+    )
+    app = FastAPI()
+    app.include_router(procurement.router, prefix="/api")
+    requests = [make_request(i) for i in range(args.docs)]
+
+    transport = httpx.ASGITransport(app=app)
+    rows = []
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            # Warms the connection pool
+            ids = await create_single(client, requests[:1], 1)
+            await delete_single(client, ids, 1)
+
+            print(f"documents={args.docs}\n")
+            print(f"{'op':8} {'mode':14} {'docs/s':>10}")
+            await run(client, requests, args, rows)
+    finally:
+        await requests_collection.drop()
+        await summaries.drop()
+
+    print()
+    for operation in ("create", "status", "delete"):
+        rates = {mode: rate for op, mode, rate in rows if op == operation}
+        single = [rate for mode, rate in rates.items() if mode.startswith("single")]
+        best = max(rates.values())
+        print(f"{operation:8} best vs slowest single-item: {best / min(single):6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    asyncio.run(main(parser.parse_args()))
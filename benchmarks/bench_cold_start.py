@@ -0,0 +1,105 @@
+"""Cold start of the API: import time and time to the first /health response.
+
+Each run is a fresh interpreter, as on a serverless cold start. It imports
+api.index, runs the lifespan startup and sends GET /health in process, then
+reports the time from spawning the interpreter to the response. A separate
+`python -X importtime -c "import api.index"` run lists the heaviest imports.
+With --budget the script exits non-zero when the median exceeds it, so it can
+guard cold start in CI.
+
+    python -m benchmarks.bench_cold_start [--runs 5] [--top 15] [--budget 1.5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the wall-clock time once /health has answered
+HEALTH_CHECK = """
+import asyncio, time
+import httpx
+from api.index import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            response = await c.get("/health")
+            response.raise_for_status()
+            print(time.time(), flush=True)
+
+asyncio.run(main())
+"""
+
+
+def _environment():
+    # ChatOpenAI refuses to be built without a key; the benchmark never calls it
+    return {"OPENAI_API_KEY": "cold-start", **os.environ, "PYTHONPATH": ROOT}
+
+
+def time_to_health() -> float:
+    started = time.time()
+    output = subprocess.run(
+        [sys.executable, "-c", HEALTH_CHECK],
+        cwd=ROOT,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.split()[-1]) - started
+
+
+def import_times():
+    """(module, self us, cumulative us) of every module api.index imports."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.index"],
+        cwd=ROOT,
+        env=_environment(),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if self_us.strip().isdigit():
+            modules.append((module.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main(args) -> int:
+    modules = import_times()
+    total = next(cumulative for name, _, cumulative in modules if name == "api.index")
+    print(f"import api.index: {total / 1000:.0f} ms")
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    for name, self_us, cumulative_us in sorted(
+        modules, key=lambda module: module[2], reverse=True
+    )[: args.top]:
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:8.1f}  {name}")
+
+    timings = [time_to_health() for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(
+        f"\ncold start to /health over {args.runs} runs: median {median:.2f}s, "
+        f"min {min(timings):.2f}s, max {max(timings):.2f}s"
+    )
+    if args.budget is not None and median > args.budget:
+        print(f"over the {args.budget:.2f}s budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, help="Maximum median, in seconds")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,235 @@
+"""Commodity classifier latency, accuracy and prompt-token savings.
+
+Accuracy is measured on hand-labelled order-line descriptions (top-1, and
+whether the right group is among the top-k the prompt lists). LABELLED was
+looked at while writing challenge-data/commodity-keywords.json, so its scores
+are optimistic; HELD_OUT was written separately and must never be used to pick
+keywords, so its recall is the one to trust. Prompt tokens compare
+EXTRACT_PROMPT with the full group list against the same prompt listing only
+the top-k candidates, on the challenge-data documents.
+
+    python -m benchmarks.bench_commodity_classifier [--repeat 200] [--top-k 5]
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+
+from api.config import Config
+from api.prompts.prompts import COMMODITY_GROUPS
+from api.services.commodity_classifier import CommodityClassifier
+from api.services.rule_extractor import RuleExtractor
+from api.services.text_extractor import TextExtractor
+from api.services.token_budget import TokenBudgeter
+
+DEFAULT_DOCUMENTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "challenge-data"
+)
+
+LABELLED = [
+    ("Adobe Photoshop License", "Software"),
+    ("Adobe Illustrator License", "Software"),
+    ("Microsoft 365 Business Standard, 12 Monate", "Software"),
+    ('13" MacBook Air: Apple M2 Chip - Space Grau', "Hardware"),
+    ("Dell UltraSharp Monitor 27 Zoll", "Hardware"),
+    ("Logitech MX Keys Tastatur", "Hardware"),
+    ("Managed Cloud Hosting, monatlich", "IT Services"),
+    ("IT-Support Einrichtung Netzwerk", "IT Services"),
+    ("Moosbild Mix-Moos 160x80 cm", "Facility Management Services"),
+    ("Pflanzenpflegeservice Büro", "Facility Management Services"),
+    ("Transport, Verpackung und Versand", "Delivery Services"),
+    ("Hotelübernachtung Berlin, 2 Nächte", "Accommodation Rentals"),
+    ("Schulung Excel für Fortgeschrittene", "Professional Development"),
+    ("Konferenzticket Web Summit", "Professional Development"),
+    ("Kaffeebohnen Espresso 1kg", "Cafeteria and Kitchenettes"),
+    ("Büroreinigung monatlich", "Cleaning"),
+    ("Fensterreinigung Außenfassade", "Cleaning"),
+    ("Messestand Hannover Messe", "Events"),
+    ("Werbekugelschreiber mit Logo", "Promotional Materials"),
+    ("Visitenkarten 500 Stück", "Printing Costs"),
+    ("Bürostuhl ergonomisch", "Office Equipment"),
+    ("Höhenverstellbarer Schreibtisch", "Office Equipment"),
+    ("Google Ads Kampagnenbetreuung", "Online Marketing"),
+    ("Strategieberatung Tagessatz", "Consulting"),
+    ("Betriebshaftpflichtversicherung Jahresprämie", "Insurance"),
+    ("Wartung Klimaanlage", "Maintenance"),
+    ("Toner schwarz HP 305A", "Consumables"),
+    ("Stellenanzeige Senior Developer", "Recruitment Services"),
+    ("Dienstwagen Leasing BMW", "Fleet Management"),
+    ("Elektroinstallation neue Steckdosen", "Electrical Engineering"),
+    ("Videoproduktion Imagefilm", "Audio and Visual Production"),
+    ("Kurierfahrt Express München", "Courier, Express, and Postal Services"),
+]
+
+# Never used to choose keywords; add a description here rather than a keyword
+# for it when the classifier misses one
+HELD_OUT = [
+    ("Apartment für Projektteam, 3 Monate", "Accommodation Rentals"),
+    ("IHK Mitgliedsbeitrag 2024", "Membership Fees"),
+    ("Sicherheitshandschuhe Größe 9, 10 Paar", "Workplace Safety"),
+    ("Beratungsleistung Prozessanalyse, 5 Tage", "Consulting"),
+    ("Jahresabschluss und Steuererklärung", "Financial Services"),
+    ("Winterreifen für Firmenfahrzeug", "Fleet Management"),
+    ("Headhunting Vertriebsleiter", "Recruitment Services"),
+    ("Online-Kurs Projektmanagement mit Zertifikat", "Professional Development"),
+    ("Gruppenunfallversicherung", "Insurance"),
+    ("LED-Beleuchtung Büroetage installieren", "Electrical Engineering"),
+    ("Hausmeisterservice monatlich", "Facility Management Services"),
+    ("Videoüberwachung Eingangsbereich", "Security"),
+    ("Malerarbeiten Besprechungsraum", "Renovations"),
+    ("Aktenschrank abschließbar", "Office Equipment"),
+    ("Ökostrom Liefervertrag", "Energy Management"),
+    ("Aufzugswartung jährlich", "Maintenance"),
+    ("Wasserspender inkl. Kartuschen", "Cafeteria and Kitchenettes"),
+    ("Unterhaltsreinigung Sanitärräume", "Cleaning"),
+    ("Produktfotos Fotoshooting Studio", "Audio and Visual Production"),
+    ("Fachbuch Kubernetes in Action", "Books/Videos/CDs"),
+    ("Flyer DIN A5, 2000 Stück", "Printing Costs"),
+    ("Website Relaunch Frontend-Entwicklung", "Digital Product Development"),
+    ("Farbkorrektur und Schnitt Imagevideo", "Post-production Costs"),
+    ("Docking Station USB-C", "Hardware"),
+    ("27 Zoll Bildschirm 4K", "Hardware"),
+    ("Domain und Webhosting Jahresgebühr", "IT Services"),
+    ("JetBrains IntelliJ Lizenz, 12 Monate", "Software"),
+    ("Briefmarken 100 x 0,85 EUR", "Courier, Express, and Postal Services"),
+    ("Palettenstellplatz Lager pro Monat", "Warehousing and Material Handling"),
+    ("LKW-Transport Hamburg - München", "Transportation Logistics"),
+    ("Versandkosten Standard", "Delivery Services"),
+    ("Radiospot 30 Sekunden", "Advertising"),
+    ("Plakatwand Bahnhof, 2 Wochen", "Outdoor Advertising"),
+    ("Newsletter-Mailing an Bestandskunden", "Direct Mail"),
+    ("LinkedIn Ads Kampagne Q3", "Online Marketing"),
+    ("Firmenfeier Location und Catering", "Events"),
+    ("Tassen mit Firmenlogo", "Promotional Materials"),
+    ("Gabelstapler Miete", "Warehouse and Operational Equipment"),
+    ("Ersatzteil Antriebsriemen", "Spare Parts"),
+    ("Druckerpatronen schwarz, 4er Pack", "Consumables"),
+    ("Reparatur Kühlaggregat", "Maintenance and Repairs"),
+]
+
+# The group of each challenge-data document, to check the prompt still lists it
+DOCUMENT_GROUPS = {
+    "AN-4120-Kdnr-14918.pdf": "Facility Management Services",
+    "AN-OF2312380-Kdnr-57692.pdf": "Facility Management Services",
+    "AngebotA0492_23.Pdf": "Facility Management Services",
+    "Quote_1__Lio_Technologies_GmbH__1x_MBA___2212618452.pdf": "Hardware",
+}
+
+# Nothing in these points to a group; the prompt must list every group
+UNMATCHED = ["xyz qqq", "Zzgl. MwSt", "12345"]
+
+
+def main(args):
+    config = Config(commodity_top_k=args.top_k)
+    classifier = CommodityClassifier(config)
+    print(
+        f"index: {len(classifier.groups)} groups, "
+        f"{classifier.stats()['index_ngrams']} n-grams, "
+        f"built in {classifier.build_seconds * 1000:.1f} ms"
+    )
+
+    timings = []
+
+    def accuracy(name, labelled):
+        top1, topk = 0, 0
+        for description, label in labelled:
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                ranked = classifier.classify(description)
+                timings.append(time.perf_counter() - started)
+            groups = [group for group, _ in ranked]
+            top1 += groups[0] == label
+            topk += label in groups
+            if groups[0] != label:
+                print(f"  {description!r}: expected {label}, got {groups}")
+        print(
+            f"{name}: top-1 {top1 / len(labelled):.0%}, "
+            f"top-{args.top_k} {topk / len(labelled):.0%} "
+            f"({len(labelled)} descriptions)"
+        )
+
+    accuracy("labelled (keywords tuned on)", LABELLED)
+    accuracy("held out", HELD_OUT)
+    print(
+        f"descriptions: median {statistics.median(timings) * 1e6:.0f} us, "
+        f"p95 {statistics.quantiles(timings, n=20)[-1] * 1e6:.0f} us"
+    )
+
+    narrowed_labelled = sum(
+        classifier.candidates([description]) is not None
+        for description, _ in LABELLED
+    )
+    fallen_back = [
+        description
+        for description in UNMATCHED
+        if classifier.candidates([description]) is None
+    ]
+    print(
+        f"fallback to all groups: {len(fallen_back)}/{len(UNMATCHED)} unmatched, "
+        f"{len(LABELLED) - narrowed_labelled}/{len(LABELLED)} labelled"
+    )
+    failed = len(fallen_back) < len(UNMATCHED)
+
+    extractor = TextExtractor(config)
+    rules = RuleExtractor(config)
+    budgeter = TokenBudgeter(config)
+    full_total, narrowed_total = 0, 0
+    listed_right, documents = 0, 0
+    print()
+    print(f"{'document':40} {'full tok':>9} {'top-k tok':>10}  listed  candidates")
+    for path in sorted(glob.glob(os.path.join(DEFAULT_DOCUMENTS, "*.[Pp][Dd][Ff]"))):
+        with open(path, "rb") as f:
+            text = extractor.extract(f.read(), "application/pdf")
+        descriptions = [
+            line["description"]
+            for line in rules.extract(text).values.get("order_lines", [])
+        ]
+        candidates = classifier.candidates(descriptions or [text])
+        listed = COMMODITY_GROUPS
+        if candidates is not None:
+            listed = classifier.format_candidates(candidates)
+
+        full = budgeter.count(
+            config.prompt_template.format(
+                document_text=text, commodity_groups=COMMODITY_GROUPS
+            )
+        )
+        narrowed = budgeter.count(
+            config.prompt_template.format(
+                document_text=text,
+                commodity_groups=listed,
+            )
+        )
+        full_total += full
+        narrowed_total += narrowed
+        expected = DOCUMENT_GROUPS.get(os.path.basename(path))
+        listed_group = candidates is None or expected in candidates
+        if expected is not None:
+            documents += 1
+            listed_right += listed_group
+        print(
+            f"{os.path.basename(path)[:40]:40} {full:9} {narrowed:10}  "
+            f"{'yes' if listed_group else 'NO':6}  "
+            f"{', '.join(candidates) if candidates else 'all groups'}"
+        )
+    extractor.close()
+
+    print(f"documents whose group the prompt lists: {listed_right}/{documents}")
+    print(
+        f"prompt tokens: {full_total} -> {narrowed_total} "
+        f"({full_total - narrowed_total} saved, "
+        f"{1 - narrowed_total / full_total:.0%} fewer)"
+    )
+    if failed:
+        print("unmatched descriptions were narrowed to a top-k", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,169 @@
+"""Throughput of LLM calls under injected rate limits, per scheduler feature.
+
+Starts benchmarks.stub_openai with the given per-model limits and sends all
+--calls extraction prompts at once, as a large batch does, through
+LLMScheduler in these configurations:
+
+- fixed: what LLMProcessor did before: llm_concurrency calls at a time,
+  retries with backoff, no rate-limit budgets and no hedging.
+- budgets: request and token buckets matching the stub's limits, and
+  adaptive concurrency.
+- hedged: budgets, plus hedging of calls slower than the recent p95.
+- fallback: hedged, plus a fallback model for small prompts.
+
+Prompt sizes are spread evenly between --min-tokens and --max-tokens. Reports
+the wall time, completed calls per second, call latency percentiles and how
+many calls failed, were rate limited, retried or hedged.
+
+    python -m benchmarks.bench_llm_scheduler [--calls 200] [--rpm 600] [--tpm 600000]
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from pydantic import SecretStr
+
+from api.config import Config
+from api.services.llm_scheduler import LLMScheduler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHARS_PER_TOKEN = 4
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(port: int, args) -> subprocess.Popen:
+    stub = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.stub_openai",
+            f"--port={port}",
+            f"--rpm={args.rpm}",
+            f"--tpm={args.tpm}",
+            f"--burst-seconds={args.burst_seconds}",
+            f"--tail-probability={args.tail_probability}",
+        ],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats").raise_for_status()
+            return stub
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("The stub server did not start")
+
+
+def prompts(args):
+    rng = random.Random(0)
+    return [
+        "x" * (rng.randint(args.min_tokens, args.max_tokens) * CHARS_PER_TOKEN)
+        for _ in range(args.calls)
+    ]
+
+
+def configurations(base: Config, args):
+    budgets = dataclasses.replace(
+        base,
+        llm_requests_per_minute=args.rpm,
+        llm_tokens_per_minute=args.tpm,
+        llm_rate_limit_burst_seconds=args.burst_seconds,
+    )
+    hedged = dataclasses.replace(budgets, llm_hedging_enabled=True)
+    return {
+        "fixed": dataclasses.replace(
+            base, llm_adaptive_concurrency=False, llm_hedging_enabled=False
+        ),
+        "budgets": dataclasses.replace(budgets, llm_hedging_enabled=False),
+        "hedged": hedged,
+        "fallback": dataclasses.replace(hedged, llm_fallback_model="gpt-4o-mini"),
+    }
+
+
+async def run(config: Config, batch):
+    scheduler = LLMScheduler(config)
+    latencies = []
+    failed = 0
+
+    async def call(prompt: str):
+        nonlocal failed
+        started = time.perf_counter()
+        try:
+            await scheduler.invoke(prompt, len(prompt) // CHARS_PER_TOKEN)
+        except Exception:
+            failed += 1
+            return
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(prompt) for prompt in batch))
+    return time.perf_counter() - started, latencies, failed, scheduler.stats()
+
+
+async def compare(base: Config, args):
+    # One event loop for all of them: langchain shares its HTTP clients
+    batch = prompts(args)
+    for name, config in configurations(base, args).items():
+        wall, latencies, failed, stats = await run(config, batch)
+        models = stats["models"].values()
+        cuts = statistics.quantiles(latencies, n=100) if latencies else [0] * 99
+        print(
+            f"{name:9} {wall:7.1f} {len(latencies) / wall:8.2f} "
+            f"{cuts[49]:6.2f} {cuts[94]:6.2f} {cuts[98]:6.2f} {failed:6d} "
+            f"{sum(m['rate_limited'] for m in models):5d} "
+            f"{stats['retries']:7d} {sum(m['hedges'] for m in models):6d}"
+        )
+        # Let the stub's limits refill before the next configuration
+        await asyncio.sleep(args.burst_seconds)
+
+
+def main(args):
+    port = _free_port()
+    stub = start_stub(port, args)
+    base = dataclasses.replace(
+        Config(),
+        openai_api_key=SecretStr("stub"),
+        openai_base_url=f"http://127.0.0.1:{port}/v1",
+    )
+    print(
+        f"{args.calls} calls of {args.min_tokens}-{args.max_tokens} prompt tokens, "
+        f"limits {args.rpm} requests and {args.tpm} tokens per minute per model\n"
+    )
+    print(
+        f"{'config':9} {'wall s':>7} {'calls/s':>8} {'p50 s':>6} {'p95 s':>6} "
+        f"{'p99 s':>6} {'failed':>6} {'429s':>5} {'retries':>7} {'hedges':>6}"
+    )
+    try:
+        asyncio.run(compare(base, args))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--tpm", type=int, default=600_000)
+    parser.add_argument("--burst-seconds", type=float, default=5)
+    parser.add_argument("--tail-probability", type=float, default=0.05)
+    parser.add_argument("--min-tokens", type=int, default=500)
+    parser.add_argument("--max-tokens", type=int, default=2500)
+    main(parser.parse_args())
@@ -0,0 +1,188 @@
+"""Per-payload cost of parsing and validating LLM responses.
+
+Compares the previous path (json.loads three times, defaults filled in nested
+loops), the current one (one orjson parse, defaults merged from templates) and
+pydantic-core validation into typed models for reference; the latter rejects
+fenced, null-valued and malformed responses, which only count the failed
+attempt, so it is reported with its rejection count. The corpus is a JSONL
+file with one recorded response string per line; without one, a built-in set
+of clean, fenced, partial and malformed responses of various sizes is used.
+
+    python -m benchmarks.bench_payload_validator [--corpus responses.jsonl]
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from api.config import Config
+from api.services.payload_validator import PayloadValidator, parse_llm_json
+
+
+def _order_lines(count: int):
+    return [
+        {
+            "description": f"Adobe Creative Cloud license seat {i}",
+            "unit_price": 59.99,
+            "amount": 2,
+            "unit": "licenses",
+            "total_price": 119.98,
+        }
+        for i in range(count)
+    ]
+
+
+def builtin_corpus():
+    header = {
+        "title": "Creative Cloud licenses for the design team",
+        "requestor_name": "Vladimir Keil",
+        "department": "Marketing",
+        "vendor_name": "Global Tech Solutions",
+        "vat_id": "DE987654321",
+        "commodity_group": "Software",
+    }
+    corpus = []
+    for count in (1, 5, 25, 100):
+        lines = _order_lines(count)
+        full = {**header, "order_lines": lines, "total_cost": 119.98 * count}
+        corpus.append(json.dumps(full, indent=4))
+        corpus.append(f"```json\n{json.dumps(full)}\n```")
+        corpus.append(json.dumps({"title": header["title"], "order_lines": lines}))
+        corpus.append(
+            json.dumps(
+                {**header, "vat_id": None, "order_lines": lines, "total_cost": None}
+            )
+        )
+        # Not a valid number; kept as is rather than failing the document
+        corpus.append(
+            json.dumps({**header, "order_lines": lines + [{"unit_price": "€150"}]})
+        )
+    return corpus
+
+
+def baseline(llm_response: str, config: Config):
+    """The pre-orjson path, as DocumentProcessor used to run it."""
+    payload = _slice(llm_response)
+    for field in config.required_fields:
+        if field not in payload:
+            if field == "order_lines":
+                payload[field] = []
+            elif field == "total_cost":
+                payload[field] = 0.0
+            else:
+                payload[field] = ""
+    if not isinstance(payload["order_lines"], list):
+        payload["order_lines"] = []
+    for order_line in payload["order_lines"]:
+        for field in [
+            "description",
+            "unit_price",
+            "amount",
+            "unit",
+            "total_price",
+            "department",
+            "vat_id",
+        ]:
+            if field not in order_line:
+                if field in ["unit_price", "total_price"]:
+                    order_line[field] = 0.0
+                elif field == "amount":
+                    order_line[field] = 0
+                else:
+                    order_line[field] = ""
+    if payload["order_lines"]:
+        payload["total_cost"] = sum(
+            line.get("total_price", 0.0) for line in payload["order_lines"]
+        )
+    # The total_cost print and comparison each parsed the response again
+    _slice(llm_response).get("total_cost", 0)
+    _slice(llm_response).get("total_cost", 0)
+    return payload
+
+
+def _slice(llm_response: str):
+    cleaned = llm_response.strip()
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        return json.loads(cleaned[cleaned.find("{") : cleaned.rfind("}") + 1])
+
+
+def current(llm_response: str, validator: PayloadValidator):
+    return validator.validate(parse_llm_json(llm_response)).payload
+
+
+class TypedOrderLine(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    description: str = ""
+    unit_price: float = 0.0
+    amount: float = 0
+    unit: str = ""
+    total_price: float = 0.0
+
+
+class TypedPayload(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    title: str = ""
+    requestor_name: str = ""
+    department: str = ""
+    vendor_name: str = ""
+    vat_id: str = ""
+    commodity_group: str = ""
+    order_lines: List[TypedOrderLine] = Field(default_factory=list)
+    total_cost: float = 0.0
+
+
+def typed(llm_response: str):
+    """pydantic-core parsing straight into models; None when validation fails."""
+    try:
+        return TypedPayload.model_validate_json(llm_response.strip()).model_dump()
+    except ValidationError:
+        return None
+
+
+def measure(function, corpus, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        for response in corpus:
+            started = time.perf_counter()
+            function(response)
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings), statistics.mean(timings)
+
+
+def main(args):
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        corpus = builtin_corpus()
+
+    config = Config()
+    validator = PayloadValidator(config)
+    average = sum(map(len, corpus)) / len(corpus)
+    print(f"{len(corpus)} responses, {average:.0f} chars on average")
+    for name, function in (
+        ("baseline", lambda response: baseline(response, config)),
+        ("orjson", lambda response: current(response, validator)),
+        ("pydantic", typed),
+    ):
+        median, mean = measure(function, corpus, args.repeat)
+        rejected = sum(function(response) is None for response in corpus)
+        print(
+            f"{name:9} median {median * 1e6:8.1f} us  mean {mean * 1e6:8.1f} us  "
+            f"rejected {rejected}/{len(corpus)}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus")
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
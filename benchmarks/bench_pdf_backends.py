@@ -0,0 +1,114 @@
+"""Per-backend PDF extraction latency, peak RSS and similarity to pdfplumber.
+
+Similarity is reported twice: "tokens" is the F1 of the word multisets, so it
+only measures whether the same text came out; "order" is a sequence match over
+lines, which drops when a backend reads columns or tables in a different order.
+
+Every (document, backend) pair runs in a fresh process so peak RSS is not
+inflated by earlier runs or by other backends' imports.
+
+    python -m benchmarks.bench_pdf_backends [--repeat 5] [paths ...]
+"""
+
+import argparse
+import collections
+import difflib
+import glob
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+
+from api.config import Config
+from api.services.pdf_backends import PDF_BACKENDS, inspect_pdf
+
+DEFAULT_DOCUMENTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "challenge-data"
+)
+
+
+def _measure(path: str, backend: str, repeat: int):
+    with open(path, "rb") as f:
+        content = f.read()
+
+    extract = PDF_BACKENDS[backend]
+    page_count = inspect_pdf(content, Config(pdf_backend=backend))[0]
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages = extract(content, 0, page_count)
+        timings.append(time.perf_counter() - started)
+
+    text = "\n".join(page_text for _, page_text in pages)
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return text, statistics.median(timings), peak_rss_mb
+
+
+def token_f1(reference: str, text: str) -> float:
+    expected = collections.Counter(reference.split())
+    actual = collections.Counter(text.split())
+    overlap = sum((expected & actual).values())
+    if not overlap:
+        return 0.0
+    precision = overlap / sum(actual.values())
+    recall = overlap / sum(expected.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def line_order_ratio(reference: str, text: str) -> float:
+    return difflib.SequenceMatcher(
+        None, reference.splitlines(), text.splitlines(), autojunk=False
+    ).ratio()
+
+
+def measure(path: str, backend: str, repeat: int):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(_measure, (path, backend, repeat))
+
+
+def main(args):
+    paths = args.paths or sorted(
+        glob.glob(os.path.join(DEFAULT_DOCUMENTS, "*.[Pp][Dd][Ff]"))
+    )
+    print(
+        f"{'document':40} {'backend':11} {'auto':5} {'median ms':>10} "
+        f"{'peak RSS MB':>12} {'tokens':>7} {'order':>6}"
+    )
+
+    totals = {backend: [] for backend in PDF_BACKENDS}
+    for path in paths:
+        with open(path, "rb") as f:
+            auto_backend = inspect_pdf(f.read(), Config(pdf_backend="auto"))[1]
+
+        reference = None
+        for backend in PDF_BACKENDS:
+            text, latency, peak_rss_mb = measure(path, backend, args.repeat)
+            if reference is None:
+                reference = text
+            tokens = token_f1(reference, text)
+            order = line_order_ratio(reference, text)
+            totals[backend].append((latency, peak_rss_mb, tokens, order))
+            print(
+                f"{os.path.basename(path)[:40]:40} {backend:11} "
+                f"{'*' if backend == auto_backend else '':5} {latency * 1000:10.1f} "
+                f"{peak_rss_mb:12.1f} {tokens:7.3f} {order:6.3f}"
+            )
+
+    print()
+    for backend, rows in totals.items():
+        latencies, rss, tokens, order = zip(*rows)
+        print(
+            f"{backend:11} mean {statistics.mean(latencies) * 1000:8.1f} ms  "
+            f"max RSS {max(rss):6.1f} MB  tokens {statistics.mean(tokens):.3f}  "
+            f"order {statistics.mean(order):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
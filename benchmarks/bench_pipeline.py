@@ -0,0 +1,305 @@
+"""End-to-end DocumentProcessor benchmark over challenge-data, offline.
+
+Runs process_documents over the challenge-data PDFs and the vendor offer
+example in challenge-data/README.md, with LLM responses replayed from
+--recordings (see LLMRecorder), so no API key or network is needed. Record
+them once, and again whenever a change alters the prompts, with
+
+    OPENAI_API_KEY=... python -m benchmarks.bench_pipeline --mode record
+
+Reports per-stage latencies, throughput and document latency at each
+--concurrency level, the peak RSS of the process and its extraction workers,
+and extraction accuracy against the expected values: those of the README
+example, and for the PDFs the vendor, VAT ID and net total printed on them.
+Replayed calls return at once unless --llm-latency is given, so the numbers
+isolate the pipeline around the LLM.
+
+With --baseline the run is compared with an earlier --write-baseline file and
+the script exits non-zero when p95 latency or throughput regresses by more
+than --tolerance, or accuracy drops, so it can guard changes in CI.
+
+    python -m benchmarks.bench_pipeline [--concurrency 1 4 8] [--rounds 3]
+        [--baseline FILE] [--write-baseline FILE] [--tolerance 0.25]
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import time
+
+from api.config import Config
+from api.services.metrics import STAGE_SECONDS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCUMENTS = os.path.join(ROOT, "challenge-data")
+RECORDINGS = os.path.join(ROOT, "benchmarks", "recordings")
+README_EXAMPLE = "README.md#vendor-offer"
+
+# Totals are the net sum of the order lines, which is what PayloadValidator
+# computes; shipping counts where the offer lists it as a position
+PDF_EXPECTATIONS = {
+    "AN-4120-Kdnr-14918.pdf": {
+        "vendor_name": "Dream in Green",
+        "vat_id": "DE325240530",
+        "total_cost": 1337.26,
+    },
+    "AN-OF2312380-Kdnr-57692.pdf": {
+        "vendor_name": "styleGREEN",
+        "total_cost": 1186.14,
+    },
+    "AngebotA0492_23.Pdf": {
+        "vendor_name": "Gärtner Gregg",
+        "vat_id": "DE198570491",
+        "total_cost": 1758.00,
+    },
+    "Quote_1__Lio_Technologies_GmbH__1x_MBA___2212618452.pdf": {
+        "vendor_name": "Apple",
+        "vat_id": "DE258811348",
+        "total_cost": 1467.61,
+    },
+}
+
+
+def _amount(text: str) -> float:
+    return float(text.replace(",", ""))
+
+
+def readme_example():
+    """The README's vendor offer and the values it says should be extracted."""
+    with open(os.path.join(DOCUMENTS, "README.md"), encoding="utf-8") as f:
+        readme = f.read()
+    offer = re.search(r"\*Vendor Offer\*\s*```\n(.*?)```", readme, re.S).group(1)
+    extracted = re.search(
+        r"\*Extracted Information\*\s*```\n(.*?)```", readme, re.S
+    ).group(1)
+
+    expected = {
+        "vendor_name": re.search(r"Vendor Name: (.+)", extracted).group(1).strip(),
+        "vat_id": re.search(r"\(VAT ID\): (\S+)", extracted).group(1),
+        "department": re.search(r"Department: (.+)", extracted).group(1).strip(),
+        "total_cost": _amount(re.search(r"Total Cost: €([\d.,]+)", extracted)[1]),
+        "order_lines": [
+            {
+                "description": description.strip(),
+                "unit_price": _amount(unit_price),
+                "amount": _amount(amount),
+                "total_price": _amount(total_price),
+            }
+            for description, unit_price, amount, total_price in re.findall(
+                r"Product: (.+)\n\s*- Unit Price: €([\d.,]+)\n\s*- Quantity: "
+                r"([\d.,]+)\n\s*- Total: €([\d.,]+)",
+                extracted,
+            )
+        ],
+    }
+    return offer.encode("utf-8"), expected
+
+
+def load_documents():
+    """(name, content, content_type, expected) of every benchmark document."""
+    documents = []
+    for name, expected in PDF_EXPECTATIONS.items():
+        with open(os.path.join(DOCUMENTS, name), "rb") as f:
+            documents.append((name, f.read(), "application/pdf", expected))
+    offer, expected = readme_example()
+    documents.append((README_EXAMPLE, offer, "text/plain", expected))
+    return documents
+
+
+def _close(actual, expected: float) -> bool:
+    try:
+        return abs(float(actual) - expected) <= max(0.01, abs(expected) * 0.005)
+    except (TypeError, ValueError):
+        return False
+
+
+def score(payload, expected):
+    """(correct, checked) fields of a payload; each expected order line counts."""
+    correct = checked = 0
+    for field, value in expected.items():
+        if field == "order_lines":
+            lines = payload.get("order_lines") or []
+            for line in value:
+                checked += 1
+                correct += any(
+                    all(
+                        _close(actual.get(key), line[key])
+                        for key in ("unit_price", "amount", "total_price")
+                    )
+                    for actual in lines
+                )
+            continue
+        checked += 1
+        actual = payload.get(field)
+        if field == "total_cost":
+            correct += _close(actual, value)
+        elif field == "vat_id":
+            correct += re.sub(r"\s", "", str(actual or "")).upper() == value
+        else:
+            # Names are matched loosely: "Dream in Green GmbH" is right
+            correct += value.casefold() in str(actual or "").casefold()
+    return correct, checked
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children are the reaped workers
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, workers
+
+
+async def run_level(processor, documents, concurrency: int, rounds: int):
+    processor.config.batch_max_in_flight = concurrency
+    batch = [
+        (name, content, content_type)
+        for _ in range(rounds)
+        for name, content, content_type, _ in documents
+    ]
+    started = time.perf_counter()
+    results = [result async for result in processor.process_documents(batch)]
+    wall = time.perf_counter() - started
+    return wall, results
+
+
+def _quantile(values, quantile: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[round(quantile * 100) - 1]
+
+
+async def benchmark(config: Config, args):
+    from api.services.document_processor import DocumentProcessor
+
+    documents = load_documents()
+    processor = DocumentProcessor(config)
+    report = {"levels": {}}
+    try:
+        # The first pass warms the extraction workers and gives the accuracy
+        _, results = await run_level(processor, documents, 1, 1)
+        failures = [r for r in results if r["status"] != "success"]
+        if failures:
+            for failure in failures:
+                print(f"{failure['filename']}: {failure['error']}", file=sys.stderr)
+            return None
+
+        expected = {name: values for name, _, _, values in documents}
+        correct = checked = 0
+        print(f"{'document':58} {'correct':>9}")
+        for result in sorted(results, key=lambda r: r["filename"]):
+            right, fields = score(result["data"], expected[result["filename"]])
+            correct += right
+            checked += fields
+            print(f"{result['filename'][:58]:58} {right:4d}/{fields:<4d}")
+        report["accuracy"] = correct / checked
+        print(f"{'accuracy':58} {report['accuracy']:9.1%}\n")
+
+        print(f"{'concurrency':>11} {'docs/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for level in args.concurrency:
+            wall, results = await run_level(processor, documents, level, args.rounds)
+            latencies = [result["elapsed_ms"] for result in results]
+            report["levels"][str(level)] = {
+                "throughput": len(results) / wall,
+                "p50_ms": _quantile(latencies, 0.5),
+                "p95_ms": _quantile(latencies, 0.95),
+            }
+            stats = report["levels"][str(level)]
+            print(
+                f"{level:11d} {stats['throughput']:8.2f} {stats['p50_ms']:8.1f} "
+                f"{stats['p95_ms']:8.1f}"
+            )
+    finally:
+        processor.close()
+
+    print(f"\n{'stage':18} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for series in sorted(STAGE_SECONDS.snapshot(), key=lambda s: s["stage"]):
+        quantiles = series["quantiles"]
+        print(
+            f"{series['stage']:18} {series['count']:6d} "
+            f"{series['sum'] / series['count'] * 1000:9.2f} "
+            f"{quantiles[0.5] * 1000:9.2f} {quantiles[0.95] * 1000:9.2f}"
+        )
+
+    own, workers = peak_rss_mb()
+    report["peak_rss_mb"] = {"process": own, "workers": workers}
+    print(f"\npeak RSS: {own:.0f} MB in process, {workers:.0f} MB largest worker")
+    return report
+
+
+def regressions(report, baseline, tolerance: float):
+    found = []
+    if report["accuracy"] < baseline["accuracy"]:
+        found.append(
+            f"accuracy {report['accuracy']:.1%} < {baseline['accuracy']:.1%}"
+        )
+    for level, stats in report["levels"].items():
+        before = baseline["levels"].get(level)
+        if before is None:
+            continue
+        if stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(
+                f"concurrency {level}: p95 {stats['p95_ms']:.1f} ms > "
+                f"{before['p95_ms']:.1f} ms"
+            )
+        if stats["throughput"] < before["throughput"] / (1 + tolerance):
+            found.append(
+                f"concurrency {level}: {stats['throughput']:.2f} docs/s < "
+                f"{before['throughput']:.2f} docs/s"
+            )
+    return found
+
+
+def main(args) -> int:
+    config = dataclasses.replace(
+        Config(),
+        llm_replay_mode=args.mode,
+        llm_replay_dir=args.recordings,
+        llm_replay_latency=args.llm_latency,
+        # Every pass must run the whole pipeline, whatever was stored before
+        cache_backend="none",
+        vendor_registry_enabled=False,
+    )
+    report = asyncio.run(benchmark(config, args))
+    if report is None:
+        if args.mode == "replay":
+            print("Record the LLM responses with --mode record", file=sys.stderr)
+        return 2
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.tolerance)
+        for regression in found:
+            print(f"regression: {regression}", file=sys.stderr)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay")
+    parser.add_argument("--recordings", default=RECORDINGS)
+    parser.add_argument(
+        "--llm-latency",
+        action="store_true",
+        help="Replay each response after its recorded latency",
+    )
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--rounds", type=int, default=3, help="Passes per level")
+    parser.add_argument("--baseline", help="Compare with this earlier report")
+    parser.add_argument("--write-baseline", help="Save this run's report here")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed latency regression"
+    )
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""Requests/sec for GET /api/requests under concurrency: blocking pymongo vs async client.
+
+Needs a reachable MongoDB (MONGODB_ATLAS_URI, e.g. a local mongod). The documents are
+seeded into a throwaway collection, which is dropped afterwards.
+
+    python -m benchmarks.bench_requests_list --docs 500 --concurrency 50 --requests 500
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI
+from pymongo import AsyncMongoClient, MongoClient
+
+from api.config import Config
+from api.db import MongoDB
+from api.routes import procurement
+
+BENCH_COLLECTION = "requests_benchmark"
+
+
+def make_document(i: int) -> dict:
+    return {
+        "requestor_name": f"Requestor {i}",
+        "title": f"Benchmark request {i}",
+        "vendor_name": f"Vendor {i % 20}",
+        "vat_id": f"DE{100000000 + i % 20}",
+        "commodity_group": "Software",
+        "order_lines": [
+            {
+                "description": "License",
+                "unit_price": 10.0,
+                "amount": 3,
+                "unit": "licenses",
+                "total_price": 30.0,
+            }
+        ],
+        "total_cost": 30.0,
+        "department": "IT",
+        "status": "OPEN",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def build_blocking_app(uri: str, database: str) -> FastAPI:
+    """The pre-async route: an async handler calling the blocking driver."""
+    collection = MongoClient(uri)[database][BENCH_COLLECTION]
+    app = FastAPI()
+
+    @app.get("/api/requests")
+    async def get_requests():
+        requests = []
+        for document in collection.find():
+            document["_id"] = str(document["_id"])
+            requests.append(document)
+        return requests
+
+    return app
+
+
+def build_async_app(database: str) -> FastAPI:
+    procurement.collection = MongoDB.get_mongo_client()._client[database][
+        BENCH_COLLECTION
+    ]
+    app = FastAPI()
+    app.include_router(procurement.router, prefix="/api")
+    return app
+
+
+async def run_load(app: FastAPI, concurrency: int, total: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one():
+            async with semaphore:
+                response = await client.get("/api/requests")
+                response.raise_for_status()
+
+        await one()  # warm up the connection pool
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return total / (time.perf_counter() - started)
+
+
+async def main(args):
+    uri = os.environ.get("MONGODB_ATLAS_URI")
+    database = Config().mongo_database
+
+    seed = AsyncMongoClient(uri)[database][BENCH_COLLECTION]
+    await seed.drop()
+    await seed.insert_many([make_document(i) for i in range(args.docs)])
+
+    try:
+        blocking = await run_load(
+            build_blocking_app(uri, database), args.concurrency, args.requests
+        )
+        non_blocking = await run_load(
+            build_async_app(database), args.concurrency, args.requests
+        )
+    finally:
+        await seed.drop()
+
+    print(f"documents={args.docs} concurrency={args.concurrency} requests={args.requests}")
+    print(f"pymongo (blocking)   {blocking:8.1f} req/s")
+    print(f"AsyncMongoClient     {non_blocking:8.1f} req/s")
+    print(f"speedup              {non_blocking / blocking:8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
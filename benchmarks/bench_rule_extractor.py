@@ -0,0 +1,111 @@
+"""Rule pre-extractor hit rates, latency and prompt savings.
+
+For every document it reports which fields the rules filled with enough
+confidence, how long the rules took, and how many prompt tokens the LLM call
+needs with the full prompt versus the smaller prompt asking only for the
+missing fields. The vendor offer from challenge-data/README.md is included as
+a plain-text document.
+
+    python -m benchmarks.bench_rule_extractor [--repeat 20] [paths ...]
+"""
+
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+
+from api.config import Config
+from api.prompts.prompts import COMMODITY_GROUPS, build_fields_prompt
+from api.services.rule_extractor import RuleExtractor
+from api.services.text_extractor import TextExtractor
+from api.services.token_budget import TokenBudgeter
+
+DEFAULT_DOCUMENTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "challenge-data"
+)
+
+
+def load_documents(paths, extractor: TextExtractor):
+    documents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        content_type = "application/pdf" if path.lower().endswith(".pdf") else "text/plain"
+        documents.append((os.path.basename(path), extractor.extract(content, content_type)))
+
+    readme = os.path.join(DEFAULT_DOCUMENTS, "README.md")
+    if os.path.exists(readme):
+        with open(readme, encoding="utf-8") as f:
+            match = re.search(r"\*Vendor Offer\*\n```\n(.*?)```", f.read(), re.DOTALL)
+        if match:
+            documents.append(("README vendor offer", match.group(1)))
+    return documents
+
+
+def prompt_tokens(budgeter: TokenBudgeter, template: str, text: str) -> int:
+    return budgeter.count(
+        template.format(document_text=text, commodity_groups=COMMODITY_GROUPS)
+    )
+
+
+def main(args):
+    config = Config()
+    extractor = TextExtractor(config)
+    paths = args.paths or sorted(
+        glob.glob(os.path.join(DEFAULT_DOCUMENTS, "*.[Pp][Dd][Ff]"))
+    )
+    documents = load_documents(paths, extractor)
+    extractor.close()
+
+    rules = RuleExtractor(config)
+    budgeter = TokenBudgeter(config)
+    print(
+        f"{'document':32} {'median ms':>9} {'full tok':>9} {'fields tok':>10}  missing"
+    )
+
+    latencies, skipped, full_total, fields_total = [], 0, 0, 0
+    for name, text in documents:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = rules.extract(text)
+            timings.append(time.perf_counter() - started)
+        latency = statistics.median(timings)
+        latencies.append(latency)
+
+        missing = result.missing(config.required_fields, config.rule_min_confidence)
+        full = prompt_tokens(budgeter, config.prompt_template, text)
+        if not missing:
+            skipped += 1
+            fields = 0
+        elif len(missing) == len(config.required_fields):
+            fields = full
+        else:
+            fields = prompt_tokens(budgeter, build_fields_prompt(missing), text)
+        full_total += full
+        fields_total += fields
+        print(
+            f"{name[:32]:32} {latency * 1000:9.2f} {full:9} {fields:10}  "
+            f"{', '.join(missing) or '-'}"
+        )
+
+    stats = rules.stats()
+    print()
+    print("hit rate: " + "  ".join(
+        f"{field} {rate:.0%}" for field, rate in stats["hit_rate"].items()
+    ))
+    print(f"median rules latency: {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"LLM calls skipped: {skipped}/{len(documents)}")
+    print(
+        f"prompt tokens: {full_total} full -> {fields_total} with rules "
+        f"({1 - fields_total / full_total:.0%} fewer)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
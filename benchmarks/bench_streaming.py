@@ -0,0 +1,105 @@
+"""Time to first field when streaming LLM responses, and the parser's overhead.
+
+Responses are replayed through IncrementalPayloadParser in token-sized pieces
+at a simulated generation rate, so no API key is needed. Reports, per response
+size, when the first field, first order line and result would reach the client
+relative to the full completion time, and the CPU time the incremental parser
+adds compared with one orjson parse of the complete response.
+
+    python -m benchmarks.bench_streaming [--tokens-per-second 60] [--corpus FILE]
+"""
+
+import argparse
+import json
+import time
+
+import orjson
+
+from api.services.stream_parser import IncrementalPayloadParser
+from benchmarks.bench_payload_validator import _order_lines
+
+# Roughly one token per four characters of JSON
+CHARS_PER_TOKEN = 4
+
+
+def builtin_corpus():
+    header = {
+        "title": "Creative Cloud licenses for the design team",
+        "requestor_name": "Vladimir Keil",
+        "department": "Marketing",
+        "vendor_name": "Global Tech Solutions",
+        "vat_id": "DE987654321",
+        "commodity_group": "Software",
+    }
+    corpus = []
+    for count in (1, 5, 25, 100):
+        payload = {**header, "order_lines": _order_lines(count)}
+        corpus.append(json.dumps({**payload, "total_cost": 119.98 * count}, indent=4))
+    return corpus
+
+
+def pieces(response: str):
+    return [
+        response[i : i + CHARS_PER_TOKEN]
+        for i in range(0, len(response), CHARS_PER_TOKEN)
+    ]
+
+
+def replay(response: str, tokens_per_second: float):
+    """Arrival times, in seconds of generation, of the first field and line."""
+    parser = IncrementalPayloadParser()
+    first_field = first_line = None
+    for index, piece in enumerate(pieces(response)):
+        arrived = (index + 1) / tokens_per_second
+        for name, _ in parser.feed(piece):
+            if first_field is None:
+                first_field = arrived
+            if name == "order_lines" and first_line is None:
+                first_line = arrived
+    return first_field, first_line
+
+
+def parse_overhead(response: str, repeat: int):
+    split = pieces(response)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parser = IncrementalPayloadParser()
+        for piece in split:
+            parser.feed(piece)
+    incremental = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        orjson.loads(response)
+    single = (time.perf_counter() - started) / repeat
+    return incremental, single
+
+
+def main(args):
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        corpus = builtin_corpus()
+
+    print(
+        f"{'chars':>7} {'total s':>8} {'field s':>8} {'line s':>7} {'field %':>8} "
+        f"{'parse us':>9} {'orjson us':>10}"
+    )
+    for response in corpus:
+        total = len(pieces(response)) / args.tokens_per_second
+        first_field, first_line = replay(response, args.tokens_per_second)
+        incremental, single = parse_overhead(response, args.repeat)
+        print(
+            f"{len(response):7} {total:8.2f} {first_field or 0:8.2f} "
+            f"{first_line or 0:7.2f} {100 * (first_field or total) / total:7.1f}% "
+            f"{incremental * 1e6:9.1f} {single * 1e6:10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus")
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,196 @@
+"""Peak server memory per concurrent upload of a large PDF.
+
+Starts the API under uvicorn, builds a large PDF by repeating the pages of the
+challenge-data documents, and posts it to /api/process-document from N
+clients at once. Every upload gets a unique trailer so none is served from the
+extraction cache. The resident set size of the server and its extraction
+workers is sampled from /proc throughout, and the peak above the idle
+baseline is reported per concurrent upload.
+
+The LLM is pointed at a closed local port, so each request fails fast after
+text extraction; upload handling and extraction are what is measured.
+
+    python -m benchmarks.bench_upload_memory [--size-mb 20] [--concurrency 1 4 8]
+"""
+
+import argparse
+import asyncio
+import glob
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_INTERVAL = 0.01
+
+
+def build_pdf(size_mb: float) -> bytes:
+    """A PDF of at least size_mb, made of the challenge-data pages repeated."""
+    import pypdfium2 as pdfium
+
+    paths = sorted(glob.glob(os.path.join(ROOT, "challenge-data", "*.[pP]df")))
+    repeats = int(size_mb * 1024 * 1024 / sum(map(os.path.getsize, paths))) + 1
+    sources = [pdfium.PdfDocument(path) for path in paths]
+    document = pdfium.PdfDocument.new()
+    for _ in range(repeats):
+        for source in sources:
+            document.import_pages(source)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def _descendants(pid: int):
+    pids = [pid]
+    try:
+        threads = os.listdir(f"/proc/{pid}/task")
+    except FileNotFoundError:
+        return pids
+    for tid in threads:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_descendants(int(child)))
+        except FileNotFoundError:
+            pass
+    return pids
+
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS of a process and all its descendants, in MB."""
+    return sum(_rss_kb(p) for p in _descendants(pid)) / 1024
+
+
+class PeakSampler:
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss_mb(self.pid))
+            time.sleep(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_server(port: int) -> subprocess.Popen:
+    closed_port = _free_port()
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "OPENAI_API_KEY": "bench-upload-memory",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{closed_port}/v1",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{closed_port}/v1",
+        "JOB_WORKERS": "0",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "api.index:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health").raise_for_status()
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The API did not start")
+
+
+async def upload_all(base_url: str, document: bytes, count: int, start: int):
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+
+        async def upload(index: int):
+            content = document + f"\n%bench {start + index}\n".encode()
+            response = await client.post(
+                "/api/process-document",
+                files={"file": (f"offer-{index}.pdf", content, "application/pdf")},
+            )
+            return response.status_code
+
+        return await asyncio.gather(*(upload(index) for index in range(count)))
+
+
+def main(args):
+    document = build_pdf(args.size_mb)
+    print(f"document: {len(document) / 1024 / 1024:.1f} MB")
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(port)
+    try:
+        # Builds the processor and starts the extraction workers
+        asyncio.run(upload_all(base_url, document, 1, start=-1))
+        time.sleep(1)
+        uploads = 0
+        print(
+            f"{'concurrent':>10} {'baseline MB':>12} {'peak MB':>8} {'MB/upload':>10}"
+        )
+        for concurrency in args.concurrency:
+            baseline = tree_rss_mb(server.pid)
+            with PeakSampler(server.pid) as sampler:
+                statuses = asyncio.run(
+                    upload_all(base_url, document, concurrency, start=uploads)
+                )
+            uploads += concurrency
+            per_upload = (sampler.peak - baseline) / concurrency
+            print(
+                f"{concurrency:10d} {baseline:12.1f} {sampler.peak:8.1f} "
+                f"{per_upload:10.1f}  (status {sorted(set(statuses))})"
+            )
+            time.sleep(1)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""Vendor registry lookup latency by registry size.
+
+Lookups are dictionary probes: one by VAT ID, then one per letterhead line by
+normalised name, so latency should stay flat as the registry grows. The index
+is filled in memory with synthetic vendors; no MongoDB connection is needed.
+
+    python -m benchmarks.bench_vendor_registry [--sizes 100 10000 100000]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from api.config import Config
+from api.services.vendor_registry import VendorRegistry
+
+LETTERHEAD = """Seite: 1 / 2
+Vendor {number} GmbH
+Hauptstraße {number}
+80992 München
+Lio Technologies GmbH
+Agnes-Pockels-Bogen 1
+Angebot 4120
+"""
+
+
+def vat_id(number: int) -> str:
+    return f"DE{number:09d}"
+
+
+async def measure(registry: VendorRegistry, text: str, vat: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await registry.lookup(text, vat_id=vat)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main(args):
+    # Never refresh from MongoDB during the benchmark
+    config = Config(vendor_registry_refresh_seconds=float("inf"))
+    print(f"{'vendors':>8} {'load ms':>8} {'vat hit us':>11} {'name hit us':>12} {'miss us':>8}")
+    for size in args.sizes:
+        registry = VendorRegistry(config, collection=object())
+        started = time.perf_counter()
+        for number in range(size):
+            registry.add(f"Vendor {number} GmbH", vat_id(number))
+        load = time.perf_counter() - started
+
+        target = size // 2
+        letterhead = LETTERHEAD.format(number=target)
+        vat_hit = await measure(registry, letterhead, vat_id(target), args.repeat)
+        name_hit = await measure(registry, letterhead, None, args.repeat)
+        miss = await measure(
+            registry, LETTERHEAD.format(number=size + 1), vat_id(size + 1), args.repeat
+        )
+        print(
+            f"{size:8} {load * 1000:8.1f} {vat_hit * 1e6:11.1f} "
+            f"{name_hit * 1e6:12.1f} {miss * 1e6:8.1f}"
+        )
+    print(registry.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""Fail if any /requests route query is planned as a collection scan.
+
+Runs against a local mongod (MONGODB_ATLAS_URI). Indexes are reconciled on a
+throwaway database first, a few documents are seeded so the planner has real
+index bounds, then every route query goes through explain().
+
+    python -m benchmarks.check_query_plans
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+from api.config import Config
+from api.db import MongoDB
+from api.services import request_query
+
+CHECK_DATABASE = "Demo_query_plans"
+
+
+def route_queries():
+    """(name, filter, sort) for every query the /requests routes issue."""
+    cursor = request_query.encode_cursor(
+        {"created_at": datetime.utcnow(), "_id": ObjectId()}
+    )
+    filters = {
+        "status": {"status": "OPEN"},
+        "department": {"department": "IT"},
+        "vendor_name": {"vendor_name": "Vendor 1"},
+        "commodity_group": {"commodity_group": "Software"},
+    }
+
+    yield "list", request_query.build_filter({}), request_query.SORT
+    yield "list_page_2", request_query.build_filter({}, cursor), request_query.SORT
+    for name, filter_values in filters.items():
+        yield f"list_by_{name}", request_query.build_filter(filter_values), request_query.SORT
+        yield (
+            f"list_by_{name}_page_2",
+            request_query.build_filter(filter_values, cursor),
+            request_query.SORT,
+        )
+    yield "search_title", request_query.build_filter({}, search="license"), request_query.SORT
+    yield "get_by_id", {"_id": ObjectId()}, None
+    yield "vendor_lookup", {"vendor_name": "Vendor 1", "vat_id": "DE100000001"}, None
+
+
+def find_stages(plan, stage):
+    if plan.get("stage") == stage:
+        yield plan
+    for key in ("inputStage", "outerStage", "innerStage"):
+        if key in plan:
+            yield from find_stages(plan[key], stage)
+    for child in plan.get("inputStages", []):
+        yield from find_stages(child, stage)
+
+
+async def main() -> int:
+    config = Config(mongo_database=CHECK_DATABASE)
+    mongo = MongoDB(config)
+    collection = mongo.get_collection("requests")
+
+    await collection.drop()
+    await collection.insert_many(
+        [
+            {
+                "title": f"Software license {i}",
+                "status": "OPEN",
+                "department": "IT",
+                "vendor_name": f"Vendor {i}",
+                "vat_id": f"DE{100000000 + i}",
+                "commodity_group": "Software",
+                "created_at": datetime.utcnow(),
+            }
+            for i in range(20)
+        ]
+    )
+    await mongo.ensure_indexes()
+
+    failures = []
+    try:
+        for name, query, sort in route_queries():
+            cursor = collection.find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = await cursor.explain()
+            plan = explain["queryPlanner"]["winningPlan"]
+            # Newer servers nest the classic plan under queryPlan
+            plan = plan.get("queryPlan", plan)
+            scans = list(find_stages(plan, "COLLSCAN"))
+            print(f"{'COLLSCAN' if scans else 'ok':8} {name}")
+            if scans:
+                failures.append(name)
+    finally:
+        await mongo._client.drop_database(CHECK_DATABASE)
+        await mongo.close()
+
+    if failures:
+        print(f"Collection scans in: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,108 @@
+"""Fail if the token budget drops order lines of a table spanning several pages.
+
+Builds a synthetic multi-page offer whose letterhead and footer repeat on every
+page, with order lines at the top and bottom of each page that look like the
+ones on other pages, and checks that only the repeated letterhead is removed:
+by fit(), and by map-reduce extraction with one chunk per page, where a stub
+LLM returns every amount line of its chunk as an order line.
+
+    python -m benchmarks.check_token_budget [--pages 3]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from api.config import Config
+from api.services.llm_processor import LLMProcessor
+from api.services.token_budget import AMOUNT, TokenBudgeter
+
+HEADER = ["Moos & Grün GmbH", "Hauptstraße 1 · 10115 Berlin", "Angebot AN-4711"]
+FOOTER = ["USt-IdNr. DE123456789 · Bank: DE89 3704 0044 0532 0130 00"]
+
+
+def make_offer(pages: int):
+    """The offer text and the order lines it must keep."""
+    rows = []
+    text = []
+    for page in range(1, pages + 1):
+        page_rows = [
+            "1,00 Stk. 120,00 120,00",
+            f"{page + 3},00 Stk. 12,00 {(page + 3) * 12},00",
+            "Moosbild Mix-Moos 160x80 cm 1,00 Stk. 199,00 199,00",
+            f"Pflege Moosbild Etage {page} 1,00 Stk. 45,00 45,00",
+        ]
+        rows.extend(page_rows)
+        text.append(f"--- Page {page} ---")
+        text.extend(HEADER)
+        text.extend(page_rows)
+        text.extend(FOOTER)
+        text.append(f"Seite {page} von {pages}")
+    return "\n".join(text), rows
+
+
+def missing_rows(text: str, rows):
+    """Rows absent from text, counting each occurrence."""
+    remaining = text.splitlines()
+    missing = []
+    for row in rows:
+        if row in remaining:
+            remaining.remove(row)
+        else:
+            missing.append(row)
+    return missing
+
+
+def main(args) -> int:
+    budgeter = TokenBudgeter(Config())
+    text, rows = make_offer(args.pages)
+    failures = 0
+
+    fitted = budgeter.fit(text, max_tokens=100_000).text
+    missing = missing_rows(fitted, rows)
+    repeated_header = fitted.count(HEADER[0])
+    print(
+        f"fit: {len(rows) - len(missing)}/{len(rows)} rows kept, "
+        f"letterhead {repeated_header}x"
+    )
+    if missing:
+        failures += 1
+        print(f"  FAIL dropped: {missing}")
+    if repeated_header != 1:
+        failures += 1
+        print("  FAIL letterhead not deduplicated")
+
+    config = Config()
+    budget = LLMProcessor(config).document_token_budget
+    prompt_tokens = config.max_prompt_tokens - budget
+    # Room for about one page per chunk
+    processor = LLMProcessor(Config(max_prompt_tokens=prompt_tokens + 60))
+    chunks = processor.budgeter.split_chunks(text, processor.document_token_budget)
+
+    async def stub_llm(text, prompt=None, commodity_groups=None) -> str:
+        lines = [line for line in text.splitlines() if AMOUNT.search(line)]
+        return json.dumps({"order_lines": [{"description": line} for line in lines]})
+
+    processor._invoke = stub_llm
+    merged = json.loads(asyncio.run(processor.process(text)))
+    extracted = "\n".join(line["description"] for line in merged["order_lines"])
+    missing = missing_rows(extracted, rows)
+    print(
+        f"chunks: {len(chunks)} chunks, "
+        f"{len(rows) - len(missing)}/{len(rows)} rows kept"
+    )
+    if len(chunks) < args.pages:
+        failures += 1
+        print(f"  FAIL expected at least {args.pages} chunks")
+    if missing or len(merged["order_lines"]) != len(rows):
+        failures += 1
+        print(f"  FAIL dropped: {missing}, {len(merged['order_lines'])} lines")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=3)
+    sys.exit(main(parser.parse_args()))
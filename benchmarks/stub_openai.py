@@ -0,0 +1,219 @@
+"""A local stand-in for the OpenAI chat completions API, with injected rate limits.
+
+Answers POST /v1/chat/completions, streamed or not, with a fixed extraction
+payload after a simulated generation time. Every model has its own requests
+and tokens per minute; a call over either gets a 429 with Retry-After, like
+the real API. A fraction of calls is slowed down by a tail factor, to give
+hedging something to do. Tokens are estimated at four characters each.
+
+    python -m benchmarks.stub_openai [--port 8800] [--rpm 600] [--tpm 150000]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PAYLOAD = json.dumps(
+    {
+        "title": "Creative Cloud licenses for the design team",
+        "requestor_name": "Vladimir Keil",
+        "department": "Marketing",
+        "vendor_name": "Global Tech Solutions",
+        "vat_id": "DE987654321",
+        "commodity_group": "Software",
+        "order_lines": [
+            {
+                "description": "Adobe Creative Cloud, annual license",
+                "unit_price": 59.99,
+                "amount": 2,
+                "unit": "licenses",
+                "total_price": 119.98,
+            }
+        ],
+        "total_cost": 119.98,
+    },
+    indent=4,
+)
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class StubSettings:
+    requests_per_minute: int = 600
+    tokens_per_minute: int = 150_000
+    # Seconds' worth of the limits that can be spent at once
+    burst_seconds: float = 60
+    # Time to the first token, then the generation rate
+    first_token_seconds: float = 0.2
+    tokens_per_second: float = 200
+    tail_probability: float = 0.05
+    tail_factor: float = 10
+    seed: int = 0
+
+
+class _Limits:
+    """Requests and tokens left for one model, replenished continuously.
+
+    The API refills its limits gradually rather than once a minute, so a
+    throttled client only waits until enough has been refilled.
+    """
+
+    def __init__(self, settings: StubSettings):
+        self.settings = settings
+        self.requests = self.capacity(settings.requests_per_minute)
+        self.tokens = self.capacity(settings.tokens_per_minute)
+        self.updated = time.monotonic()
+
+    def capacity(self, per_minute: int) -> float:
+        return per_minute / 60 * self.settings.burst_seconds
+
+    def take(self, tokens: int) -> float:
+        """0 if the call is admitted, else the seconds until it would be."""
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        rpm, tpm = self.settings.requests_per_minute, self.settings.tokens_per_minute
+        self.requests = min(self.capacity(rpm), self.requests + elapsed * rpm / 60)
+        self.tokens = min(self.capacity(tpm), self.tokens + elapsed * tpm / 60)
+        if self.requests >= 1 and self.tokens >= tokens:
+            self.requests -= 1
+            self.tokens -= tokens
+            return 0.0
+        return max(
+            (1 - self.requests) * 60 / rpm, (tokens - self.tokens) * 60 / tpm, 0.01
+        )
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def create_app(settings: StubSettings) -> FastAPI:
+    app = FastAPI()
+    model_limits: Dict[str, _Limits] = {}
+    counts = {"completions": 0, "rate_limited": 0}
+    rng = random.Random(settings.seed)
+
+    @app.get("/stats")
+    async def stats():
+        return counts
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt_tokens = sum(_tokens(m.get("content") or "") for m in body["messages"])
+        completion_tokens = _tokens(PAYLOAD)
+
+        limits = model_limits.setdefault(model, _Limits(settings))
+        retry_after = limits.take(prompt_tokens + completion_tokens)
+        if retry_after:
+            counts["rate_limited"] += 1
+            return JSONResponse(
+                {
+                    "error": {
+                        "message": f"Rate limit reached for {model}",
+                        "type": "requests",
+                        "code": "rate_limit_exceeded",
+                    }
+                },
+                status_code=429,
+                headers={"retry-after-ms": str(int(retry_after * 1000))},
+            )
+        counts["completions"] += 1
+
+        slowdown = 1.0
+        if rng.random() < settings.tail_probability:
+            slowdown = settings.tail_factor
+        first_token = settings.first_token_seconds * slowdown
+        per_token = slowdown / settings.tokens_per_second
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + completion_tokens * per_token)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": PAYLOAD},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish_reason=None, chunk_usage=None):
+            choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices if chunk_usage is None else [],
+                "usage": chunk_usage,
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            await asyncio.sleep(first_token)
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(PAYLOAD), CHARS_PER_TOKEN):
+                await asyncio.sleep(per_token)
+                yield chunk({"content": PAYLOAD[start : start + CHARS_PER_TOKEN]})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk({}, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--rpm", type=int, default=StubSettings.requests_per_minute)
+    parser.add_argument("--tpm", type=int, default=StubSettings.tokens_per_minute)
+    parser.add_argument(
+        "--burst-seconds", type=float, default=StubSettings.burst_seconds
+    )
+    parser.add_argument(
+        "--first-token-seconds", type=float, default=StubSettings.first_token_seconds
+    )
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=StubSettings.tokens_per_second
+    )
+    parser.add_argument(
+        "--tail-probability", type=float, default=StubSettings.tail_probability
+    )
+    parser.add_argument("--tail-factor", type=float, default=StubSettings.tail_factor)
+    args = parser.parse_args()
+    settings = StubSettings(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        burst_seconds=args.burst_seconds,
+        first_token_seconds=args.first_token_seconds,
+        tokens_per_second=args.tokens_per_second,
+        tail_probability=args.tail_probability,
+        tail_factor=args.tail_factor,
+    )
+    uvicorn.run(create_app(settings), port=args.port, log_level="warning")
@@ -1,5 +1,134 @@
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import sys
+import time
+
+
+def _collect_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith((".pdf", ".txt")):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def _content_type(path):
+    return "application/pdf" if path.lower().endswith(".pdf") else "text/plain"
+
+
+async def process_documents(args):
+    from api.config import Config
+    from api.services.document_processor import DocumentProcessor
+
+    overrides = {
+        "extraction_workers": args.extraction_workers,
+        "llm_concurrency": args.llm_concurrency,
+        "batch_max_in_flight": args.max_in_flight,
+    }
+    config = dataclasses.replace(
+        Config(), **{k: v for k, v in overrides.items() if v is not None}
+    )
+    processor = DocumentProcessor(config)
+
+    documents = []
+    for path in _collect_paths(args.paths):
+        with open(path, "rb") as f:
+            documents.append((path, f.read(), _content_type(path)))
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    failed = 0
+    started = time.perf_counter()
+    try:
+        async for result in processor.process_documents(documents):
+            failed += result["status"] != "success"
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+    finally:
+        processor.close()
+        if args.output:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"Processed {len(documents)} documents ({failed} failed) in {elapsed:.2f}s, "
+        f"{len(documents) / elapsed if elapsed else 0:.2f} documents/s",
+        file=sys.stderr,
+    )
+    if args.metrics:
+        _print_stage_latencies()
+
+
+def _print_stage_latencies():
+    from api.services.metrics import STAGE_SECONDS
+
+    header = f"{'stage':16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header, file=sys.stderr)
+    for series in STAGE_SECONDS.snapshot():
+        latencies = " ".join(
+            f"{value * 1000:9.1f}" for value in series["quantiles"].values()
+        )
+        print(f"{series['stage']:16} {series['count']:6} {latencies}", file=sys.stderr)
+
+
+async def run_workers(args):
+    from api.config import Config
+    from api.services.document_processor import DocumentProcessor
+    from api.services.job_queue import JobQueue
+
+    config = Config()
+    if args.workers is not None:
+        config = dataclasses.replace(config, job_workers=args.workers)
+    processor = DocumentProcessor(config)
+    queue = JobQueue(config, processor)
+
+    await queue.start()
+    print(f"Started {config.job_workers} job workers", file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await queue.stop()
+        processor.close()
+
+
 def main():
-    print("Hello from vercel-mongodb-next-fastapi-starter!")
+    parser = argparse.ArgumentParser(description="Procurement document tools")
+    subparsers = parser.add_subparsers(dest="command")
+
+    process = subparsers.add_parser(
+        "process", help="Extract procurement requests from vendor offers"
+    )
+    process.add_argument("paths", nargs="+", help="Files or directories of offers")
+    process.add_argument("--output", help="Write NDJSON results here (default stdout)")
+    process.add_argument("--extraction-workers", type=int)
+    process.add_argument("--llm-concurrency", type=int)
+    process.add_argument("--max-in-flight", type=int)
+    process.add_argument(
+        "--metrics", action="store_true", help="Print per-stage latencies at the end"
+    )
+
+    worker = subparsers.add_parser(
+        "worker", help="Run background job workers without the API server"
+    )
+    worker.add_argument("--workers", type=int)
+
+    parser.add_argument("--log-level", help="e.g. DEBUG; defaults to LOG_LEVEL")
+
+    args = parser.parse_args()
+    from api.config import Config
+    from api.logging_config import configure_logging
+
+    configure_logging(args.log_level or Config().log_level)
+    if args.command == "process":
+        asyncio.run(process_documents(args))
+    elif args.command == "worker":
+        asyncio.run(run_workers(args))
+    else:
+        parser.print_help()
 
 
 if __name__ == "__main__":